@@ -0,0 +1,277 @@
+"""
+Overlapped table I/O for the stage scripts.
+
+Stages used to read their inputs one after another, compute, and then write their
+outputs one after another, so on network-mounted storage each read and write
+waited out its full latency in turn. The Parquet / Arrow / CSV readers and writers
+release the GIL while they wait on the file system and (de)compress, so this module
+runs them on a shared thread pool next to the computation:
+
+  - `prefetch` starts all of a stage's reads at once and returns futures; the
+    stage blocks on `.result()` only when it needs a table.
+  - `BackgroundWriter` hands whole-table writes (and upserts) to the pool and
+    returns at once, so the next frame is computed while the previous one is
+    serialized; leaving its `with` block waits for the writes and re-raises the
+    first error.
+  - `StreamingWriter` writes one table chunk by chunk: a background thread
+    flushes every chunk (a Parquet row group, an Arrow record batch or a CSV
+    block) while the caller computes the next. The file is moved into place on
+    `close()`, so readers never see a partial table.
+
+Frames handed to a writer must not be modified afterwards (pandas copy-on-write
+makes ordinary assignments safe), and only one write per table may be pending.
+Worker processes are forked, so stages collect their prefetched reads before
+starting any (partitioned mode, sentiment scoring).
+
+IO_THREADS sets the pool size (default 8; 0 = do all I/O inline, one step after
+the other) and IO_CHUNK_ROWS the rows per streamed chunk.
+"""
+
+import os
+import queue
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor, wait
+
+import pandas as pd
+
+from schema import widen
+from storage import (DEFAULT_FORMAT, EXPORT_CSV, categorize, pa, read_table, remove_stale, table_path,
+                     upsert_table, write_table)
+
+if pa is not None:
+    import pyarrow.parquet as pq
+
+IO_THREADS = int(os.environ.get("IO_THREADS", "8"))
+CHUNK_ROWS = int(os.environ.get("IO_CHUNK_ROWS", "1000000"))
+QUEUED_CHUNKS = 2   # chunks a StreamingWriter may hold before write() blocks
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def _executor():
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ThreadPoolExecutor(max_workers=IO_THREADS, thread_name_prefix="io")
+    return _pool
+
+
+def submit(fn, *args, **kwargs):
+    """Run `fn(*args, **kwargs)` on the I/O pool; returns a Future (already done with IO_THREADS=0)."""
+    if IO_THREADS > 0:
+        return _executor().submit(fn, *args, **kwargs)
+    future = Future()
+    try:
+        future.set_result(fn(*args, **kwargs))
+    except Exception as exc:
+        future.set_exception(exc)
+    return future
+
+
+def chunks(df, rows=CHUNK_ROWS):
+    """Consecutive row slices of `df` (at least one, so an empty frame still yields its columns)."""
+    for lo in range(0, max(len(df), 1), rows):
+        yield df.iloc[lo:lo + rows]
+
+
+# ----------------------------------
+# Reads
+# ----------------------------------
+
+def prefetch(reads):
+    """
+    Start every read in `reads` on the I/O pool at once; returns {key: Future}. A value
+    is `(directory, name)` or `(directory, name, read_table kwargs)`, or a callable
+    for any other loader (e.g. a PriceStore query).
+    """
+    futures = {}
+    for key, read in reads.items():
+        if callable(read):
+            futures[key] = submit(read)
+        else:
+            directory, name, *kwargs = read
+            futures[key] = submit(read_table, directory, name, **(kwargs[0] if kwargs else {}))
+    return futures
+
+
+# ----------------------------------
+# Writes
+# ----------------------------------
+
+class BackgroundWriter:
+    """Whole-table writes run on the I/O pool; `wait()` (or leaving the `with` block) joins them."""
+
+    def __init__(self):
+        self.futures = []
+
+    def submit(self, fn, *args, **kwargs):
+        future = submit(fn, *args, **kwargs)
+        self.futures.append(future)
+        return future
+
+    def write_table(self, df, directory, name, **kwargs):
+        return self.submit(write_table, df, directory, name, **kwargs)
+
+    def upsert_table(self, df, directory, name, key, sort=False):
+        return self.submit(upsert_table, df, directory, name, key, sort=sort)
+
+    def wait(self):
+        """Block until every submitted write is done; returns their results, raising the first error."""
+        futures, self.futures = self.futures, []
+        wait(futures)
+        return [future.result() for future in futures]
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.wait()
+        else:
+            # don't leave writes running behind the error; the body's exception wins
+            wait(self.futures)
+            self.futures = []
+        return False
+
+
+class StreamingWriter:
+    """
+    Write `<directory>/<name>` one chunk at a time while later chunks are still being
+    computed. Use as a context manager: the table is finished and moved into place
+    on a clean exit and discarded if the block raises.
+    """
+
+    def __init__(self, directory, name, fmt=None, export_csv=None):
+        self.fmt = fmt or DEFAULT_FORMAT
+        self.directory, self.name = directory, name
+        self.path = table_path(directory, name, self.fmt)
+        self.export_csv = (EXPORT_CSV if export_csv is None else export_csv) and self.fmt != "csv"
+        self.rows = 0
+        self._tmp = self.path + ".tmp"
+        self._csv_tmp = table_path(directory, name, "csv") + ".tmp"
+        self._sink = None
+        self._schema = None
+        self._categories = {}
+        self._error = None
+        os.makedirs(directory, exist_ok=True)
+        for tmp in (self._tmp, self._csv_tmp):
+            if os.path.exists(tmp):
+                os.remove(tmp)
+        self._queue = queue.Queue(maxsize=QUEUED_CHUNKS)
+        self._thread = None
+        if IO_THREADS > 0:
+            self._thread = threading.Thread(target=self._run, name=f"io-{name}", daemon=True)
+            self._thread.start()
+
+    def write(self, chunk):
+        """Queue `chunk` (a DataFrame with the table's columns) to be flushed in the background."""
+        if self._error is not None:
+            raise self._error
+        self.rows += len(chunk)
+        if self._thread is None:
+            self._flush(chunk)
+        else:
+            self._queue.put(chunk)
+
+    def close(self):
+        """Flush the remaining chunks, finish the file and move it into place; returns its path."""
+        self._stop()
+        if self._error is not None:
+            self.abort()
+            raise self._error
+        if self._sink is None:
+            raise ValueError(f"No chunks were written to {self.name}")
+        if self.fmt != "csv":
+            self._sink.close()
+        os.replace(self._tmp, self.path)
+        remove_stale(self.directory, self.name, self.fmt)
+        if self.export_csv:
+            os.replace(self._csv_tmp, table_path(self.directory, self.name, "csv"))
+        return self.path
+
+    def abort(self):
+        """Stop writing and delete the partial files."""
+        self._stop()
+        if self._sink is not None and self.fmt != "csv":
+            try:
+                self._sink.close()
+            except Exception:
+                pass
+        for tmp in (self._tmp, self._csv_tmp):
+            if os.path.exists(tmp):
+                os.remove(tmp)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+        return False
+
+    def _stop(self):
+        if self._thread is not None:
+            self._queue.put(None)
+            self._thread.join()
+            self._thread = None
+
+    def _run(self):
+        while True:
+            chunk = self._queue.get()
+            if chunk is None:
+                return
+            if self._error is not None:
+                continue    # keep draining so write() never blocks on a dead writer
+            try:
+                self._flush(chunk)
+            except Exception as exc:
+                self._error = exc
+
+    def _flush(self, chunk):
+        chunk = widen(chunk)
+        first = self._sink is None
+        if self.fmt == "csv":
+            chunk.to_csv(self._tmp, mode="a", header=first, index=False)
+            self._sink = self._tmp
+            return
+        chunk = categorize(chunk)
+        table = pa.Table.from_pandas(self._unify(chunk) if self.fmt == "arrow" else chunk, preserve_index=False)
+        if first:
+            self._schema = _wide_dictionaries(table.schema)
+            if self.fmt == "parquet":
+                self._sink = pq.ParquetWriter(self._tmp, self._schema, compression="zstd")
+            else:
+                self._sink = pa.ipc.new_file(self._tmp, self._schema,
+                                             options=pa.ipc.IpcWriteOptions(emit_dictionary_deltas=True))
+        if not table.schema.equals(self._schema):
+            table = table.cast(self._schema)
+        self._sink.write_table(table)
+        if self.export_csv:
+            chunk.to_csv(self._csv_tmp, mode="a", header=first, index=False)
+
+    def _unify(self, chunk):
+        """
+        `chunk` with every categorical extended to all categories seen so far, in
+        first-seen order: each chunk's dictionary then only appends to the previous
+        one, which is all an Arrow file accepts (dictionary deltas). Parquet row
+        groups each carry their own dictionary.
+        """
+        columns = {}
+        for col in chunk.columns:
+            if isinstance(chunk[col].dtype, pd.CategoricalDtype):
+                categories = chunk[col].cat.categories
+                seen = self._categories.get(col, categories[:0])
+                seen = seen.append(categories.difference(seen, sort=False))
+                self._categories[col] = seen
+                columns[col] = chunk[col].cat.set_categories(seen)
+        return chunk.assign(**columns)
+
+
+def _wide_dictionaries(schema):
+    """`schema` with int32 dictionary indices, so a later chunk with more categories still fits."""
+    fields = [pa.field(f.name, pa.dictionary(pa.int32(), f.type.value_type), f.nullable)
+              if pa.types.is_dictionary(f.type) else f for f in schema]
+    return pa.schema(fields, metadata=schema.metadata)
@@ -0,0 +1,206 @@
+"""
+Merchant benchmarking aggregates (mod 1) as mergeable partial results.
+
+`mod 1.py` originally loaded all of `transactions.csv`, merged competitor metrics
+onto every row and grouped by merchant. Here the same metrics are built from
+per-chunk partial aggregates (sums, non-null counts and a mergeable distinct-product
+counter) that can be added together, so transactions can be streamed in chunks with
+flat peak memory and the result is the same `benchmarking_output.csv`.
+"""
+
+import numpy as np
+import pandas as pd
+
+from distinct import PairSetDistinct
+from id_dictionary import IdDictionary
+from instrument import step
+from join_index import join_columns
+from schema import apply_schema, cents, read_csv, widen
+
+# partial sum columns and the (sum, count) pairs they turn into means
+SUM_COLUMNS = [
+    "total_revenue", "price_sum", "quantity_sum", "n_rows",
+    "merchant_price_sum", "merchant_price_n",
+    "competitor_price_sum", "competitor_price_n",
+    "price_gap_sum", "price_gap_n",
+]
+MEANS = {
+    "avg_price": ("price_sum", "n_rows"),
+    "avg_quantity": ("quantity_sum", "n_rows"),
+    "merchant_avg_price": ("merchant_price_sum", "merchant_price_n"),
+    "competitor_avg_price": ("competitor_price_sum", "competitor_price_n"),
+    "price_gap_avg": ("price_gap_sum", "price_gap_n"),
+}
+OUTPUT_COLUMNS = [
+    "merchant_id", "total_revenue", "avg_price", "avg_quantity", "total_products",
+    "merchant_avg_price", "competitor_avg_price", "price_gap_avg",
+]
+
+
+def competitor_metrics(competitors):
+    """Per-product average competitor price, merchant price and price gap."""
+    competitors = widen(competitors)
+    metrics = (
+        competitors.groupby("product_id")
+                   .agg(
+                        avg_competitor_price = ("competitor_price", "mean"),
+                        merchant_price = ("merchant_price", "mean")
+                   )
+                   .reset_index()
+    )
+    metrics["price_gap"] = metrics["avg_competitor_price"] - metrics["merchant_price"]
+    return metrics
+
+
+def merchant_metrics(sales, comp_metrics, index_name=None):
+    """
+    Per-merchant sales and competitor-comparison metrics from transaction rows (the
+    mod 1 batch computation). Competitor columns are gathered into `sales` in place.
+    """
+    if sales["price"].dtype == np.float32:
+        # float32 prices (schema.py) are averaged in float64
+        sales["price"] = cents(sales["price"])
+    with step("aggregate") as s:
+        sales_metrics = (
+            sales.groupby("merchant_id")
+                 .agg(
+                    total_revenue = ("revenue", "sum"),
+                    avg_price = ("price", "mean"),
+                    avg_quantity = ("quantity", "mean"),
+                    total_products = ("product_id", "nunique")
+                 )
+                 .reset_index()
+        )
+        s.rows = len(sales)
+
+    with step("merge") as s:
+        # gathers the competitor columns into `sales` by position (same result as a
+        # left merge, without copying `sales`)
+        merged = join_columns(sales, comp_metrics, on="product_id", index_name=index_name)
+        s.rows = len(merged)
+
+    with step("aggregate_competitor") as s:
+        merchant_comp_metrics = (
+            merged.groupby("merchant_id")
+                  .agg(
+                      merchant_avg_price = ("merchant_price", "mean"),
+                      competitor_avg_price = ("avg_competitor_price", "mean"),
+                      price_gap_avg = ("price_gap", "mean")
+                  )
+                  .reset_index()
+        )
+        s.rows = len(merged)
+
+    return sales_metrics.merge(merchant_comp_metrics, on="merchant_id", how="left")
+
+
+def benchmark_shard(sales, comp_metrics):
+    """merchant_metrics for one merchant_id shard (see partitioned.py), with string IDs in and out."""
+    ids = IdDictionary()
+    metrics = merchant_metrics(ids.encode_frame(sales), ids.encode_frame(comp_metrics))
+    return ids.decode_frame(metrics)
+
+
+class MerchantPartials:
+    """
+    Running per-merchant sums plus a mergeable distinct-product counter
+    (see distinct.py; exact pair sets unless another backend is passed in).
+    """
+
+    def __init__(self, sums=None, distinct=None):
+        if sums is None:
+            sums = pd.DataFrame(columns=SUM_COLUMNS, dtype="float64")
+            sums.index.name = "merchant_id"
+        self.sums = sums
+        self.distinct = distinct if distinct is not None else PairSetDistinct()
+
+    @classmethod
+    def from_chunk(cls, chunk, comp_metrics, new_distinct=PairSetDistinct):
+        """Aggregate one chunk of transactions against per-product competitor metrics."""
+        chunk = widen(chunk)
+        lookup = comp_metrics.set_index("product_id")
+        merchant_price = chunk["product_id"].map(lookup["merchant_price"])
+        comp_price = chunk["product_id"].map(lookup["avg_competitor_price"])
+        gap = chunk["product_id"].map(lookup["price_gap"])
+
+        frame = pd.DataFrame({
+            "merchant_id": chunk["merchant_id"].to_numpy(),
+            "total_revenue": chunk["revenue"].to_numpy(),
+            "price_sum": chunk["price"].to_numpy(),
+            "quantity_sum": chunk["quantity"].to_numpy(),
+            "n_rows": 1,
+            "merchant_price_sum": merchant_price.to_numpy(),
+            "merchant_price_n": merchant_price.notna().to_numpy(),
+            "competitor_price_sum": comp_price.to_numpy(),
+            "competitor_price_n": comp_price.notna().to_numpy(),
+            "price_gap_sum": gap.to_numpy(),
+            "price_gap_n": gap.notna().to_numpy(),
+        })
+        sums = frame.groupby("merchant_id", sort=False).sum().astype("float64")
+        distinct = new_distinct().add(chunk["merchant_id"].to_numpy(), chunk["product_id"].to_numpy())
+        return cls(sums, distinct)
+
+    @classmethod
+    def from_cube(cls, cells, comp_metrics, new_distinct=PairSetDistinct):
+        """
+        Same partials from (date, merchant, product) cube cells instead of raw rows:
+        every per-row sum becomes a count-weighted sum over cells.
+        """
+        lookup = comp_metrics.set_index("product_id")
+        product_id = cells["product_id"].astype(str)
+        count = cells["count"].to_numpy(dtype="float64")
+        frame = pd.DataFrame({
+            "merchant_id": cells["merchant_id"].to_numpy(),
+            "total_revenue": cells["revenue_sum"].to_numpy(),
+            "price_sum": cells["price_sum"].to_numpy(dtype="float64"),
+            "quantity_sum": cells["quantity_sum"].to_numpy(),
+            "n_rows": count,
+        })
+        for name, col in [("merchant_price", "merchant_price"), ("competitor_price", "avg_competitor_price"),
+                          ("price_gap", "price_gap")]:
+            values = product_id.map(lookup[col]).to_numpy(dtype="float64")
+            frame[name + "_sum"] = values * count
+            frame[name + "_n"] = count * ~pd.isna(values)
+        sums = frame.groupby("merchant_id", sort=False).sum().astype("float64")
+        distinct = new_distinct().add(cells["merchant_id"].to_numpy(), cells["product_id"].to_numpy())
+        return cls(sums, distinct)
+
+    def merge(self, other):
+        """Combine two partial results; merging is associative and order independent."""
+        if self.sums.empty:
+            sums = other.sums
+        elif other.sums.empty:
+            sums = self.sums
+        else:
+            sums = self.sums.add(other.sums, fill_value=0)
+        return MerchantPartials(sums, self.distinct.merge(other.distinct))
+
+    def finalize(self, merchants=None):
+        """Turn the sums into the benchmarking output frame (sorted by merchant_id)."""
+        sums = self.sums.sort_index()
+        out = pd.DataFrame(index=sums.index)
+        out["total_revenue"] = sums["total_revenue"]
+        for col, (num, den) in MEANS.items():
+            out[col] = sums[num] / sums[den].where(sums[den] > 0)
+        out["total_products"] = self.distinct.counts().reindex(sums.index.astype(str)).to_numpy()
+        out = out.reset_index()[OUTPUT_COLUMNS]
+        if merchants is not None:
+            out = out.merge(merchants, on="merchant_id", how="left")
+        return out
+
+
+def stream_benchmark(transactions_path, competitors, merchants, chunksize=1_000_000,
+                     new_distinct=PairSetDistinct):
+    """
+    Build the benchmarking output by reading transactions in chunks. `transactions_path`
+    may also be a list of files (CSV, or Parquet change segments read whole).
+    """
+    comp_metrics = competitor_metrics(competitors)
+    partials = MerchantPartials(distinct=new_distinct())
+    paths = [transactions_path] if isinstance(transactions_path, str) else transactions_path
+    for path in paths:
+        chunks = read_csv(path, "transactions", chunksize=chunksize) if path.endswith(".csv") \
+            else [apply_schema(pd.read_parquet(path), "transactions")]
+        for chunk in chunks:
+            partials = partials.merge(MerchantPartials.from_chunk(chunk, comp_metrics, new_distinct))
+    return partials.finalize(merchants)
@@ -0,0 +1,127 @@
+"""
+Benchmark for overlapped stage I/O (async_io.py) against one-after-another I/O.
+
+On a copy of a benchmark fixture's raw tables (stored as Parquet) it times
+
+  - load:   reading every raw table with read_table in turn vs `prefetch`
+  - write:  computing and writing five outputs in turn vs handing each write to a
+            BackgroundWriter while the next output is computed
+  - stream: transforming a table chunk by chunk and writing it at the end vs
+            flushing each chunk through a StreamingWriter
+
+`--latency` adds a fixed delay to every file read or written to emulate the round
+trips of network-mounted storage. Overlap only pays off where there is latency to
+hide or a spare core to serialize on; flushing in row groups also costs a little
+compression per chunk.
+
+Usage:
+    python benchmarks/bench_io.py [--size 1m] [--repeat 3] [--latency 50]
+"""
+
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import async_io  # noqa: E402
+from async_io import BackgroundWriter, StreamingWriter, chunks, prefetch  # noqa: E402
+from bench_pipeline import SIZES, ensure_fixture  # noqa: E402
+from schema import SCHEMAS, read_csv  # noqa: E402
+from storage import read_table, write_table  # noqa: E402
+
+
+def timed(fn, repeat):
+    best, out = float("inf"), None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        out = fn()
+        best = min(best, time.perf_counter() - start)
+    return best, out
+
+
+def with_latency(fn, seconds):
+    def call(*args, **kwargs):
+        time.sleep(seconds)
+        return fn(*args, **kwargs)
+    return call
+
+
+def transform(df):
+    """Stand-in for a stage's computation between writes: a per-row expression and a sort."""
+    out = df.copy()
+    for col in out.select_dtypes("number").columns:
+        out[col] = out[col] * 1.01
+    return out.sort_index(ascending=False)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--size", choices=list(SIZES), default="1m")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--latency", type=float, default=0, help="ms added to every file read or written")
+    parser.add_argument("--chunks", type=int, default=4, help="chunks the streamed table is computed in")
+    args = parser.parse_args(argv)
+
+    raw = os.path.join(ensure_fixture(args.size), "data", "raw")
+    work = tempfile.mkdtemp(prefix="bench_io_")
+    try:
+        frames = {table: read_csv(os.path.join(raw, table + ".csv"), table) for table in SCHEMAS}
+        for table, df in frames.items():
+            write_table(df, os.path.join(work, "raw"), table, fmt="parquet", export_csv=False)
+
+        delay = args.latency / 1000
+        read, write = with_latency(read_table, delay), with_latency(write_table, delay)
+        # the pool threads call through async_io's own references
+        async_io.read_table, async_io.write_table = read, write
+        close = StreamingWriter.close
+        StreamingWriter.close = with_latency(close, delay)
+        src, out = os.path.join(work, "raw"), os.path.join(work, "out")
+
+        def load_serial():
+            return {table: read(src, table) for table in SCHEMAS}
+
+        def load_overlapped():
+            return {key: f.result() for key, f in prefetch({t: (src, t) for t in SCHEMAS}).items()}
+
+        def write_serial():
+            for table, df in frames.items():
+                write(transform(df), out, table)
+
+        def write_overlapped():
+            with BackgroundWriter() as writes:
+                for table, df in frames.items():
+                    writes.write_table(transform(df), out, table)
+
+        big = frames["transactions"]
+        chunk_rows = max(len(big) // args.chunks, 1)
+
+        def stream_serial():
+            write(pd.concat([transform(chunk) for chunk in chunks(big, chunk_rows)]), out, "streamed")
+
+        def stream_overlapped():
+            with StreamingWriter(out, "streamed") as writer:
+                for chunk in chunks(big, chunk_rows):
+                    writer.write(transform(chunk))
+
+        print(f"{args.size} fixture, {len(big):,} transactions, {args.latency:g} ms latency, "
+              f"{async_io.IO_THREADS} I/O threads")
+        print(f"{'step':<8} {'serial':>9} {'overlapped':>11} {'speedup':>8}")
+        for name, serial, overlapped in [("load", load_serial, load_overlapped),
+                                         ("write", write_serial, write_overlapped),
+                                         ("stream", stream_serial, stream_overlapped)]:
+            t_serial, _ = timed(serial, args.repeat)
+            t_overlapped, _ = timed(overlapped, args.repeat)
+            print(f"{name:<8} {t_serial:8.2f}s {t_overlapped:10.2f}s {t_serial / t_overlapped:7.2f}x")
+        StreamingWriter.close = close
+    finally:
+        shutil.rmtree(work, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
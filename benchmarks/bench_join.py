@@ -0,0 +1,88 @@
+"""
+Benchmark for the index-backed left join against `pd.merge`.
+
+Joins per-product competitor metrics onto a wide sales frame keyed by int32
+product codes (as produced by id_dictionary.py) and reports wall time and the
+memory of the joined result for:
+  - `pd.merge(..., how="left")`,
+  - `join_columns` building the key index,
+  - `join_columns` reusing the persisted index.
+Results are checked to be identical.
+
+Usage:
+    python benchmarks/bench_join.py [--rows 10000000] [--products 20000] [--repeat 3]
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from join_index import join_columns  # noqa: E402
+
+
+def make_frames(n_rows, n_products, seed=42):
+    rng = np.random.default_rng(seed)
+    sales = pd.DataFrame({
+        "date": np.datetime64("2025-01-01") + rng.integers(0, 365, n_rows).astype("timedelta64[D]"),
+        "merchant_id": rng.integers(0, 500, n_rows).astype(np.int32),
+        "product_id": rng.integers(0, n_products, n_rows).astype(np.int32),
+        "price": np.round(rng.uniform(10, 400, n_rows), 2),
+        "quantity": rng.integers(1, 5, n_rows),
+    })
+    sales["revenue"] = sales["price"] * sales["quantity"]
+    # a few products have no competitor prices, so some rows stay unmatched
+    products = rng.permutation(n_products)[: int(n_products * 0.95)].astype(np.int32)
+    metrics = pd.DataFrame({
+        "product_id": products,
+        "avg_competitor_price": rng.uniform(10, 400, len(products)),
+        "merchant_price": rng.uniform(10, 400, len(products)),
+    })
+    metrics["price_gap"] = metrics["avg_competitor_price"] - metrics["merchant_price"]
+    return sales, metrics
+
+
+def timed(fn, repeat):
+    best, out = float("inf"), None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        out = fn()
+        best = min(best, time.perf_counter() - start)
+    return best, out
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--rows", type=int, default=10_000_000)
+    parser.add_argument("--products", type=int, default=20_000)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args(argv)
+
+    sales, metrics = make_frames(args.rows, args.products)
+    print(f"left {len(sales):,} rows x {sales.shape[1]} cols, right {len(metrics):,} rows")
+    index_dir = tempfile.mkdtemp(prefix="join_index_")
+
+    t_merge, merged = timed(lambda: sales.merge(metrics, on="product_id", how="left"), args.repeat)
+    # each run joins into a fresh copy: join_columns adds the columns in place
+    t_build, joined = timed(lambda: join_columns(sales.copy(deep=False), metrics, "product_id"), args.repeat)
+    join_columns(sales.copy(deep=False), metrics, "product_id", index_name="product_id", directory=index_dir)
+    t_cached, _ = timed(lambda: join_columns(sales.copy(deep=False), metrics, "product_id",
+                                             index_name="product_id", directory=index_dir), args.repeat)
+    pd.testing.assert_frame_equal(merged, joined)
+
+    added = joined[metrics.columns.drop("product_id")].memory_usage(index=False).sum()
+    for name, t in [("pd.merge", t_merge), ("join_columns (build)", t_build),
+                    ("join_columns (persisted)", t_cached)]:
+        print(f"{name:<26} {t:7.3f}s  {args.rows / t / 1e6:8.1f} M rows/s  speedup {t_merge / t:5.1f}x")
+    print(f"pd.merge result {merged.memory_usage(index=False).sum() / 1e6:,.0f} MB (full copy); "
+          f"join_columns adds {added / 1e6:,.0f} MB to the left frame")
+
+
+if __name__ == "__main__":
+    main()
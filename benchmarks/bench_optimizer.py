@@ -0,0 +1,103 @@
+"""
+Benchmark for the sentiment-aware price optimizer against the mod 4 rules.
+
+Generates transactions for many products from known linear demand curves
+(`quantity ~ Poisson(a + b * price)`), plus one competitor-level offer table with
+product sentiment, then reports:
+  - wall time of the batched demand fit and of the price optimization,
+  - how well the fitted elasticities recover the true ones,
+  - expected revenue under the TRUE demand curves at the current merchant prices,
+    the rule-based `suggested_price` and the optimizer's prices.
+
+Usage:
+    python benchmarks/bench_optimizer.py [--products 100000] [--rows 10000000] [--repeat 3]
+"""
+
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from price_optimizer import demand_stats, expected_revenue, fit_demand, offer_table, optimize  # noqa: E402
+from pricing_rules import recommend  # noqa: E402
+
+
+def make_market(n_products, n_rows, merchants_per_product=5, n_competitors=3, seed=42):
+    """Integer-coded sales and offers drawn from per-product linear demand curves."""
+    rng = np.random.default_rng(seed)
+    base_price = rng.uniform(10, 400, n_products)
+    true_elasticity = rng.uniform(-3.0, -0.5, n_products)
+    base_quantity = rng.uniform(1, 3, n_products)
+    slope = true_elasticity * base_quantity / base_price
+    intercept = base_quantity - slope * base_price
+
+    product = rng.integers(0, n_products, n_rows).astype(np.int32)
+    price = np.round(base_price[product] * rng.uniform(0.8, 1.2, n_rows), 2)
+    quantity = rng.poisson(np.maximum(intercept[product] + slope[product] * price, 0.01)).astype(np.int64)
+    sales = pd.DataFrame({"product_id": product, "price": price, "quantity": quantity})
+
+    pairs = n_products * merchants_per_product
+    offer_product = np.repeat(np.arange(n_products, dtype=np.int32), merchants_per_product)
+    merchant_price = np.round(base_price[offer_product] * rng.uniform(0.8, 1.2, pairs), 2)
+    sentiment = rng.uniform(-1, 1, n_products)
+    offers = pd.DataFrame({
+        "product_id": np.repeat(offer_product, n_competitors),
+        "merchant_id": np.repeat(np.tile(np.arange(merchants_per_product, dtype=np.int32), n_products),
+                                 n_competitors),
+        "competitor_price": np.round(np.repeat(base_price[offer_product], n_competitors)
+                                     * rng.uniform(0.85, 1.25, pairs * n_competitors), 2),
+        "merchant_price": np.repeat(merchant_price, n_competitors),
+    })
+    offers["avg_product_sentiment"] = sentiment[offers["product_id"]]
+    pct_diff = (offers["competitor_price"] - offers["merchant_price"]) / offers["merchant_price"] * 100
+    offers["recommendation"], offers["suggested_price"] = recommend(pct_diff, offers["merchant_price"])
+    truth = pd.DataFrame({"intercept": intercept, "slope": slope, "elasticity": true_elasticity})
+    return sales, offers, truth
+
+
+def timed(fn, repeat):
+    best, out = float("inf"), None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        out = fn()
+        best = min(best, time.perf_counter() - start)
+    return best, out
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--products", type=int, default=100_000)
+    parser.add_argument("--rows", type=int, default=10_000_000)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args(argv)
+
+    sales, offers, truth = make_market(args.products, args.rows)
+    print(f"{len(sales):,} transactions, {args.products:,} products, {len(offers):,} competitor offers")
+
+    t_fit, demand = timed(lambda: fit_demand(demand_stats(sales["product_id"], sales["price"],
+                                                          sales["quantity"], args.products)), args.repeat)
+    t_opt, result = timed(lambda: optimize(offer_table(offers), demand), args.repeat)
+    print(f"{'demand fit':<14} {t_fit:7.3f}s  {len(sales) / t_fit / 1e6:8.1f} M rows/s")
+    print(f"{'optimization':<14} {t_opt:7.3f}s  {len(result) / t_opt / 1e6:8.1f} M offers/s")
+
+    error = (demand["elasticity"] - truth["elasticity"]).abs()
+    print(f"elasticity error: median {error.median():.3f}, p90 {error.quantile(0.9):.3f} "
+          f"(true range {truth['elasticity'].min():.1f} .. {truth['elasticity'].max():.1f})")
+
+    # score every price under the true curves, not the fitted ones
+    codes = result["product_id"].to_numpy()
+    a, b = truth["intercept"].to_numpy()[codes], truth["slope"].to_numpy()[codes]
+    current = expected_revenue(result["merchant_price"], a, b).sum()
+    for name, col in [("current price", "merchant_price"), ("rule-based", "rule_price"),
+                      ("optimizer", "optimal_price")]:
+        revenue = expected_revenue(result[col], a, b).sum()
+        print(f"{name:<14} expected revenue {revenue:16,.0f}  ({(revenue / current - 1) * 100:+6.2f}% vs current)")
+
+
+if __name__ == "__main__":
+    main()
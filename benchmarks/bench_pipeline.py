@@ -0,0 +1,228 @@
+"""
+Benchmark suite: every pipeline stage on scaled synthetic fixtures.
+
+Fixtures with 10K, 1M and 10M transactions (plus matching merchants, products,
+competitor prices and reviews) are generated deterministically by synthetic.py into
+`benchmarks/fixtures/<size>/data/raw/` and reused while their spec is unchanged.
+Each stage script (benchmarking, forecasting, segmentation, pricing, sentiment,
+optimization) then runs in its own process against a fixture, starting from empty
+processed outputs, state and caches. Wall time, peak RSS and rows per second of
+the stage's driving input are recorded.
+
+Results go to `benchmarks/results/latest.json` (plus a timestamped copy). Each
+stage is compared against the committed baseline `benchmarks/baseline.json` (10k
+size; `--save-baseline` rewrites it) and slowdowns or memory growth beyond
+`--tolerance` are flagged; the exit code is 1 if anything regressed. Runs with no
+baseline entry are listed as not compared. Timings depend on the machine, so
+re-save the baseline on the machine that runs the comparison.
+
+Stage options are taken from the environment as usual (e.g. BENCH_STREAMING=1,
+STORAGE_FORMAT=arrow) and stored with the results.
+
+Usage:
+    python benchmarks/bench_pipeline.py [--sizes 10k 1m 10m] [--stages benchmarking pricing]
+                                        [--repeat 1] [--tolerance 0.2] [--save-baseline]
+"""
+
+import argparse
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+from datetime import date, datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import synthetic  # noqa: E402
+from pipeline import STAGES, run_stage  # noqa: E402
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+FIXTURE_DIR = os.path.join(BENCH_DIR, "fixtures")
+RESULTS_DIR = os.path.join(BENCH_DIR, "results")
+BASELINE_PATH = os.path.join(BENCH_DIR, "baseline.json")
+
+SIZES = {
+    "10k": dict(n_transactions=10_000, n_merchants=50, n_products=200, n_days=90,
+                n_reviews=2_000, merchants_per_product=10),
+    "1m": dict(n_transactions=1_000_000, n_merchants=500, n_products=5_000, n_days=365,
+               n_reviews=50_000, merchants_per_product=10),
+    "10m": dict(n_transactions=10_000_000, n_merchants=2_000, n_products=20_000, n_days=730,
+                n_reviews=250_000, merchants_per_product=10),
+}
+FIXTURE_SEED = 42
+FIXTURE_START = date(2024, 1, 1)
+
+# stages in dependency order; each one's rows/s is measured against this raw table
+BENCH_STAGES = {
+    "benchmarking": "transactions",
+    "forecasting": "transactions",
+    "segmentation": "merchants",
+    "pricing": "competitor_prices",
+    "sentiment": "reviews",
+    "optimization": "transactions",
+}
+# stage outputs and caches cleared before every run so each one starts cold
+SCRATCH = ["processed", "state", "cache", "cube", "store", "reports"]
+# environment knobs the stages read, recorded with the results
+KNOBS = ["STORAGE_FORMAT", "BENCH_STREAMING", "BENCH_CHUNK_SIZE", "USE_CUBE", "USE_PRICE_STORE",
+         "DISTINCT_BACKEND", "FORECAST_MODE", "FORECAST_BY_SERIES", "SEGMENT_MODE", "N_CLUSTERS",
+         "PRICING_RULES", "SENTIMENT_WORKERS", "OPTIMIZER_BAND", "OPTIMIZER_SENTIMENT_PREMIUM",
+         "ELASTICITY_PRIOR", "ELASTICITY_PRIOR_WEIGHT", "IO_THREADS", "IO_CHUNK_ROWS"]
+
+
+# ----------------------------------
+# Fixtures
+# ----------------------------------
+
+def fixture_rows(spec):
+    return {
+        "transactions": spec["n_transactions"],
+        "merchants": spec["n_merchants"],
+        "products": spec["n_products"],
+        "competitor_prices": spec["n_products"] * min(spec["merchants_per_product"], spec["n_merchants"])
+                             * len(synthetic.COMPETITORS),
+        "reviews": spec["n_reviews"],
+    }
+
+
+def ensure_fixture(size):
+    """Root directory of the fixture for `size`, generating it if missing or outdated."""
+    spec = dict(SIZES[size], seed=FIXTURE_SEED, start_date=FIXTURE_START.isoformat())
+    root = os.path.join(FIXTURE_DIR, size)
+    meta_path = os.path.join(root, "fixture.json")
+    if os.path.exists(meta_path):
+        with open(meta_path) as f:
+            if json.load(f) == spec:
+                return root
+    print(f"[bench] generating {size} fixture ...", flush=True)
+    shutil.rmtree(root, ignore_errors=True)
+    synthetic.write_dataset(os.path.join(root, "data", "raw"), seed=FIXTURE_SEED,
+                            start_date=FIXTURE_START, **SIZES[size])
+    with open(meta_path, "w") as f:
+        json.dump(spec, f, indent=2)
+    return root
+
+
+def reset_outputs(root):
+    for name in SCRATCH:
+        shutil.rmtree(os.path.join(root, "data", name), ignore_errors=True)
+
+
+# ----------------------------------
+# Runs
+# ----------------------------------
+
+def bench_size(size, stages, repeat):
+    root = ensure_fixture(size)
+    rows = fixture_rows(SIZES[size])
+    best = {}
+    for _ in range(repeat):
+        reset_outputs(root)
+        for name in stages:
+            result = run_stage(name, STAGES[name], cwd=root, stdout=subprocess.DEVNULL)
+            if result["returncode"] != 0:
+                print(f"[bench] {size} {name}: exit {result['returncode']}")
+            if name not in best or result["wall_s"] < best[name]["wall_s"]:
+                best[name] = result
+    out = []
+    for name in stages:
+        result = best[name]
+        n = rows[BENCH_STAGES[name]]
+        out.append({
+            "size": size,
+            "stage": name,
+            "rows": n,
+            "wall_s": result["wall_s"],
+            "peak_rss_mb": result["peak_rss_mb"],
+            "rows_per_s": round(n / result["wall_s"]) if result["wall_s"] else None,
+            "returncode": result["returncode"],
+        })
+        print(f"{size:>4} {name:<13} {result['wall_s']:9.2f}s {result['peak_rss_mb']:9.1f} MB "
+              f"{out[-1]['rows_per_s'] or 0:>14,} rows/s", flush=True)
+    return out
+
+
+def compare(results, baseline, tolerance, min_delta):
+    """
+    Regressions of `results` against `baseline` beyond the tolerance (and min_delta
+    seconds), plus the runs that couldn't be compared (no baseline entry, or failed).
+    """
+    previous = {(r["size"], r["stage"]): r for r in baseline["results"]}
+    regressions, skipped = [], []
+    for r in results:
+        old = previous.get((r["size"], r["stage"]))
+        if old is None:
+            skipped.append(f"{r['size']} {r['stage']}: not in the baseline")
+            continue
+        if r["returncode"] != 0:
+            skipped.append(f"{r['size']} {r['stage']}: exit {r['returncode']}")
+            continue
+        if r["wall_s"] > old["wall_s"] * (1 + tolerance) and r["wall_s"] - old["wall_s"] > min_delta:
+            regressions.append(f"{r['size']} {r['stage']}: wall {old['wall_s']}s -> {r['wall_s']}s")
+        if r["peak_rss_mb"] > old["peak_rss_mb"] * (1 + tolerance):
+            regressions.append(f"{r['size']} {r['stage']}: peak RSS {old['peak_rss_mb']} MB -> "
+                               f"{r['peak_rss_mb']} MB")
+    return regressions, skipped
+
+
+def write_json(path, payload):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w") as f:
+        json.dump(payload, f, indent=2)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--sizes", nargs="+", choices=list(SIZES), default=list(SIZES))
+    parser.add_argument("--stages", nargs="+", choices=list(BENCH_STAGES), default=list(BENCH_STAGES))
+    parser.add_argument("--repeat", type=int, default=1, help="runs per size; the fastest is kept")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="allowed relative slowdown / RSS growth")
+    parser.add_argument("--min-delta", type=float, default=0.25, help="ignore slowdowns below this many seconds")
+    parser.add_argument("--baseline", default=BASELINE_PATH)
+    parser.add_argument("--save-baseline", action="store_true", help="store these results as the new baseline")
+    args = parser.parse_args(argv)
+
+    # stages run in dependency order, whatever order they were given in
+    stages = [s for s in BENCH_STAGES if s in args.stages]
+    results = []
+    for size in args.sizes:
+        results.extend(bench_size(size, stages, args.repeat))
+
+    started = datetime.now()
+    payload = {
+        "timestamp": started.isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "config": {k: os.environ[k] for k in KNOBS if k in os.environ},
+        "results": results,
+    }
+    write_json(os.path.join(RESULTS_DIR, "latest.json"), payload)
+    write_json(os.path.join(RESULTS_DIR, f"results-{started:%Y%m%d-%H%M%S}.json"), payload)
+    print(f"[bench] results written to {os.path.join(RESULTS_DIR, 'latest.json')}")
+
+    status = 1 if any(r["returncode"] != 0 for r in results) else 0
+    if args.save_baseline:
+        write_json(args.baseline, payload)
+        print(f"[bench] baseline saved to {args.baseline}")
+    elif os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            regressions, skipped = compare(results, json.load(f), args.tolerance, args.min_delta)
+        for line in skipped:
+            print(f"[bench] not compared: {line}")
+        for line in regressions:
+            print(f"[bench] REGRESSION {line}")
+        if regressions:
+            status = 1
+        elif len(skipped) < len(results):
+            print("[bench] no regressions against the baseline")
+    else:
+        print(f"[bench] no baseline at {args.baseline}, nothing compared "
+              f"(run with --save-baseline to create one)")
+    return status
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,77 @@
+"""
+Benchmark: row-wise `DataFrame.apply` pricing rules vs the vectorized rule engine.
+
+Usage:
+    python benchmarks/bench_pricing_rules.py [n_rows ...]     (default: 1M and 10M rows)
+
+Also checks that both produce bit-identical `recommendation` / `suggested_price`.
+"""
+
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from pricing_rules import recommend  # noqa: E402
+
+
+# Original row-wise rules from mod 4
+def recommend_row(row):
+    if row["pct_diff"] > 5:
+        return "Increase Price"
+    elif row["pct_diff"] < -5:
+        return "Decrease Price"
+    else:
+        return "Keep Same"
+
+
+def suggest_price_row(row):
+    if row["recommendation"] == "Increase Price":
+        return round(row["merchant_price"] * 1.05, 2)
+    elif row["recommendation"] == "Decrease Price":
+        return round(row["merchant_price"] * 0.95, 2)
+    else:
+        return row["merchant_price"]
+
+
+def make_prices(n, seed=42):
+    rng = np.random.default_rng(seed)
+    base_price = np.round(rng.uniform(10, 400, n), 2)
+    comp = pd.DataFrame({
+        "competitor_price": np.round(base_price * rng.uniform(0.85, 1.25, n), 2),
+        "merchant_price": np.round(base_price * rng.uniform(0.8, 1.2, n), 2),
+    })
+    comp["price_gap"] = comp["competitor_price"] - comp["merchant_price"]
+    comp["pct_diff"] = (comp["price_gap"] / comp["merchant_price"]) * 100
+    return comp
+
+
+def run(n):
+    comp = make_prices(n)
+
+    start = time.perf_counter()
+    reco_rows = comp.apply(recommend_row, axis=1)
+    price_rows = comp.assign(recommendation=reco_rows).apply(suggest_price_row, axis=1)
+    t_apply = time.perf_counter() - start
+
+    start = time.perf_counter()
+    reco_vec, price_vec = recommend(comp["pct_diff"], comp["merchant_price"])
+    t_vec = time.perf_counter() - start
+
+    identical = (
+        np.array_equal(reco_rows.to_numpy(dtype=object), reco_vec)
+        and np.array_equal(price_rows.to_numpy(dtype=np.float64).view(np.int64), price_vec.view(np.int64))
+    )
+    print(f"{n:>12,} rows | apply {t_apply:8.2f}s | vectorized {t_vec:7.3f}s | "
+          f"speedup {t_apply / t_vec:7.1f}x | bit-identical: {identical}")
+    return identical
+
+
+if __name__ == "__main__":
+    sizes = [int(float(a)) for a in sys.argv[1:]] or [1_000_000, 10_000_000]
+    ok = all([run(n) for n in sizes])
+    sys.exit(0 if ok else 1)
@@ -0,0 +1,136 @@
+"""
+Load test for the online price recommendation service.
+
+Measures p50/p99 latency and requests per second for:
+  - in-process `PricingService.suggest` calls (one at a time),
+  - in-process competitor price updates,
+  - the batched asyncio recommender with many concurrent callers,
+  - the local HTTP front end with keep-alive client connections.
+
+Usage:
+    python benchmarks/bench_pricing_service.py [--products 20000] [--requests 20000] [--concurrency 64]
+"""
+
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from pricing_service import BatchingRecommender, PricingService, serve  # noqa: E402
+
+
+def make_prices(n_products, n_merchants=50, per_product=10, seed=42):
+    rng = np.random.default_rng(seed)
+    n = n_products * per_product
+    base = np.repeat(np.round(rng.uniform(10, 400, n_products), 2), per_product)
+    return pd.DataFrame({
+        "product_id": np.repeat([f"P{i:06d}" for i in range(n_products)], per_product),
+        "merchant_id": [f"M{i:03d}" for i in rng.integers(0, n_merchants, n)],
+        "competitor": rng.choice(["CompA", "CompB", "CompC"], n),
+        "competitor_price": np.round(base * rng.uniform(0.85, 1.25, n), 2),
+        "merchant_price": np.round(base * rng.uniform(0.8, 1.2, n), 2),
+    })
+
+
+def report(name, latencies, elapsed):
+    lat = np.asarray(latencies) * 1e3
+    print(f"{name:<28} p50 {np.percentile(lat, 50):8.4f} ms | p99 {np.percentile(lat, 99):8.4f} ms | "
+          f"{len(lat) / elapsed:10,.0f} req/s")
+
+
+def bench_in_process(service, keys):
+    latencies = []
+    start = time.perf_counter()
+    for p, m in keys:
+        t = time.perf_counter()
+        service.suggest(p, m)
+        latencies.append(time.perf_counter() - t)
+    report("in-process suggest", latencies, time.perf_counter() - start)
+
+
+def bench_updates(service, keys, rng):
+    prices = np.round(rng.uniform(10, 400, len(keys)), 2)
+    latencies = []
+    start = time.perf_counter()
+    for (p, m), price in zip(keys, prices):
+        t = time.perf_counter()
+        service.update(p, m, "CompA", price)
+        latencies.append(time.perf_counter() - t)
+    report("in-process update", latencies, time.perf_counter() - start)
+
+
+async def bench_batched(service, keys, concurrency):
+    recommender = BatchingRecommender(service)
+    latencies = []
+
+    async def worker(chunk):
+        for p, m in chunk:
+            t = time.perf_counter()
+            await recommender.suggest(p, m)
+            latencies.append(time.perf_counter() - t)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker(keys[i::concurrency]) for i in range(concurrency)))
+    report(f"batched x{concurrency}", latencies, time.perf_counter() - start)
+    recommender.close()
+
+
+async def bench_http(service, keys, concurrency, port=0):
+    server = await serve(service, port=port)
+    host, port = server.sockets[0].getsockname()[:2]
+    latencies = []
+
+    async def client(chunk):
+        reader, writer = await asyncio.open_connection(host, port)
+        for p, m in chunk:
+            t = time.perf_counter()
+            writer.write(f"GET /suggest?product_id={p}&merchant_id={m} HTTP/1.1\r\nHost: x\r\n\r\n".encode())
+            await writer.drain()
+            length = 0
+            while True:
+                line = await reader.readline()
+                if line == b"\r\n":
+                    break
+                if line.lower().startswith(b"content-length:"):
+                    length = int(line.split(b":")[1])
+            await reader.readexactly(length)
+            latencies.append(time.perf_counter() - t)
+        writer.close()
+
+    start = time.perf_counter()
+    await asyncio.gather(*(client(keys[i::concurrency]) for i in range(concurrency)))
+    report(f"http x{concurrency}", latencies, time.perf_counter() - start)
+    server.close()
+    await server.wait_closed()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--products", type=int, default=20_000)
+    parser.add_argument("--requests", type=int, default=20_000)
+    parser.add_argument("--concurrency", type=int, default=64)
+    args = parser.parse_args(argv)
+
+    comp = make_prices(args.products)
+    start = time.perf_counter()
+    service = PricingService.from_frame(comp)
+    print(f"loaded {len(comp):,} competitor prices in {time.perf_counter() - start:.2f}s")
+
+    rng = np.random.default_rng(0)
+    pairs = comp[["product_id", "merchant_id"]].drop_duplicates().to_numpy()
+    keys = [tuple(pairs[i]) for i in rng.integers(0, len(pairs), args.requests)]
+
+    bench_in_process(service, keys)
+    bench_updates(service, keys, rng)
+    asyncio.run(bench_batched(service, keys, args.concurrency))
+    asyncio.run(bench_http(service, keys, args.concurrency))
+
+
+if __name__ == "__main__":
+    main()
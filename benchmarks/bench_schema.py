@@ -0,0 +1,70 @@
+"""
+Benchmark for the compact raw-table schema (schema.py) against inferred types.
+
+Reads every raw CSV table of a benchmark fixture twice, once with plain
+`pd.read_csv` (float64/int64/string everywhere) and once through
+`schema.read_csv`, and reports parse time and resident memory
+(`memory_usage(deep=True)`) of both, checking the values are unchanged.
+
+Usage:
+    python benchmarks/bench_schema.py [--size 1m] [--repeat 3]
+"""
+
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bench_pipeline import SIZES, ensure_fixture  # noqa: E402
+from schema import SCHEMAS, read_csv  # noqa: E402
+
+
+def timed(fn, repeat):
+    best, out = float("inf"), None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        out = fn()
+        best = min(best, time.perf_counter() - start)
+    return best, out
+
+
+def same_values(inferred, compact):
+    for col in inferred.columns:
+        a, b = inferred[col], compact[col]
+        if pd.api.types.is_datetime64_any_dtype(b):
+            a = pd.to_datetime(a)
+        elif pd.api.types.is_float_dtype(b) and b.dtype == np.float32:
+            b = np.round(b.astype(np.float64), 2)
+        elif isinstance(b.dtype, pd.CategoricalDtype):
+            b = b.astype(a.dtype)
+        if not (a.to_numpy() == b.to_numpy()).all():
+            return False
+    return True
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--size", choices=list(SIZES), default="1m")
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args(argv)
+
+    raw = os.path.join(ensure_fixture(args.size), "data", "raw")
+    print(f"{'table':<18} {'rows':>11} {'inferred':>18} {'schema':>18} {'memory':>8} {'parse':>7}")
+    for table in SCHEMAS:
+        path = os.path.join(raw, table + ".csv")
+        t_plain, plain = timed(lambda: pd.read_csv(path), args.repeat)
+        t_compact, compact = timed(lambda: read_csv(path, table), args.repeat)
+        mem_plain = plain.memory_usage(deep=True, index=False).sum() / 2**20
+        mem_compact = compact.memory_usage(deep=True, index=False).sum() / 2**20
+        check = "" if same_values(plain, compact) else "  VALUES DIFFER"
+        print(f"{table:<18} {len(plain):>11,} {mem_plain:9.1f} MB {t_plain:5.2f}s {mem_compact:9.1f} MB "
+              f"{t_compact:5.2f}s {mem_plain / mem_compact:7.1f}x {t_plain / t_compact:6.2f}x{check}")
+
+
+if __name__ == "__main__":
+    main()
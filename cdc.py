@@ -0,0 +1,297 @@
+"""
+Change-data-capture ingestion for the raw tables.
+
+New transactions, competitor price observations and reviews arrive all day as
+small delta files instead of full snapshots. `python cdc.py ingest` picks up the
+CSV deltas dropped into `data/deltas/<table>/` (in file name order) and for each:
+
+  1. drops rows whose key was already ingested or repeats within the file, so a
+     re-delivered or overlapping delta changes nothing (a file whose content was
+     ingested before, under any name, is skipped whole),
+  2. appends the remaining rows to the raw table without rewriting it (a change
+     segment, see storage.append_changes, or new day files of a date-partitioned
+     dataset),
+  3. records a batch in `data/state/cdc/manifest.json`: the per-table batch counter
+     is the table's watermark; the files written and the latest date seen are kept
+     with it.
+
+Keys (KEYS): reviews by review_id, competitor prices by product, merchant,
+competitor and date. Transactions carry no ID, and two identical sales are both
+real, so they are deduplicated per delivery instead (DELIVERY_KEYED): a row's key
+is its delta file, its position in the file and its fields. A file re-delivered
+unchanged adds nothing and a file appended to in place adds only its new rows,
+while a sale identical to one already ingested is kept. Deltas that may overlap
+other deltas row by row need an ID to be deduplicated. Ingested keys are kept as
+64-bit hashes, one `<table>.keys/batch-<n>.npy` per batch (plus `base.npy` for the
+rows of the snapshot), so recording a batch never rewrites the others.
+
+Stages run with CDC=1 keep their own watermark per input table. `pending` returns
+the rows of the batches a stage hasn't consumed, the stage recomputes only the
+merchants / products those rows touch and upserts them into its outputs, then
+`commit`s. A stage without a watermark, or whose input snapshot was replaced
+(e.g. regenerated by market starter.py), recomputes everything. Stages are
+expected to run in pipeline order, so mod 5 sees mod 4's upserted rows.
+"""
+
+import argparse
+import glob
+import hashlib
+import json
+import os
+import shutil
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+from schema import SCHEMAS, apply_schema, read_csv
+from storage import append_changes, append_partitioned, find_table, read_table, table_files
+
+CDC_DIR = "data/state/cdc"
+INBOX_DIR = "data/deltas"
+KEYS = {
+    "transactions": ["date", "merchant_id", "product_id", "price", "quantity", "revenue"],
+    "competitor_prices": ["product_id", "merchant_id", "competitor", "date"],
+    "reviews": ["review_id"],
+}
+# tables without an ID column: rows are keyed by the delta file and their position in it
+DELIVERY_KEYED = {"transactions"}
+
+
+def key_hashes(df, key):
+    """uint64 hash of every row's key, computed on the values as text so dtypes don't matter."""
+    return pd.util.hash_pandas_object(df[key].astype(str), index=False).to_numpy()
+
+
+def delivery_hashes(df, key, source):
+    """uint64 hash of every row's key together with its delta file and row position."""
+    return pd.util.hash_pandas_object(
+        pd.DataFrame({"source": source, "row": np.arange(len(df)), "key": key_hashes(df, key)}),
+        index=False).to_numpy()
+
+
+def file_signature(path):
+    stat = os.stat(path)
+    return f"{stat.st_size}:{stat.st_mtime_ns}"
+
+
+def content_digest(path):
+    digest = hashlib.blake2b(digest_size=16)
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def outputs_exist(directory, names):
+    try:
+        for name in names:
+            find_table(directory, name)
+    except FileNotFoundError:
+        return False
+    return True
+
+
+class ChangeLog:
+    def __init__(self, directory="data/raw", state_dir=CDC_DIR):
+        self.directory = directory
+        self.state_dir = state_dir
+        os.makedirs(state_dir, exist_ok=True)
+        self.manifest = self._read_manifest()
+
+    def _manifest_path(self):
+        return os.path.join(self.state_dir, "manifest.json")
+
+    def _read_manifest(self):
+        if not os.path.exists(self._manifest_path()):
+            return {"tables": {}, "consumers": {}}
+        with open(self._manifest_path()) as f:
+            return json.load(f)
+
+    def _write_manifest(self):
+        tmp = self._manifest_path() + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump(self.manifest, f, indent=2)
+        os.replace(tmp, self._manifest_path())
+
+    def _keys_dir(self, table):
+        return os.path.join(self.state_dir, f"{table}.keys")
+
+    # ----------------------------------
+    # Snapshot tracking
+    # ----------------------------------
+
+    def _base_signature(self, table, state):
+        """Fingerprint of the table's files that were not written by ingestion."""
+        written = {f for batch in state["batches"] for f in batch["files"]}
+        try:
+            files = [os.path.abspath(f) for f in table_files(self.directory, table)]
+        except FileNotFoundError:
+            return None
+        digest = hashlib.blake2b(digest_size=16)
+        for path in sorted(set(files) - written):
+            digest.update(f"{path}={file_signature(path)};".encode())
+        return digest.hexdigest()
+
+    def _state(self, table):
+        """The table's log, reset (for every consumer) if its snapshot was replaced."""
+        state = self.manifest["tables"].get(table) or {"batch": 0, "base": None, "sources": {}, "batches": [],
+                                                       "max_date": None}
+        base = self._base_signature(table, state)
+        if state["base"] != base:
+            state = {"batch": state["batch"], "base": base, "sources": {}, "batches": [], "max_date": None}
+            for marks in self.manifest["consumers"].values():
+                marks.pop(table, None)
+            shutil.rmtree(self._keys_dir(table), ignore_errors=True)
+        state.setdefault("deliveries", {})
+        self.manifest["tables"][table] = state
+        return state
+
+    def _keys(self, table):
+        """Sorted hashes of every key ingested into `table` (snapshot rows included)."""
+        directory = self._keys_dir(table)
+        os.makedirs(directory, exist_ok=True)
+        base = os.path.join(directory, "base.npy")
+        if table not in DELIVERY_KEYED and not os.path.exists(base):
+            try:
+                existing = read_table(self.directory, table, columns=KEYS[table])
+                np.save(base, np.unique(key_hashes(existing, KEYS[table])))
+            except FileNotFoundError:
+                pass
+        parts = [np.load(os.path.join(directory, name)) for name in sorted(os.listdir(directory))
+                 if name.endswith(".npy")]
+        return np.unique(np.concatenate(parts)) if parts else np.empty(0, dtype=np.uint64)
+
+    # ----------------------------------
+    # Ingestion
+    # ----------------------------------
+
+    def ingest(self, table, paths):
+        """Apply delta files to `table` in the given order; returns the batches recorded."""
+        state = self._state(table)
+        keys = self._keys(table)
+        added = []  # keys of the batches recorded by this call, not merged into `keys`
+        _, fmt = find_table(self.directory, table)
+        batches = []
+        for delta in paths:
+            source = os.path.abspath(delta)
+            if state["sources"].get(source) == file_signature(delta):
+                continue
+            digest = content_digest(delta)
+            rows = read_csv(delta, table)
+            if digest in state["deliveries"]:
+                # the same content was delivered before, possibly under another name
+                fresh = np.zeros(len(rows), dtype=bool)
+            else:
+                if table in DELIVERY_KEYED:
+                    hashes = delivery_hashes(rows, KEYS[table], source)
+                else:
+                    hashes = key_hashes(rows, KEYS[table])
+                pos = np.minimum(np.searchsorted(keys, hashes), max(len(keys) - 1, 0))
+                seen = (keys[pos] == hashes) if len(keys) else np.zeros(len(rows), dtype=bool)
+                if added:
+                    seen |= np.isin(hashes, np.concatenate(added))
+                fresh = ~seen & ~pd.Series(hashes).duplicated().to_numpy()
+            new = rows[fresh].reset_index(drop=True)
+            state["batch"] += 1
+
+            files = []
+            if len(new):
+                if fmt == "dataset":
+                    files = append_partitioned(new, self.directory, table)
+                else:
+                    # raw tables are never compacted: batches keep pointing at their segments
+                    files = [append_changes(new, self.directory, table, compact=False)]
+                added.append(hashes[fresh])
+                np.save(os.path.join(self._keys_dir(table), f"batch-{state['batch']:06d}.npy"), added[-1])
+            if len(new) and "date" in new.columns:
+                latest = pd.Timestamp(new["date"].max()).strftime("%Y-%m-%d")
+                state["max_date"] = max(filter(None, [state.get("max_date"), latest]))
+
+            batch = {
+                "batch": state["batch"],
+                "source": source,
+                "rows": len(rows),
+                "added": len(new),
+                "files": [os.path.abspath(f) for f in files],
+                "ingested_at": datetime.now().isoformat(timespec="seconds"),
+            }
+            state["batches"].append(batch)
+            state["sources"][source] = file_signature(delta)
+            state["deliveries"][digest] = state["batch"]
+            self._write_manifest()
+            batches.append(batch)
+        return batches
+
+    def ingest_inbox(self, tables=None, inbox=INBOX_DIR):
+        """Ingest every delta CSV waiting in `<inbox>/<table>/`; returns {table: batches}."""
+        done = {}
+        for table in tables or KEYS:
+            paths = sorted(glob.glob(os.path.join(inbox, table, "*.csv")))
+            if paths:
+                done[table] = self.ingest(table, paths)
+        return done
+
+    # ----------------------------------
+    # Consumers
+    # ----------------------------------
+
+    def watermark(self, table):
+        return self._state(table)["batch"]
+
+    def tracking(self, consumer, tables):
+        """Whether `consumer` can update incrementally: it has a current watermark for every table."""
+        for table in tables:
+            self._state(table)
+        marks = self.manifest["consumers"].get(consumer, {})
+        return all(t in marks for t in tables)
+
+    def pending(self, consumer, table, columns=None):
+        """Rows added to `table` since `consumer`'s watermark."""
+        state = self._state(table)
+        mark = self.manifest["consumers"].get(consumer, {}).get(table, 0)
+        files = [f for batch in state["batches"] if batch["batch"] > mark for f in batch["files"]]
+        frames = [apply_schema(pd.read_parquet(f, columns=columns), table) for f in files]
+        if not frames:
+            names = columns or list(dict.fromkeys(KEYS[table] + list(SCHEMAS.get(table, {}))))
+            return pd.DataFrame({c: pd.Series(dtype=object) for c in names})
+        return pd.concat(frames, ignore_index=True)
+
+    def commit(self, consumer, tables):
+        """Move `consumer`'s watermarks to the latest batch of each table."""
+        marks = self.manifest["consumers"].setdefault(consumer, {})
+        for table in tables:
+            marks[table] = self._state(table)["batch"]
+        self._write_manifest()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Change-data-capture ingestion of raw table deltas")
+    sub = parser.add_subparsers(dest="command", required=True)
+    cmd = sub.add_parser("ingest", help="ingest delta CSVs waiting in the inbox")
+    cmd.add_argument("tables", nargs="*", help=f"any of {', '.join(KEYS)} (default: all)")
+    cmd.add_argument("--inbox", default=INBOX_DIR)
+    cmd.add_argument("--directory", default="data/raw")
+    sub.add_parser("status", help="show watermarks")
+    args = parser.parse_args(argv)
+
+    log = ChangeLog(getattr(args, "directory", "data/raw"))
+    if args.command == "ingest":
+        unknown = set(args.tables) - set(KEYS)
+        if unknown:
+            parser.error(f"unknown tables: {', '.join(sorted(unknown))}")
+        for table, batches in log.ingest_inbox(args.tables or None, args.inbox).items():
+            for b in batches:
+                print(f"{table} batch {b['batch']}: {os.path.basename(b['source'])} "
+                      f"{b['added']}/{b['rows']} rows added")
+    else:
+        for table in KEYS:
+            if table in log.manifest["tables"]:
+                state = log.manifest["tables"][table]
+                print(f"{table}: watermark {state['batch']}, latest date {state.get('max_date')}")
+        for consumer, marks in log.manifest["consumers"].items():
+            print(f"{consumer}: " + ", ".join(f"{t}@{b}" for t, b in marks.items()))
+
+
+if __name__ == "__main__":
+    main()
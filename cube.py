@@ -0,0 +1,217 @@
+"""
+Materialized sales cube at (date, merchant_id, product_id) grain.
+
+Each cell holds revenue_sum, quantity_sum, count and price_sum, which is enough to
+derive every aggregate mod 1 and mod 2 need (sums, means, distinct products per
+merchant, daily totals) and any coarser dashboard rollup without touching raw
+transaction rows again.
+
+The cube lives in `data/cube/` as Parquet segments plus a manifest. `sync(paths)`
+makes the cube hold exactly the given transaction files: files it hasn't seen are
+aggregated in chunks into one new segment, so new days (or late rows for old days)
+are added incrementally; cells are additive, so readers simply re-sum by the grain.
+If a file that was already ingested changes on disk (e.g. a regenerated snapshot)
+or is no longer among the given files (e.g. the raw layout switched from a flat
+file to daily partitions), the cube is rebuilt because its old contribution cannot
+be subtracted out. Each set of files gets its own cube directory.
+
+Stages running in parallel (benchmarking and forecasting) share the cube, so every
+update holds an exclusive lock on `<cube>/.lock` and reads hold it shared; the
+manifest is re-read whenever the lock is taken.
+"""
+
+import json
+import os
+from contextlib import contextmanager
+
+import pandas as pd
+
+from schema import apply_schema, read_csv, widen
+from storage import file_lock
+
+CUBE_DIR = "data/cube"
+GRAIN = ["date", "merchant_id", "product_id"]
+MEASURES = ["revenue_sum", "quantity_sum", "count", "price_sum"]
+COMPACT_AFTER = 16
+
+
+def aggregate(sales):
+    """Cube cells for a frame of raw transactions (sums in float64)."""
+    sales = widen(sales).assign(date=pd.to_datetime(sales["date"]),
+                         merchant_id=sales["merchant_id"].astype(str),
+                         product_id=sales["product_id"].astype(str))
+    return (
+        sales.groupby(GRAIN, sort=False)
+             .agg(revenue_sum=("revenue", "sum"),
+                  quantity_sum=("quantity", "sum"),
+                  count=("revenue", "size"),
+                  price_sum=("price", "sum"))
+             .reset_index()
+    )
+
+
+def file_signature(path):
+    stat = os.stat(path)
+    return f"{stat.st_size}:{stat.st_mtime_ns}"
+
+
+def combine(cells):
+    """Re-sum cube cells that share a grain key."""
+    return cells.groupby(GRAIN, sort=True)[MEASURES].sum().reset_index()
+
+
+class SalesCube:
+    def __init__(self, directory=CUBE_DIR, compact_after=COMPACT_AFTER):
+        self.directory = directory
+        self.compact_after = compact_after
+        os.makedirs(directory, exist_ok=True)
+        self._lock_depth = 0
+        self.manifest = self._read_manifest()
+
+    @contextmanager
+    def _locked(self, shared=False):
+        # sync() clears and compacts under its own lock, so nested calls just run
+        if self._lock_depth:
+            yield
+            return
+        with file_lock(os.path.join(self.directory, ".lock"), shared=shared):
+            self._lock_depth += 1
+            try:
+                self.manifest = self._read_manifest()
+                yield
+            finally:
+                self._lock_depth -= 1
+
+    def _manifest_path(self):
+        return os.path.join(self.directory, "manifest.json")
+
+    def _read_manifest(self):
+        if not os.path.exists(self._manifest_path()):
+            return {"segments": [], "next_segment": 0, "sources": {}}
+        with open(self._manifest_path()) as f:
+            return json.load(f)
+
+    def _write_manifest(self):
+        tmp = self._manifest_path() + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump(self.manifest, f, indent=2)
+        os.replace(tmp, self._manifest_path())
+
+    def _write_segment(self, cells):
+        name = f"segment-{self.manifest['next_segment']:06d}.parquet"
+        cells.to_parquet(os.path.join(self.directory, name), index=False)
+        self.manifest["next_segment"] += 1
+        self.manifest["segments"].append(name)
+
+    def clear(self):
+        with self._locked():
+            for name in self.manifest["segments"]:
+                os.remove(os.path.join(self.directory, name))
+            self.manifest = {"segments": [], "next_segment": self.manifest["next_segment"], "sources": {}}
+            self._write_manifest()
+
+    def append(self, sales):
+        """Aggregate a frame of transactions into a new segment."""
+        with self._locked():
+            cells = aggregate(sales)
+            self._write_segment(cells)
+            self._write_manifest()
+            if len(self.manifest["segments"]) >= self.compact_after:
+                self.compact()
+            return len(cells)
+
+    def sync(self, paths, chunksize=1_000_000):
+        """
+        Make the cube hold exactly the transaction files in `paths` (tracked by size +
+        mtime). Files not ingested yet are read in chunks and added as one segment;
+        if an ingested file changed or is no longer listed, the cube is rebuilt.
+        Returns the number of raw rows read (0 if nothing changed).
+        """
+        with self._locked():
+            current = {os.path.abspath(p): file_signature(p) for p in paths}
+            if any(current.get(source) != signature for source, signature in self.manifest["sources"].items()):
+                # old cells can't be subtracted out, start over
+                self.clear()
+            new = {source: signature for source, signature in current.items()
+                   if self.manifest["sources"].get(source) != signature}
+            if not new:
+                return 0
+
+            parts, n_rows = [], 0
+            columns = ["date", "merchant_id", "product_id", "price", "quantity", "revenue"]
+            for path in new:
+                if path.endswith(".csv"):
+                    chunks = read_csv(path, "transactions", usecols=columns, chunksize=chunksize)
+                else:
+                    chunks = [apply_schema(pd.read_parquet(path, columns=columns), "transactions")]
+                for chunk in chunks:
+                    parts.append(aggregate(chunk))
+                    n_rows += len(chunk)
+            if parts:
+                self._write_segment(combine(pd.concat(parts, ignore_index=True)))
+            self.manifest["sources"].update(new)
+            self._write_manifest()
+            if len(self.manifest["segments"]) >= self.compact_after:
+                self.compact()
+            return n_rows
+
+    def sync_file(self, path, chunksize=1_000_000):
+        """Ingest one more transaction file once, keeping the other sources that still exist."""
+        with self._locked():
+            source = os.path.abspath(path)
+            others = [s for s in self.manifest["sources"] if s != source and os.path.exists(s)]
+            return self.sync(others + [path], chunksize)
+
+    def compact(self):
+        """Merge all segments into one."""
+        with self._locked():
+            cells = self.cells()
+            old = list(self.manifest["segments"])
+            self.manifest["segments"] = []
+            self._write_segment(cells)
+            self._write_manifest()
+            for name in old:
+                os.remove(os.path.join(self.directory, name))
+
+    def cells(self, columns=None):
+        """All cube cells, re-summed by grain."""
+        with self._locked(shared=True):
+            if not self.manifest["segments"]:
+                return pd.DataFrame({c: pd.Series(dtype="datetime64[ns]" if c == "date" else
+                                                  (object if c in GRAIN else "float64"))
+                                     for c in GRAIN + MEASURES})
+            parts = [pd.read_parquet(os.path.join(self.directory, name)) for name in self.manifest["segments"]]
+            cells = parts[0] if len(parts) == 1 else combine(pd.concat(parts, ignore_index=True))
+            return cells if columns is None else cells[columns]
+
+
+def rollup(cells, by, freq=None, merchants=None, products=None):
+    """
+    Coarser aggregates from cube cells, e.g. revenue by region and product category
+    per week: rollup(cells, ["region", "category"], freq="W", merchants=..., products=...).
+
+    `merchants` contributes region (and merchant_category); `products` contributes
+    category. With `freq`, dates are bucketed into periods of that frequency.
+    """
+    if merchants is not None:
+        attrs = merchants[["merchant_id", "region", "category"]].rename(columns={"category": "merchant_category"})
+        cells = cells.merge(attrs.astype({"merchant_id": str}), on="merchant_id", how="left")
+    if products is not None:
+        cells = cells.merge(products[["product_id", "category"]].astype({"product_id": str}),
+                            on="product_id", how="left")
+    keys = list(by)
+    if freq is not None:
+        cells = cells.assign(period=cells["date"].dt.to_period(freq).dt.start_time)
+        keys = ["period"] + keys
+    out = cells.groupby(keys, sort=True, dropna=False)[MEASURES].sum().reset_index()
+    out["avg_price"] = out["price_sum"] / out["count"]
+    return out
+
+
+def daily_revenue(cells):
+    """Total revenue per date (the mod 2 series) from cube cells."""
+    return (
+        cells.groupby("date", sort=True)
+             .agg(total_revenue=("revenue_sum", "sum"))
+             .reset_index()
+    )
@@ -0,0 +1,216 @@
+"""
+Daily revenue forecasting helpers for mod 2, with an incremental state store.
+
+A full run groups every transaction by date. In incremental mode the daily revenue
+series is kept in a small persisted store (`data/state/daily_revenue`) together with
+the list of transaction files already folded in (keyed by path). New files are
+grouped on their own and added into the stored series, so an update costs O(new
+rows) plus O(days). If a folded-in file changed (e.g. rows were appended) or
+disappeared, its old contribution can't be subtracted, so the store is rebuilt.
+A full rebuild (the default mode of mod 2) recomputes the store from scratch.
+
+`forecast_all_series` forecasts every merchant x product series at once from a
+dense (series x day) NumPy matrix: moving average, simple exponential smoothing
+and seasonal naive, without any per-series DataFrames or Python loops over series.
+"""
+
+import glob
+import os
+
+import numpy as np
+import pandas as pd
+
+from schema import read_csv
+from storage import find_table, read_table, write_table
+
+STATE_DIR = "data/state"
+SERIES_NAME = "daily_revenue"
+APPLIED_NAME = "daily_revenue_files"
+
+
+def daily_revenue(sales):
+    """Total revenue per date, sorted by date."""
+    # group on the raw dates and parse only the distinct ones; regroup in case
+    # several spellings parse to the same day
+    daily = sales.groupby("date", observed=True).agg(total_revenue=("revenue", "sum")).reset_index()
+    daily["date"] = pd.to_datetime(daily["date"].astype(str)
+                                   if not pd.api.types.is_datetime64_any_dtype(daily["date"]) else daily["date"])
+    if daily["date"].duplicated().any():
+        daily = daily.groupby("date").agg(total_revenue=("total_revenue", "sum")).reset_index()
+    return daily.sort_values("date").reset_index(drop=True)
+
+
+def fold_in(daily, new_daily):
+    """Add a new daily series into an existing one (dates may overlap)."""
+    if daily.empty:
+        return new_daily
+    combined = pd.concat([daily, new_daily], ignore_index=True)
+    return (
+        combined.groupby("date", sort=True)
+                .agg(total_revenue=("total_revenue", "sum"))
+                .reset_index()
+    )
+
+
+def no_applied_files():
+    return pd.DataFrame({"path": pd.Series(dtype=object), "size": pd.Series(dtype="int64"),
+                         "mtime_ns": pd.Series(dtype="int64")})
+
+
+def file_signature(path):
+    stat = os.stat(path)
+    return {"path": os.path.abspath(path), "size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+
+
+def read_new_sales(path):
+    return read_csv(path, "transactions", usecols=["date", "revenue"])
+
+
+def load_state(state_dir=STATE_DIR):
+    """(daily series, applied files) from the store, or None if it doesn't exist yet."""
+    try:
+        find_table(state_dir, SERIES_NAME)
+    except FileNotFoundError:
+        return None
+    daily = read_table(state_dir, SERIES_NAME)
+    daily["date"] = pd.to_datetime(daily["date"])
+    try:
+        applied = read_table(state_dir, APPLIED_NAME)
+    except FileNotFoundError:
+        applied = no_applied_files()
+    return daily, applied
+
+
+def save_state(daily, applied, state_dir=STATE_DIR):
+    write_table(daily, state_dir, SERIES_NAME, export_csv=False)
+    write_table(applied, state_dir, APPLIED_NAME, export_csv=False)
+
+
+def rebuild_state(sales, new_files_pattern=None, state_dir=STATE_DIR):
+    """
+    Full rebuild of the store from all transactions plus every delta file matching
+    `new_files_pattern`; gives the reference result for the incremental path.
+    """
+    files = [file_signature(p) for p in sorted(glob.glob(new_files_pattern))] if new_files_pattern else []
+    if files:
+        sales = pd.concat([sales[["date", "revenue"]]] + [read_new_sales(f["path"]) for f in files],
+                          ignore_index=True)
+    daily = daily_revenue(sales)
+    applied = pd.DataFrame(files) if files else no_applied_files()
+    save_state(daily, applied, state_dir)
+    return daily
+
+
+def update_state(new_files_pattern, load_sales, state_dir=STATE_DIR):
+    """
+    Fold transaction files matching `new_files_pattern` that haven't been applied
+    yet into the stored series. If an applied file changed on disk or no longer
+    matches, the store is rebuilt from `load_sales()` plus every matching file;
+    otherwise `load_sales()` is only called to bootstrap the store.
+    Returns (daily series, list of newly applied files).
+    """
+    current = {sig["path"]: sig for sig in map(file_signature, sorted(glob.glob(new_files_pattern)))}
+    state = load_state(state_dir)
+    if state is None:
+        state = rebuild_state(load_sales(), state_dir=state_dir), no_applied_files()
+    daily, applied = state
+
+    # path -> (size, mtime_ns) of the version folded in (the last one, for stores
+    # written while files were keyed by signature)
+    seen = {path: (int(size), int(mtime)) for path, size, mtime in
+            zip(applied["path"], applied["size"], applied["mtime_ns"])}
+    stale = [path for path, sig in seen.items()
+             if path not in current or (current[path]["size"], current[path]["mtime_ns"]) != sig]
+    if stale or len(seen) < len(applied):
+        # an applied file changed or vanished: its old rows can't be taken out again
+        daily = rebuild_state(load_sales(), new_files_pattern, state_dir)
+        return daily, list(current)
+
+    new_files = [sig for path, sig in current.items() if path not in seen]
+
+    for sig in new_files:
+        daily = fold_in(daily, daily_revenue(read_new_sales(sig["path"])))
+
+    if new_files:
+        applied = pd.concat([applied, pd.DataFrame(new_files)], ignore_index=True)
+        save_state(daily, applied, state_dir)
+    return daily, [sig["path"] for sig in new_files]
+
+
+def with_applied_files(sales, state_dir=STATE_DIR):
+    """
+    `sales` plus every delta file folded into the store, i.e. the same input the
+    stored daily series was built from.
+    """
+    state = load_state(state_dir)
+    paths = [] if state is None else list(dict.fromkeys(state[1]["path"]))
+    if not paths:
+        return sales
+    columns = list(sales.columns)
+    return pd.concat([sales] + [read_csv(p, "transactions", usecols=columns) for p in paths],
+                     ignore_index=True)
+
+
+# -----------------------------------------------------
+# Multi-series forecasting (one series per merchant x product)
+# -----------------------------------------------------
+
+def series_matrix(sales, keys=("merchant_id", "product_id")):
+    """
+    Pivot transactions into a dense (series x day) revenue matrix without building
+    per-series frames. Days with no sales are zero-filled.
+    Returns (matrix, series key frame, DatetimeIndex of days).
+    """
+    keys = list(keys)
+    codes, series_keys = pd.MultiIndex.from_frame(sales[keys]).factorize()
+    dates = sales["date"]
+    if isinstance(dates.dtype, pd.CategoricalDtype):
+        # parse each distinct date once instead of every row
+        dates = pd.to_datetime(dates.cat.categories)[dates.cat.codes]
+    dates = pd.DatetimeIndex(dates).normalize()
+    first = dates.min()
+    day = np.asarray((dates - first).days, dtype=np.int64)
+    n_series, n_days = len(series_keys), int(day.max()) + 1
+
+    flat = np.bincount(codes * n_days + day, weights=sales["revenue"].to_numpy(dtype=np.float64),
+                       minlength=n_series * n_days)
+    key_frame = series_keys.to_frame(index=False, name=keys)
+    return flat.reshape(n_series, n_days), key_frame, pd.date_range(first, periods=n_days, freq="D")
+
+
+def moving_average_forecast(matrix, window=7):
+    """Mean of the last `window` days for every series."""
+    return matrix[:, -window:].mean(axis=1)
+
+
+def exponential_smoothing_forecast(matrix, alpha=0.3):
+    """Simple exponential smoothing level after the last day, for every series at once."""
+    level = matrix[:, 0].copy()
+    for t in range(1, matrix.shape[1]):
+        level += alpha * (matrix[:, t] - level)
+    return level
+
+
+def seasonal_naive_forecast(matrix, horizon=30, season=7):
+    """
+    Repeat the last `season` days forward; returns a (series x horizon) matrix.
+    Series shorter than a season repeat all the days they have.
+    """
+    season = max(1, min(season, matrix.shape[1]))
+    last_season = matrix[:, -season:]
+    return last_season[:, np.arange(horizon) % season]
+
+
+def forecast_all_series(sales, keys=("merchant_id", "product_id"), window=7, alpha=0.3,
+                        season=7, horizon=30):
+    """Long-format forecasts (one row per series and future date) for every series."""
+    matrix, key_frame, days = series_matrix(sales, keys)
+    n_series = matrix.shape[0]
+    future = pd.date_range(days[-1] + pd.Timedelta(days=1), periods=horizon, freq="D")
+
+    out = key_frame.iloc[np.repeat(np.arange(n_series), horizon)].reset_index(drop=True)
+    out["date"] = np.tile(future.to_numpy(), n_series)
+    out["forecast_moving_avg"] = np.repeat(moving_average_forecast(matrix, window), horizon)
+    out["forecast_exp_smoothing"] = np.repeat(exponential_smoothing_forecast(matrix, alpha), horizon)
+    out["forecast_seasonal_naive"] = seasonal_naive_forecast(matrix, horizon, season).ravel()
+    return out
@@ -0,0 +1,109 @@
+"""
+Shared dictionary encoding for ID columns.
+
+Merchant, product, competitor and review IDs are short strings, so every groupby
+and merge on them hashes Python strings and the columns dominate memory. The
+scripts instead swap ID columns for dense int32 codes right after loading, run all
+joins and aggregations on the codes, and decode back to strings only when writing
+outputs.
+
+Each ID domain keeps one append-only mapping in `data/state/id_dictionary/`
+(`<domain>.parquet`, row position = code), so a given ID gets the same code in
+every stage and every run. New IDs are appended when first seen and persisted by
+`save()`, which holds an exclusive lock on `<dir>/.lock` while it merges them into
+the file (loads hold it shared), so stages saving in parallel don't lose IDs. Only the unique values of a column go through the dictionary; rows are
+mapped with a positional take.
+"""
+
+import os
+
+import numpy as np
+import pandas as pd
+
+from storage import file_lock, read_table, write_table
+
+ID_DIR = "data/state/id_dictionary"
+# column -> ID domain; columns sharing a domain share codes (e.g. product_id everywhere)
+ID_COLUMNS = {
+    "merchant_id": "merchant",
+    "product_id": "product",
+    "competitor": "competitor",
+    "review_id": "review",
+}
+CODE_DTYPE = np.int32
+
+
+class IdDictionary:
+    def __init__(self, directory=ID_DIR):
+        self.directory = directory
+        self._domains = {}
+        self._added = {}
+
+    def _lock_path(self):
+        return os.path.join(self.directory, ".lock")
+
+    def _load(self, domain):
+        try:
+            ids = read_table(self.directory, domain)["id"].astype(str)
+        except FileNotFoundError:
+            ids = []
+        return pd.Index(ids, dtype=object)
+
+    def _domain(self, domain):
+        if domain not in self._domains:
+            with file_lock(self._lock_path(), shared=True):
+                self._domains[domain] = self._load(domain)
+            self._added[domain] = 0
+        return self._domains[domain]
+
+    def encode(self, domain, values):
+        """int32 codes for `values` (-1 for missing), adding unseen IDs to the domain."""
+        index = self._domain(domain)
+        inverse, uniques = pd.factorize(pd.Series(values), use_na_sentinel=True)
+        uniques = pd.Index(np.asarray(uniques, dtype=str), dtype=object)
+        codes = index.get_indexer(uniques)
+        if (codes < 0).any():
+            new = uniques[codes < 0].sort_values()
+            index = self._domains[domain] = index.append(new)
+            self._added[domain] += len(new)
+            if len(index) > np.iinfo(CODE_DTYPE).max:
+                raise OverflowError(f"Too many IDs for int32 codes in domain '{domain}'")
+            codes = index.get_indexer(uniques)
+        out = np.full(len(inverse), -1, dtype=CODE_DTYPE)
+        found = inverse >= 0
+        out[found] = codes[inverse[found]]
+        return out
+
+    def decode(self, domain, codes, index=None):
+        """String IDs for int codes (missing for -1), as a Series on `index`."""
+        codes = np.asarray(codes)
+        found = codes >= 0
+        values = np.full(len(codes), None, dtype=object)
+        values[found] = self._domain(domain).to_numpy()[codes[found]]
+        return pd.Series(values, index=index)
+
+    def encode_frame(self, df):
+        """Copy of `df` with every known ID column replaced by its codes."""
+        columns = [c for c in df.columns if c in ID_COLUMNS]
+        return df.assign(**{c: self.encode(ID_COLUMNS[c], df[c]) for c in columns})
+
+    def decode_frame(self, df):
+        """Copy of `df` with every coded ID column decoded back to strings."""
+        columns = [c for c in df.columns if c in ID_COLUMNS and pd.api.types.is_integer_dtype(df[c])]
+        return df.assign(**{c: self.decode(ID_COLUMNS[c], df[c], df.index) for c in columns})
+
+    def save(self):
+        """
+        Persist IDs added in this process. Under the lock, the mapping on disk is
+        re-read and only IDs it doesn't have yet are appended, so a concurrent stage
+        that saved in the meantime keeps its codes.
+        """
+        for domain, added in self._added.items():
+            if not added:
+                continue
+            with file_lock(self._lock_path()):
+                fresh = self._load(domain)
+                new = self._domains[domain].difference(fresh, sort=False)
+                if len(new):
+                    write_table(pd.DataFrame({"id": fresh.append(new)}), self.directory, domain, export_csv=False)
+            self._added[domain] = 0
@@ -0,0 +1,204 @@
+"""
+Lightweight instrumentation for the stage scripts.
+
+Scripts call `start("<stage>")` once and wrap their named steps:
+
+    with step("load") as s:
+        sales = read_table(base, "transactions")
+        s.rows = len(sales)
+
+With INSTRUMENT=1 every step appends one JSON line to INSTRUMENT_LOG (default
+`data/state/instrumentation.jsonl`) with its stage, wall time, row count, RSS delta
+and peak RSS; a final "total" line covers the whole stage. Otherwise `step` returns
+a shared no-op object, so the wrappers cost next to nothing.
+
+PROFILE=<stage>[,<stage>...] (or "all") runs the chosen stages under a profiler and
+writes the profile next to the outputs in `data/processed/`:
+
+  - PROFILER=cprofile (default): `<stage>.prof` (pstats) plus `<stage>.prof.txt`,
+    the top functions by cumulative time,
+  - PROFILER=sample: a signal-based sampling profiler (every PROFILE_INTERVAL
+    seconds of CPU time, Unix only) writing collapsed stacks to `<stage>.folded`
+    for flame graph tools.
+"""
+
+import atexit
+import json
+import os
+import sys
+import time
+from collections import Counter
+
+try:
+    import resource
+except ImportError:  # not available on Windows
+    resource = None
+
+ENABLED = os.environ.get("INSTRUMENT", "0") == "1"
+LOG_PATH = os.environ.get("INSTRUMENT_LOG", "data/state/instrumentation.jsonl")
+PROFILE = [s for s in os.environ.get("PROFILE", "").split(",") if s]
+PROFILER = os.environ.get("PROFILER", "cprofile")
+PROFILE_INTERVAL = float(os.environ.get("PROFILE_INTERVAL", "0.005"))
+PROFILE_DIR = "data/processed"
+
+_stage = None
+
+
+# ----------------------------------
+# Memory
+# ----------------------------------
+
+def rss_mb():
+    """Current resident set size in MB (0 where it can't be read)."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2**20
+    except (OSError, ValueError, AttributeError):
+        return 0.0
+
+
+def peak_rss_mb():
+    if resource is None:
+        return 0.0
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on Linux, bytes on macOS
+    return peak / 2**20 if sys.platform == "darwin" else peak / 1024
+
+
+# ----------------------------------
+# Events
+# ----------------------------------
+
+def emit(event):
+    os.makedirs(os.path.dirname(LOG_PATH) or ".", exist_ok=True)
+    with open(LOG_PATH, "a") as f:
+        f.write(json.dumps(event) + "\n")
+
+
+class _Step:
+    __slots__ = ("name", "rows", "_start", "_rss")
+
+    def __init__(self, name, rows=None):
+        self.name = name
+        self.rows = rows
+
+    def __enter__(self):
+        self._rss = rss_mb()
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        wall = time.perf_counter() - self._start
+        rss = rss_mb()
+        emit({
+            "ts": time.time(),
+            "pid": os.getpid(),
+            "stage": _stage,
+            "step": self.name,
+            "wall_s": round(wall, 6),
+            "rows": None if self.rows is None else int(self.rows),
+            "rows_per_s": round(self.rows / wall) if self.rows and wall > 0 else None,
+            "rss_mb": round(rss, 1),
+            "rss_delta_mb": round(rss - self._rss, 1),
+            "peak_rss_mb": round(peak_rss_mb(), 1),
+            "error": exc_type.__name__ if exc_type is not None else None,
+        })
+        return False
+
+
+class _NullStep:
+    """Shared no-op stand-in for `_Step` while instrumentation is off."""
+
+    rows = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+    def __setattr__(self, name, value):
+        pass
+
+
+_NULL_STEP = _NullStep()
+
+
+def step(name, rows=None):
+    """Context manager timing one named step of the current stage."""
+    return _Step(name, rows) if ENABLED else _NULL_STEP
+
+
+# ----------------------------------
+# Profilers
+# ----------------------------------
+
+class _SamplingProfiler:
+    """Collects the main thread's stack every `interval` seconds of CPU time."""
+
+    def __init__(self, interval):
+        self.interval = interval
+        self.stacks = Counter()
+
+    def _sample(self, signum, frame):
+        stack = []
+        while frame is not None:
+            code = frame.f_code
+            stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})")
+            frame = frame.f_back
+        self.stacks[";".join(reversed(stack))] += 1
+
+    def start(self):
+        import signal
+        signal.signal(signal.SIGPROF, self._sample)
+        signal.setitimer(signal.ITIMER_PROF, self.interval, self.interval)
+
+    def stop(self, path):
+        import signal
+        signal.setitimer(signal.ITIMER_PROF, 0, 0)
+        with open(path, "w") as f:
+            for stack, count in self.stacks.most_common():
+                f.write(f"{stack} {count}\n")
+        return path
+
+
+def _start_profiler(stage):
+    os.makedirs(PROFILE_DIR, exist_ok=True)
+    base = os.path.join(PROFILE_DIR, stage)
+    if PROFILER == "sample":
+        profiler = _SamplingProfiler(PROFILE_INTERVAL)
+        profiler.start()
+        return lambda: profiler.stop(base + ".folded")
+
+    import cProfile
+    import pstats
+    profiler = cProfile.Profile()
+    profiler.enable()
+
+    def stop():
+        profiler.disable()
+        profiler.dump_stats(base + ".prof")
+        with open(base + ".prof.txt", "w") as f:
+            pstats.Stats(profiler, stream=f).sort_stats("cumulative").print_stats(40)
+        return base + ".prof"
+
+    return stop
+
+
+def start(stage):
+    """Name the current stage; starts its profiler and total timer when enabled."""
+    global _stage
+    _stage = stage
+    profiling = stage in PROFILE or "all" in PROFILE
+    if not (ENABLED or profiling):
+        return
+    stop_profiler = _start_profiler(stage) if profiling else None
+    total = _Step("total").__enter__() if ENABLED else None
+
+    def finish():
+        if stop_profiler is not None:
+            print(f"[instrument] {stage} profile written to {stop_profiler()}")
+        if total is not None:
+            total.__exit__(None, None, None)
+
+    atexit.register(finish)
@@ -0,0 +1,107 @@
+"""
+Index-backed left joins for dimension-like right sides (one row per key).
+
+`pd.merge(left, right, on=key, how="left")` hashes the right keys on every call and
+copies every column of the (wide) left frame into a new one. `join_columns` instead
+looks the left keys up in a `KeyIndex` (the right keys sorted, plus each key's row
+position in `right`) and gathers only the requested right columns by position into
+`left`, in place.
+
+Indexes are persisted in `data/state/join_index/<name>.npz` together with a hash of
+the key column they were built from, so a later stage or run joining against the
+same keys (e.g. per-product metrics in mod 1 and mod 5, both keyed by product_id
+codes) loads the index instead of sorting again. For small non-negative integer
+keys such as the int32 ID codes from id_dictionary.py, lookups go through a
+direct-address table instead of a binary search.
+"""
+
+import hashlib
+import os
+
+import numpy as np
+import pandas as pd
+
+INDEX_DIR = "data/state/join_index"
+# use a direct-address table when the largest key is at most this many times the key count
+DENSE_FACTOR = 8
+
+
+def key_hash(keys):
+    """Stable hash of a key column (values and order)."""
+    keys = np.asarray(keys)
+    data = keys.tobytes() if keys.dtype.kind in "iu" else pd.util.hash_array(keys.astype(object)).tobytes()
+    return hashlib.blake2b(data, digest_size=16).hexdigest()
+
+
+class KeyIndex:
+    def __init__(self, keys, positions, source_hash=None):
+        """`keys` sorted and unique; `positions[i]` is the row of `keys[i]` in the right frame."""
+        self.keys = keys
+        self.positions = positions
+        self.source_hash = source_hash
+        self._dense = None
+
+    @classmethod
+    def build(cls, keys):
+        keys = np.asarray(keys)
+        order = np.argsort(keys, kind="stable")
+        sorted_keys = keys[order]
+        if len(sorted_keys) > 1 and (sorted_keys[1:] == sorted_keys[:-1]).any():
+            raise ValueError("Join keys on the right side must be unique")
+        return cls(sorted_keys, order.astype(np.int64), key_hash(keys))
+
+    @classmethod
+    def cached(cls, name, keys, directory=INDEX_DIR):
+        """The persisted index `name` if it was built from the same keys, else a fresh (saved) one."""
+        path = os.path.join(directory, name + ".npz")
+        if os.path.exists(path):
+            with np.load(path, allow_pickle=False) as saved:
+                if str(saved["source_hash"]) == key_hash(keys):
+                    return cls(saved["keys"], saved["positions"], str(saved["source_hash"]))
+        index = cls.build(keys)
+        if index.keys.dtype.kind in "iuUS":
+            index.save(path)
+        return index
+
+    def save(self, path):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        tmp = path + ".tmp.npz"
+        np.savez(tmp, keys=self.keys, positions=self.positions, source_hash=np.str_(self.source_hash))
+        os.replace(tmp, path)
+
+    def _dense_table(self):
+        if self._dense is None:
+            table = np.full(int(self.keys[-1]) + 1, -1, dtype=np.int64)
+            table[self.keys] = self.positions
+            self._dense = table
+        return self._dense
+
+    def lookup(self, keys):
+        """Row positions in the right frame for each key (-1 where there is no match)."""
+        keys = np.asarray(keys)
+        if not len(self.keys):
+            return np.full(len(keys), -1, dtype=np.int64)
+        if (keys.dtype.kind in "iu" and self.keys.dtype.kind in "iu" and self.keys[0] >= 0
+                and self.keys[-1] < DENSE_FACTOR * len(self.keys) + 1024):
+            table = self._dense_table()
+            inside = (keys >= 0) & (keys < len(table))
+            return np.where(inside, table[np.where(inside, keys, 0)], -1)
+        slot = np.searchsorted(self.keys, keys).clip(max=len(self.keys) - 1)
+        return np.where(self.keys[slot] == keys, self.positions[slot], -1)
+
+
+def join_columns(left, right, on, columns=None, index_name=None, directory=INDEX_DIR):
+    """
+    Left join of `right` (unique `on` keys) onto `left`: adds `columns` of `right`
+    (default all but `on`) to `left` in place and returns it. Unmatched rows get
+    missing values, like `pd.merge(..., how="left")`.
+
+    With `index_name` the key index is persisted and reused across calls.
+    """
+    columns = [c for c in right.columns if c != on] if columns is None else list(columns)
+    right_keys = right[on].to_numpy()
+    index = KeyIndex.cached(index_name, right_keys, directory) if index_name else KeyIndex.build(right_keys)
+    pos = index.lookup(left[on].to_numpy())
+    for col in columns:
+        left[col] = pd.Series(right[col].array.take(pos, allow_fill=True), index=left.index)
+    return left
@@ -14,6 +14,8 @@ How to run:
   - Run:
       python market_intel_starter.py
   - Generated files will be in `data/raw/` (transactions.csv, competitor_prices.csv, merchants.csv, reviews.csv)
+  - Large benchmark fixtures (10M-100M rows, vectorized and written in chunks):
+      TARGET_ROWS=10000000 N_MERCHANTS=2000 N_DAYS=730 python market_intel_starter.py
 
 """
 
@@ -24,10 +26,24 @@ import csv
 import pandas as pd
 import numpy as np
 
+import synthetic
+from storage import append_partitioned, remove_table, write_partitioned
+
 # --------------- Configuration -----------------
 OUT_DIR = "data/raw"
 DIAGRAM_PATH = "/mnt/data/5da35213-3641-4107-91cd-f5e7e1969ce1.png"
 SEED = 42
+
+# Large-scale mode: set TARGET_ROWS (e.g. TARGET_ROWS=10000000) to build benchmark
+# fixtures with the vectorized generator in `synthetic.py`, written in chunks.
+TARGET_ROWS = int(os.environ.get("TARGET_ROWS", "0")) or None
+N_MERCHANTS = int(os.environ.get("N_MERCHANTS", "12"))
+N_PRODUCTS = int(os.environ.get("N_PRODUCTS", "45"))
+N_DAYS = int(os.environ.get("N_DAYS", "120"))
+CHUNK_ROWS = int(os.environ.get("CHUNK_ROWS", str(synthetic.DEFAULT_CHUNK_ROWS)))
+# "partitioned" writes transactions and reviews as date-partitioned Parquet datasets
+# (data/raw/<name>/date=YYYY-MM-DD/) with typed dates instead of flat CSVs
+RAW_LAYOUT = os.environ.get("RAW_LAYOUT", "flat")
 random.seed(SEED)
 np.random.seed(SEED)
 
@@ -162,18 +178,44 @@ def generate_reviews(products_df, n_reviews=300):
     return pd.DataFrame(rows)
 
 # ---------------- Generate and write CSVs ----------------
-merchants_df = generate_merchants(12)
-products_df = generate_products(45)
-transactions_df = generate_transactions(merchants_df, products_df, n_days=120, avg_tx_per_day=8)
+merchants_df = generate_merchants(N_MERCHANTS)
+products_df = generate_products(N_PRODUCTS)
+# drawn in the original order so the small path reproduces the same files for a given SEED
+transactions_df = None if TARGET_ROWS else generate_transactions(merchants_df, products_df, n_days=N_DAYS, avg_tx_per_day=8)
 competitor_prices_df = generate_competitor_prices(products_df, merchants_df)
 reviews_df = generate_reviews(products_df, n_reviews=260)
 
 # Write CSVs
 merchants_df.to_csv(os.path.join(OUT_DIR, "merchants.csv"), index=False)
 products_df.to_csv(os.path.join(OUT_DIR, "products.csv"), index=False)
-transactions_df.to_csv(os.path.join(OUT_DIR, "transactions.csv"), index=False)
+# clear the previous dated tables whatever their layout, so a stale copy can't shadow the new one
+for name in ("transactions", "reviews"):
+    remove_table(OUT_DIR, name)
+if TARGET_ROWS:
+    # vectorized, bounded-memory generation for 10M-100M row fixtures
+    chunks = synthetic.iter_transaction_chunks(
+        merchants_df["merchant_id"], products_df["product_id"],
+        n_days=N_DAYS, target_rows=TARGET_ROWS, chunk_rows=CHUNK_ROWS, seed=SEED
+    )
+    if RAW_LAYOUT == "partitioned":
+        # chunks hold whole days, so every day is written exactly once
+        n_written = 0
+        for chunk in chunks:
+            append_partitioned(chunk, OUT_DIR, "transactions")
+            n_written += len(chunk)
+    else:
+        n_written = synthetic.write_transactions(os.path.join(OUT_DIR, "transactions.csv"), chunks)
+    print(f"Wrote {n_written} transactions in chunks of <= {CHUNK_ROWS} rows")
+else:
+    if RAW_LAYOUT == "partitioned":
+        write_partitioned(transactions_df, OUT_DIR, "transactions")
+    else:
+        transactions_df.to_csv(os.path.join(OUT_DIR, "transactions.csv"), index=False)
 competitor_prices_df.to_csv(os.path.join(OUT_DIR, "competitor_prices.csv"), index=False)
-reviews_df.to_csv(os.path.join(OUT_DIR, "reviews.csv"), index=False)
+if RAW_LAYOUT == "partitioned":
+    write_partitioned(reviews_df, OUT_DIR, "reviews")
+else:
+    reviews_df.to_csv(os.path.join(OUT_DIR, "reviews.csv"), index=False)
 
 print("\nGenerated files:")
 for f in os.listdir(OUT_DIR):
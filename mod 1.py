@@ -2,73 +2,149 @@ import pandas as pd
 import numpy as np
 import os
 
-# Load data
+from async_io import prefetch
+from benchmarking import competitor_metrics as build_competitor_metrics, stream_benchmark
+from benchmarking import MerchantPartials, benchmark_shard, merchant_metrics
+from cdc import ChangeLog, outputs_exist
+from cube import SalesCube
+from distinct import make_distinct
+from id_dictionary import IdDictionary
+from instrument import start, step
+from partitioned import cleanup, map_shards, partition_table
+from price_store import PriceStore
+from storage import table_files, upsert_table, write_table
+
+# Streaming mode: read transactions in chunks and merge per-merchant partial
+# aggregates instead of loading and widening the whole file (flat peak memory).
+STREAMING = os.environ.get("BENCH_STREAMING", "0") == "1"
+CHUNK_SIZE = int(os.environ.get("BENCH_CHUNK_SIZE", "1000000"))
+# Query the indexed competitor-price store (latest price per key, optionally as of
+# PRICE_AS_OF) instead of rescanning the raw competitor_prices file.
+USE_PRICE_STORE = os.environ.get("USE_PRICE_STORE", "0") == "1"
+PRICE_AS_OF = os.environ.get("PRICE_AS_OF")
+# Build merchant metrics from the (date, merchant, product) sales cube; raw
+# transactions are only read when the cube hasn't ingested them yet.
+USE_CUBE = os.environ.get("USE_CUBE", "0") == "1"
+# total_products counter for the chunked/cube paths: "pairs" (exact), "bitset"
+# (exact, integer-coded products) or "hll" (approximate, ~1.04/sqrt(2**HLL_PRECISION) error,
+# 2**HLL_PRECISION bytes per merchant whatever its product count)
+DISTINCT_BACKEND = os.environ.get("DISTINCT_BACKEND", "pairs")
+HLL_PRECISION = int(os.environ.get("HLL_PRECISION", "14"))
+# Partitioned mode: hash-partition transactions into PARTITIONS merchant_id shards and
+# process them in PARTITION_WORKERS processes (default: all cores); 0 = off
+PARTITIONS = int(os.environ.get("PARTITIONS", "0"))
+PARTITION_WORKERS = int(os.environ.get("PARTITION_WORKERS", "0")) or None
+# Change-data-capture mode (see cdc.py): recompute only merchants with new sales or
+# selling products with new competitor prices, and upsert them into the output
+CDC = os.environ.get("CDC", "0") == "1"
+
+start("benchmarking")
+
 base = "data/raw"
-sales = pd.read_csv(os.path.join(base, "transactions.csv"))
-competitors = pd.read_csv(os.path.join(base, "competitor_prices.csv"))
-merchants = pd.read_csv(os.path.join(base, "merchants.csv"))
 
-# ---------------------------
-# 1. Merchant Sales Metrics
-# ---------------------------
-sales_metrics = (
-    sales.groupby("merchant_id")
-         .agg(
-            total_revenue = ("revenue", "sum"),
-            avg_price = ("price", "mean"),
-            avg_quantity = ("quantity", "mean"),
-            total_products = ("product_id", "nunique")
-         )
-         .reset_index()
-)
 
-# ---------------------------
-# 2. Competitor Price Metrics
-# ---------------------------
-competitor_metrics = (
-    competitors.groupby("product_id")
-               .agg(
-                    avg_competitor_price = ("competitor_price", "mean"),
-                    merchant_price = ("merchant_price", "mean")
-               )
-               .reset_index()
-)
+def latest_prices():
+    store = PriceStore()
+    for path in table_files(base, "competitor_prices"):
+        store.sync_file(path)
+    return store.latest(PRICE_AS_OF)
 
-# Price gap
-competitor_metrics["price_gap"] = (
-    competitor_metrics["avg_competitor_price"] - competitor_metrics["merchant_price"]
-)
 
-# ---------------------------
-# 3. Merge merchant + competitor data
-# ---------------------------
-merged = sales.merge(competitor_metrics, on="product_id", how="left")
+# Load data: every input this run needs is read concurrently (see async_io.py)
+log = ChangeLog(base) if CDC else None
+incremental = CDC and log.tracking("benchmarking", ["transactions", "competitor_prices"]) \
+    and outputs_exist("data/processed", ["benchmarking_output"])
+batch = not (incremental or USE_CUBE or PARTITIONS or STREAMING)
+reads = {
+    "competitors": latest_prices if USE_PRICE_STORE else (base, "competitor_prices"),
+    "merchants": (base, "merchants"),
+}
+if DISTINCT_BACKEND == "bitset":
+    reads["products"] = (base, "products", {"columns": ["product_id"]})
+if batch:
+    reads["transactions"] = (base, "transactions")
+inputs = prefetch(reads)
+with step("load") as s:
+    competitors = inputs["competitors"].result()
+    merchants = inputs["merchants"].result()
+    s.rows = len(competitors) + len(merchants)
 
-# Now compute merchant-level competitor comparison
-merchant_comp_metrics = (
-    merged.groupby("merchant_id")
-          .agg(
-              merchant_avg_price = ("merchant_price", "mean"),
-              competitor_avg_price = ("avg_competitor_price", "mean"),
-              price_gap_avg = ("price_gap", "mean")
-          )
-          .reset_index()
-)
+product_domain = inputs["products"].result()["product_id"] if DISTINCT_BACKEND == "bitset" else None
+new_distinct = make_distinct(DISTINCT_BACKEND, product_domain, HLL_PRECISION)
 
-# ---------------------------
-# 4. Combine all metrics
-# ---------------------------
-benchmark_df = sales_metrics.merge(merchant_comp_metrics, on="merchant_id", how="left")
+if incremental:
+    # cube cells of the affected merchants only; every other output row stays as it is
+    with step("aggregate") as s:
+        new_sales = log.pending("benchmarking", "transactions", columns=["merchant_id"])
+        new_prices = log.pending("benchmarking", "competitor_prices", columns=["product_id"])
+        cube = SalesCube()
+        cube.sync(table_files(base, "transactions"), chunksize=CHUNK_SIZE)
+        cells = cube.cells()
+        repriced = cells["product_id"].isin(new_prices["product_id"].astype(str))
+        affected = set(new_sales["merchant_id"].astype(str)) | set(cells.loc[repriced, "merchant_id"])
+        cells = cells[cells["merchant_id"].isin(affected)]
+        partials = MerchantPartials.from_cube(cells, build_competitor_metrics(competitors), new_distinct)
+        benchmark_df = partials.finalize(merchants)
+        s.rows = len(benchmark_df)
+elif USE_CUBE:
+    with step("aggregate") as s:
+        cube = SalesCube()
+        cube.sync(table_files(base, "transactions"), chunksize=CHUNK_SIZE)
+        cells = cube.cells()
+        partials = MerchantPartials.from_cube(cells, build_competitor_metrics(competitors), new_distinct)
+        benchmark_df = partials.finalize(merchants)
+        s.rows = len(cells)
+elif PARTITIONS:
+    # merchant_id shards processed in parallel; each shard holds whole merchants
+    with step("partition"):
+        shards = partition_table(base, "transactions", "merchant_id", PARTITIONS, PARTITION_WORKERS)
+    with step("aggregate") as s:
+        benchmark_df = map_shards(benchmark_shard, shards, PARTITION_WORKERS,
+                                  broadcast={"comp_metrics": build_competitor_metrics(competitors)})
+        benchmark_df = benchmark_df.merge(merchants, on="merchant_id", how="left") \
+                                   .sort_values("merchant_id", ignore_index=True)
+        s.rows = len(benchmark_df)
+    cleanup(shards)
+elif STREAMING:
+    with step("aggregate") as s:
+        benchmark_df = stream_benchmark(
+            table_files(base, "transactions"), competitors, merchants, chunksize=CHUNK_SIZE,
+            new_distinct=new_distinct
+        )
+else:
+    # ID columns become int32 codes: every groupby/merge below runs on integers
+    ids = IdDictionary()
+    with step("load_transactions") as s:
+        sales = ids.encode_frame(inputs["transactions"].result())
+        competitors = ids.encode_frame(competitors)
+        merchants = ids.encode_frame(merchants)
+        s.rows = len(sales)
+
+    # ---------------------------
+    # 1-4. Merchant sales metrics, competitor price metrics (incl. price gap) and the
+    # merchant-level competitor comparison, joined through the persisted product_id index
+    # ---------------------------
+    competitor_metrics = build_competitor_metrics(competitors)
+    benchmark_df = merchant_metrics(sales, competitor_metrics, index_name="product_id")
+
+    # Add merchant attributes for richer benchmarking
+    benchmark_df = benchmark_df.merge(merchants, on="merchant_id", how="left")
 
-# Add merchant attributes for richer benchmarking
-benchmark_df = benchmark_df.merge(merchants, on="merchant_id", how="left")
+    # Back to string IDs, in merchant_id order as before
+    benchmark_df = ids.decode_frame(benchmark_df).sort_values("merchant_id", ignore_index=True)
+    ids.save()
 
 # ---------------------------
 # 5. Save Output
 # ---------------------------
-output_path = "data/processed/benchmarking_output.csv"
-os.makedirs("data/processed", exist_ok=True)
-benchmark_df.to_csv(output_path, index=False)
+with step("write", rows=len(benchmark_df)):
+    if not incremental:
+        output_path = write_table(benchmark_df, "data/processed", "benchmarking_output")
+    elif len(benchmark_df):
+        output_path = upsert_table(benchmark_df, "data/processed", "benchmarking_output",
+                                   key=["merchant_id"], sort=True)
+if CDC:
+    log.commit("benchmarking", ["transactions", "competitor_prices"])
 
 benchmark_df.head()
 print("mod 1 done")
\ No newline at end of file
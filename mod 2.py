@@ -1,24 +1,59 @@
 import pandas as pd
 import numpy as np
 import os
-import matplotlib.pyplot as plt
+import glob
 
-# Load sales data
-base = "data/raw"
-sales = pd.read_csv(os.path.join(base, "transactions.csv"))
+from async_io import BackgroundWriter
+from cube import CUBE_DIR, SalesCube, daily_revenue as cube_daily_revenue
+from forecasting import (file_signature, forecast_all_series, rebuild_state, save_state, update_state,
+                         with_applied_files)
+from instrument import start, step
+from storage import filter_dates, read_table, table_files, write_table
+
+# "full" recomputes the daily series from all transactions (and rebuilds the
+# persisted store); "incremental" only folds new transaction files into the store.
+FORECAST_MODE = os.environ.get("FORECAST_MODE", "full")
+NEW_TRANSACTIONS = os.environ.get("NEW_TRANSACTIONS", "data/incoming/transactions/*.csv")
+# Also forecast every merchant x product series (written to forecasting_by_series)
+FORECAST_BY_SERIES = os.environ.get("FORECAST_BY_SERIES", "0") == "1"
+# Read daily revenue from the pre-aggregated sales cube instead of raw transactions;
+# the new transaction files get a cube of their own, so mod 1 never sees them
+USE_CUBE = os.environ.get("USE_CUBE", "0") == "1"
+# Only use transactions dated within [FORECAST_START, FORECAST_END] (YYYY-MM-DD, either
+# optional); with a date-partitioned transactions dataset only those days are opened
+FORECAST_START = os.environ.get("FORECAST_START")
+FORECAST_END = os.environ.get("FORECAST_END")
 
-# Convert date column
-sales['date'] = pd.to_datetime(sales['date'])
+start("forecasting")
+
+base = "data/raw"
 
 # -----------------------------------------------------
 # 1. Aggregate to daily revenue
 # -----------------------------------------------------
-daily_sales = (
-    sales.groupby("date")
-         .agg(total_revenue=("revenue", "sum"))
-         .reset_index()
-         .sort_values("date")
-)
+with step("aggregate") as s:
+    if USE_CUBE:
+        cube, incoming_cube = SalesCube(), SalesCube(os.path.join(CUBE_DIR, "incoming"))
+        new_files = sorted(glob.glob(NEW_TRANSACTIONS))
+        cube.sync(table_files(base, "transactions"))
+        incoming_cube.sync(new_files)
+
+        def cube_cells(columns):
+            return pd.concat([filter_dates(cube.cells(columns), FORECAST_START, FORECAST_END),
+                              incoming_cube.cells(columns)], ignore_index=True)
+
+        daily_sales = cube_daily_revenue(cube_cells(["date", "revenue_sum"]))
+        save_state(daily_sales, pd.DataFrame([file_signature(p) for p in new_files],
+                                             columns=["path", "size", "mtime_ns"]))
+    elif FORECAST_MODE == "incremental":
+        daily_sales, new_files = update_state(NEW_TRANSACTIONS, lambda: read_table(
+            base, "transactions", start=FORECAST_START, end=FORECAST_END))
+        print(f"Folded in {len(new_files)} new transaction file(s)")
+    else:
+        # Load sales data
+        sales = read_table(base, "transactions", start=FORECAST_START, end=FORECAST_END)
+        daily_sales = rebuild_state(sales, NEW_TRANSACTIONS)
+    s.rows = len(daily_sales)
 
 # -----------------------------------------------------
 # 2. Create a simple moving average forecast
@@ -48,22 +83,30 @@ forecast_df = pd.DataFrame({
 # -----------------------------------------------------
 # 4. Save forecast output
 # -----------------------------------------------------
-os.makedirs("data/processed", exist_ok=True)
-output_path = "data/processed/forecasting_output.csv"
-forecast_df.to_csv(output_path, index=False)
+# written in the background while the per-series forecasts below are computed
+writes = BackgroundWriter()
+with step("write", rows=len(forecast_df)):
+    writes.write_table(forecast_df, "data/processed", "forecasting_output")
+
+if FORECAST_BY_SERIES:
+    if USE_CUBE:
+        sales = cube_cells(["date", "merchant_id", "product_id", "revenue_sum"]).rename(
+            columns={"revenue_sum": "revenue"})
+    else:
+        # the raw table plus the delta files folded into the daily series, in either mode
+        if FORECAST_MODE == "incremental":
+            sales = read_table(base, "transactions", columns=["date", "merchant_id", "product_id", "revenue"],
+                               start=FORECAST_START, end=FORECAST_END)
+        sales = with_applied_files(sales[["date", "merchant_id", "product_id", "revenue"]])
+    with step("forecast_series", rows=len(sales)):
+        series_forecast = forecast_all_series(sales, window=window)
+    with step("write_series", rows=len(series_forecast)):
+        write_table(series_forecast, "data/processed", "forecasting_by_series")
+output_path = writes.wait()[0]
 
 # Show first few rows
 forecast_df.head()
 
-
-plt.figure(figsize=(10,5))
-plt.plot(daily_sales['date'], daily_sales['total_revenue'], label="Actual Revenue")
-plt.plot(daily_sales['date'], daily_sales['moving_avg'], label="7-Day MA")
-plt.plot(forecast_df['date'], forecast_df['forecast_revenue'], linestyle='--', label="Forecast")
-plt.legend()
-plt.xlabel("Date")
-plt.ylabel("Revenue")
-plt.title("Sales Forecast")
-plt.show()
+# Figures are rendered separately: python reporting.py forecast
 
 print("mod 2 done")
\ No newline at end of file
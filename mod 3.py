@@ -1,12 +1,27 @@
 import pandas as pd
 import numpy as np
 import os
+
+from async_io import BackgroundWriter
+from storage import read_table, write_table
 from sklearn.preprocessing import StandardScaler
 from sklearn.cluster import KMeans
 
+from instrument import start, step
+from segmentation import best_k, k_sweep, segment
+
+# "batch" refits everything; "minibatch" scales with running stats, fits mini-batch
+# KMeans warm-started from the persisted centroids and reassigns only changed merchants.
+SEGMENT_MODE = os.environ.get("SEGMENT_MODE", "batch")
+# number of clusters, or "auto" to sweep candidate k values in parallel
+N_CLUSTERS = os.environ.get("N_CLUSTERS", "4")
+
+start("segmentation")
+
 # Load the benchmarking output
-bench_path = "data/processed/benchmarking_output.csv"
-benchmark = pd.read_csv(bench_path)
+with step("load") as s:
+    benchmark = read_table("data/processed", "benchmarking_output")
+    s.rows = len(benchmark)
 
 # ----------------------------------
 # 1. Select Features for Clustering
@@ -27,42 +42,50 @@ df_cluster = benchmark[features].copy()
 df_cluster = df_cluster.fillna(df_cluster.mean())
 
 # ----------------------------------
-# 2. Standardize Features
+# 2. Choose k
 # ----------------------------------
-scaler = StandardScaler()
-scaled_data = scaler.fit_transform(df_cluster)
+# the k sweep table is written in the background while the final clustering runs
+writes = BackgroundWriter()
+if N_CLUSTERS == "auto":
+    with step("k_sweep", rows=len(df_cluster)):
+        sweep = k_sweep(StandardScaler().fit_transform(df_cluster))
+    writes.write_table(sweep, "data/processed", "segmentation_k_sweep")
+    k = best_k(sweep)
+    print(sweep.to_string(index=False))
+    print(f"Selected k={k} (highest silhouette)")
+else:
+    k = int(N_CLUSTERS)  # default 4 clusters for clear segmentation
 
-# ----------------------------------
-# 3. Apply K-Means Clustering
-# ----------------------------------
-k = 4  # choose 4 clusters for clear segmentation
-kmeans = KMeans(n_clusters=k, random_state=42)
-clusters = kmeans.fit_predict(scaled_data)
+with step("cluster", rows=len(df_cluster)):
+    if SEGMENT_MODE == "minibatch":
+        clusters, n_assigned = segment(df_cluster, benchmark["merchant_id"], features, k)
+        print(f"Assigned {n_assigned} new or changed merchants")
+    else:
+        # ----------------------------------
+        # 3. Standardize Features
+        # ----------------------------------
+        scaler = StandardScaler()
+        scaled_data = scaler.fit_transform(df_cluster)
+
+        # ----------------------------------
+        # 4. Apply K-Means Clustering
+        # ----------------------------------
+        kmeans = KMeans(n_clusters=k, random_state=42)
+        clusters = kmeans.fit_predict(scaled_data)
 
 # Add cluster labels back to dataframe
 benchmark["cluster"] = clusters
 
 # ----------------------------------
-# 4. Save Output
+# 5. Save Output
 # ----------------------------------
-output_path = "data/processed/merchant_clusters.csv"
-benchmark.to_csv(output_path, index=False)
+with step("write", rows=len(benchmark)):
+    output_path = write_table(benchmark, "data/processed", "merchant_clusters")
+    writes.wait()
 
 benchmark[["merchant_id", "cluster"]].head()
 
 
-import matplotlib.pyplot as plt
-
-plt.figure(figsize=(8,5))
-plt.scatter(
-    benchmark["total_revenue"],
-    benchmark["price_gap_avg"],
-    c=benchmark["cluster"]
-)
-
-plt.xlabel("Total Revenue")
-plt.ylabel("Price Gap Avg")
-plt.title("Merchant Segmentation Clusters")
-plt.show()
+# Figures are rendered separately: python reporting.py clusters
 
 print("mod 3 done")
\ No newline at end of file
@@ -2,101 +2,143 @@ import pandas as pd
 import numpy as np
 import os
 
+from async_io import StreamingWriter, chunks, prefetch
+from id_dictionary import IdDictionary
+from instrument import start, step
+from partitioned import SHARD_DIR, cleanup, map_shards, partition_frame, partition_table
+from pricing_rules import load_rules, price_shard, recommend
+from cdc import KEYS, ChangeLog, outputs_exist
+from price_store import PriceStore
+from schema import SCHEMAS, cents
+from storage import table_files, upsert_table, write_table
+
+# Optional rule table (CSV keyed by `category` or `region`, see pricing_rules.py);
+# without it the default +/-5% bands and 1.05/0.95 multipliers apply.
+RULES_PATH = os.environ.get("PRICING_RULES")
+# Price the latest observation per (product, merchant, competitor) from the indexed
+# competitor-price store, optionally as of PRICE_AS_OF, instead of the raw snapshot.
+USE_PRICE_STORE = os.environ.get("USE_PRICE_STORE", "0") == "1"
+PRICE_AS_OF = os.environ.get("PRICE_AS_OF")
+# Partitioned mode: hash-partition competitor prices into PARTITIONS product_id shards
+# and score them in PARTITION_WORKERS processes (default: all cores); 0 = off
+PARTITIONS = int(os.environ.get("PARTITIONS", "0"))
+PARTITION_WORKERS = int(os.environ.get("PARTITION_WORKERS", "0")) or None
+# Change-data-capture mode (see cdc.py): score only newly ingested competitor price
+# rows and upsert them into the output (not with USE_PRICE_STORE or PARTITIONS)
+CDC = os.environ.get("CDC", "0") == "1"
+
+start("pricing")
+
 # Load data
 base = "data/raw"
-comp = pd.read_csv(os.path.join(base, "competitor_prices.csv"))
-
-# ------------------------------------
-# 1. Compute Price Gap
-# ------------------------------------
-comp["price_gap"] = comp["competitor_price"] - comp["merchant_price"]
-
-# Percentage difference
-comp["pct_diff"] = (comp["price_gap"] / comp["merchant_price"]) * 100
-
-# ------------------------------------
-# 2. Create Pricing Recommendations
-# ------------------------------------
-def recommend(row):
-    if row["pct_diff"] > 5:        # competitor price > merchant price by 5%
-        return "Increase Price"
-    elif row["pct_diff"] < -5:     # merchant price too high
-        return "Decrease Price"
-    else:
-        return "Keep Same"
-
-comp["recommendation"] = comp.apply(recommend, axis=1)
-
-# ------------------------------------
-# 3. Create Suggested Price (Optional)
-# ------------------------------------
-def suggest_price(row):
-    if row["recommendation"] == "Increase Price":
-        return round(row["merchant_price"] * 1.05, 2)
-    elif row["recommendation"] == "Decrease Price":
-        return round(row["merchant_price"] * 0.95, 2)
-    else:
-        return row["merchant_price"]
-
-comp["suggested_price"] = comp.apply(suggest_price, axis=1)
-
-# ------------------------------------
-# 4. Save Output
-# ------------------------------------
-os.makedirs("data/processed", exist_ok=True)
-output_path = "data/processed/pricing_recommendations.csv"
-comp.to_csv(output_path, index=False)
+log = ChangeLog(base) if CDC else None
+incremental = CDC and not (USE_PRICE_STORE or PARTITIONS) and log.tracking("pricing", ["competitor_prices"]) \
+    and outputs_exist("data/processed", ["pricing_recommendations"])
+# Competitor prices and the rule key table are read concurrently (see async_io.py)
+rules = load_rules(RULES_PATH) if RULES_PATH else None
+reads = {}
+if not (PARTITIONS or incremental or USE_PRICE_STORE):
+    reads["comp"] = (base, "competitor_prices")
+if rules is not None and rules.index.name == "category":
+    reads["key_table"] = (base, "products", {"columns": ["product_id", "category"]})
+elif rules is not None and rules.index.name == "region":
+    reads["key_table"] = (base, "merchants", {"columns": ["merchant_id", "region"]})
+inputs = prefetch(reads)
+if PARTITIONS:
+    # product_id shards scored in parallel, then put back into input order; reads
+    # finish before any worker process is started
+    broadcast = {"key_table": inputs["key_table"].result()} if "key_table" in inputs else {}
+    with step("partition"):
+        if USE_PRICE_STORE:
+            store = PriceStore()
+            for path in table_files(base, "competitor_prices"):
+                store.sync_file(path)
+            latest = store.latest(PRICE_AS_OF)[list(SCHEMAS["competitor_prices"])]
+            shards = partition_frame(latest, "product_id", PARTITIONS, os.path.join(SHARD_DIR, "competitor_prices"))
+        else:
+            shards = partition_table(base, "competitor_prices", "product_id", PARTITIONS, PARTITION_WORKERS)
+    with step("score") as s:
+        comp = map_shards(price_shard, shards, PARTITION_WORKERS, broadcast=broadcast, rules_path=RULES_PATH)
+        comp = comp.sort_values("_row", ignore_index=True).drop(columns="_row")
+        s.rows = len(comp)
+    cleanup(shards)
+    with step("write", rows=len(comp)):
+        output_path = write_table(comp, "data/processed", "pricing_recommendations")
+else:
+    with step("load") as s:
+        if incremental:
+            # rows are scored independently, so only the new ones need scoring
+            comp = log.pending("pricing", "competitor_prices")
+        elif USE_PRICE_STORE:
+            store = PriceStore()
+            for path in table_files(base, "competitor_prices"):
+                store.sync_file(path)
+            # same columns and row order as the raw snapshot
+            comp = store.latest(PRICE_AS_OF)[list(SCHEMAS["competitor_prices"])]
+        else:
+            comp = inputs["comp"].result()
+        s.rows = len(comp)
+
+    # Work on int32 ID codes; string IDs are decoded again just before saving
+    ids = IdDictionary()
+    comp = ids.encode_frame(comp)
+
+    # ------------------------------------
+    # 1. Compute Price Gap
+    # ------------------------------------
+    # on exact cents: float32 prices would blur small gaps
+    comp["price_gap"] = cents(comp["competitor_price"]) - cents(comp["merchant_price"])
+
+    # Percentage difference
+    comp["pct_diff"] = (comp["price_gap"] / cents(comp["merchant_price"])) * 100
+
+    # ------------------------------------
+    # 2. Pick the rule table and each row's rule key
+    # ------------------------------------
+    rule_keys = None
+    if rules is not None:
+        key = rules.index.name
+        if key in comp.columns:
+            rule_keys = comp[key]
+        elif key == "category":
+            products = ids.encode_frame(inputs["key_table"].result())
+            rule_keys = comp["product_id"].map(products.set_index("product_id")["category"])
+        elif key == "region":
+            merchants = ids.encode_frame(inputs["key_table"].result())
+            rule_keys = comp["merchant_id"].map(merchants.set_index("merchant_id")["region"])
+        else:
+            raise ValueError(f"Unsupported pricing rule key: {key}")
+
+    # ------------------------------------
+    # 3. Pricing Recommendations + Suggested Price (vectorized rules)
+    # ------------------------------------
+    with step("score", rows=len(comp)):
+        comp["recommendation"], comp["suggested_price"] = recommend(
+            comp["pct_diff"], comp["merchant_price"], rules, rule_keys
+        )
+
+    # ------------------------------------
+    # 4. Save Output
+    # ------------------------------------
+    with step("write", rows=len(comp)):
+        ids.save()
+        if not incremental:
+            # decoded chunk by chunk: each chunk is written out while the next is decoded
+            with StreamingWriter("data/processed", "pricing_recommendations") as out:
+                for chunk in chunks(comp):
+                    out.write(ids.decode_frame(chunk))
+            output_path = out.path
+        else:
+            comp = ids.decode_frame(comp)
+            if len(comp):
+                output_path = upsert_table(comp, "data/processed", "pricing_recommendations",
+                                           key=KEYS["competitor_prices"])
+if CDC:
+    log.commit("pricing", ["competitor_prices"])
 
 comp.head()
 
 
-import matplotlib.pyplot as plt
-
-plt.figure(figsize=(8,5))
-plt.scatter(comp["merchant_price"], comp["competitor_price"], c=comp["pct_diff"])
-plt.xlabel("Merchant Price")
-plt.ylabel("Competitor Price")
-plt.title("Price Comparison Scatter Plot")
-plt.colorbar(label="Percentage Difference")
-plt.show()
-
-
-import matplotlib.pyplot as plt
-
-plt.hist(df['maturity_score'], bins=10)
-plt.xlabel("Maturity Score")
-plt.ylabel("Number of Products")
-plt.title("Market Maturity Distribution")
-plt.show()
-
-#####
-
-plt.scatter(df['performance_score'], 
-            df['maturity_score'], 
-            c=df['cluster'], 
-            alpha=0.7)
-
-plt.xlabel("Performance Score")
-plt.ylabel("Maturity Score")
-plt.title("Market Segments (Clustered)")
-plt.show()
-
-#####
-
-p = df.iloc[0]   # first product
-
-labels = ["performance_score", "maturity_score", 
-          "reliability_score", "risk_score"]
-values = p[labels].values.tolist()
-
-# Close the circle
-values += values[:1]
-angles = [n / float(len(labels)) * 2 * 3.14159 for n in range(len(labels))]
-angles += angles[:1]
-
-plt.polar(angles, values)
-plt.fill(angles, values, alpha=0.3)
-plt.title(f"Product Capability Map: {p['product_name']}")
-plt.show()
+# Figures are rendered separately: python reporting.py price_comparison
 
 print("mod 4 done")
\ No newline at end of file
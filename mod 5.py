@@ -1,22 +1,57 @@
 import pandas as pd
 import os
-from nltk.sentiment.vader import SentimentIntensityAnalyzer
-import nltk
-nltk.download('vader_lexicon')
+
+from async_io import BackgroundWriter, prefetch
+from cdc import KEYS, ChangeLog, outputs_exist
+from id_dictionary import IdDictionary
+from instrument import start, step
+from join_index import join_columns
+from sentiment import compound_scores
+
+# Worker processes for scoring unique uncached review texts (default: all cores)
+SENTIMENT_WORKERS = int(os.environ.get("SENTIMENT_WORKERS", "0")) or None
+# Only score reviews dated within [REVIEWS_START, REVIEWS_END] (YYYY-MM-DD, either
+# optional); with a date-partitioned reviews dataset only those days are opened
+REVIEWS_START = os.environ.get("REVIEWS_START")
+REVIEWS_END = os.environ.get("REVIEWS_END")
+# Change-data-capture mode (see cdc.py): recompute only products with new reviews or
+# new competitor prices and upsert them into the outputs
+CDC = os.environ.get("CDC", "0") == "1"
+OUTPUTS = ["product_sentiment", "merchant_sentiment", "pricing_recommendations_with_sentiment"]
+
+start("sentiment")
 
 # Load reviews and pricing/benchmarks for integration
 base = "data/raw"
-reviews = pd.read_csv(os.path.join(base, "reviews.csv"))
-
-# Initialize VADER
-sid = SentimentIntensityAnalyzer()
-
+log = ChangeLog(base) if CDC else None
+incremental = CDC and log.tracking("sentiment", ["reviews", "competitor_prices"]) \
+    and outputs_exist("data/processed", OUTPUTS)
+# both inputs are read concurrently and collected before scoring starts its worker
+# processes (see async_io.py)
+inputs = prefetch({
+    "reviews": (base, "reviews", {"start": REVIEWS_START, "end": REVIEWS_END}),
+    "pricing_reco": ("data/processed", "pricing_recommendations"),
+})
+with step("load") as s:
+    reviews = inputs["reviews"].result()
+    pricing_reco = inputs["pricing_reco"].result()
+    if incremental:
+        touched = pd.Index(log.pending("sentiment", "reviews", columns=["product_id"])["product_id"].astype(str)) \
+            .union(log.pending("sentiment", "competitor_prices", columns=["product_id"])["product_id"].astype(str))
+        reviews = reviews[reviews["product_id"].isin(touched)].reset_index(drop=True)
+    s.rows = len(reviews)
+
+# Group and join on int32 ID codes; decoded back to strings for the outputs
+ids = IdDictionary()
+reviews = ids.encode_frame(reviews)
 
 
 # -----------------------------------------------------
 # 1. Compute sentiment score for each review
 # -----------------------------------------------------
-reviews['sentiment'] = reviews['review'].apply(lambda x: sid.polarity_scores(str(x))['compound'])
+# VADER (lexicon loaded locally), scored once per unique text with on-disk caching
+with step("score", rows=len(reviews)):
+    reviews['sentiment'] = compound_scores(reviews['review'], workers=SENTIMENT_WORKERS)
 
 import random
 
@@ -58,19 +93,36 @@ merchant_sentiment = (
 # -----------------------------------------------------
 # 4. Merge sentiment with pricing recommendations
 # -----------------------------------------------------
-pricing_reco = pd.read_csv("data/processed/pricing_recommendations.csv")
+if incremental:
+    pricing_reco = pricing_reco[pricing_reco["product_id"].isin(touched)].reset_index(drop=True)
+pricing_reco = ids.encode_frame(pricing_reco)
 
-pricing_with_sentiment = (
-    pricing_reco.merge(product_sentiment, on="product_id", how="left")
-)
+with step("merge", rows=len(pricing_reco)):
+    pricing_with_sentiment = join_columns(pricing_reco, product_sentiment, on="product_id", index_name="product_id")
 
 # -----------------------------------------------------
 # 5. Save outputs
 # -----------------------------------------------------
-os.makedirs("data/processed", exist_ok=True)
-product_sentiment.to_csv("data/processed/product_sentiment.csv", index=False)
-merchant_sentiment.to_csv("data/processed/merchant_sentiment.csv", index=False)
-pricing_with_sentiment.to_csv("data/processed/pricing_recommendations_with_sentiment.csv", index=False)
+def save(writes, rows, name, key, sort):
+    if not incremental:
+        writes.write_table(rows, "data/processed", name)
+    elif len(rows):
+        writes.upsert_table(rows, "data/processed", name, key=key, sort=sort)
+
+
+# each output is written in the background as soon as it is decoded, i.e. while the
+# next one is being decoded; leaving the block waits for all three
+with step("write", rows=len(pricing_with_sentiment)), BackgroundWriter() as writes:
+    product_sentiment = ids.decode_frame(product_sentiment).sort_values("product_id", ignore_index=True)
+    save(writes, product_sentiment, "product_sentiment", ["product_id"], sort=True)
+    merchant_sentiment = ids.decode_frame(merchant_sentiment).sort_values("product_id", ignore_index=True)
+    save(writes, merchant_sentiment, "merchant_sentiment", ["product_id"], sort=True)
+    pricing_with_sentiment = ids.decode_frame(pricing_with_sentiment)
+    save(writes, pricing_with_sentiment, "pricing_recommendations_with_sentiment", KEYS["competitor_prices"],
+         sort=False)
+    ids.save()
+if CDC:
+    log.commit("sentiment", ["reviews", "competitor_prices"])
 
 pricing_with_sentiment.head()
 
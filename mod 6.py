@@ -0,0 +1,57 @@
+import pandas as pd
+import os
+
+from async_io import prefetch
+from id_dictionary import IdDictionary
+from instrument import start, step
+from price_optimizer import demand_stats, fit_demand, offer_table, optimize
+from price_optimizer import PRICE_BAND, PRIOR_ELASTICITY, PRIOR_WEIGHT, SENTIMENT_PREMIUM
+from storage import write_table
+
+# Offers may move +/-OPTIMIZER_BAND around the competitor price, shifted by
+# OPTIMIZER_SENTIMENT_PREMIUM per unit of product sentiment (see price_optimizer.py)
+BAND = float(os.environ.get("OPTIMIZER_BAND", PRICE_BAND))
+PREMIUM = float(os.environ.get("OPTIMIZER_SENTIMENT_PREMIUM", SENTIMENT_PREMIUM))
+# Elasticity the demand slopes are shrunk towards, and the prior's weight in observations
+ELASTICITY_PRIOR = float(os.environ.get("ELASTICITY_PRIOR", PRIOR_ELASTICITY))
+ELASTICITY_PRIOR_WEIGHT = float(os.environ.get("ELASTICITY_PRIOR_WEIGHT", PRIOR_WEIGHT))
+
+start("optimization")
+
+# Load price/quantity history and the sentiment-enriched pricing recommendations
+base = "data/raw"
+ids = IdDictionary()
+inputs = prefetch({
+    "sales": (base, "transactions", {"columns": ["product_id", "price", "quantity"]}),
+    "offers": ("data/processed", "pricing_recommendations_with_sentiment"),
+})
+with step("load") as s:
+    sales = ids.encode_frame(inputs["sales"].result())
+    offers = ids.encode_frame(inputs["offers"].result())
+    s.rows = len(sales)
+
+# ---------------------------
+# 1. Per-product demand curves (batched least squares over product codes)
+# ---------------------------
+with step("estimate", rows=len(sales)):
+    stats = demand_stats(sales["product_id"], sales["price"], sales["quantity"])
+    demand = fit_demand(stats, ELASTICITY_PRIOR, ELASTICITY_PRIOR_WEIGHT)
+
+# ---------------------------
+# 2. Revenue-maximizing prices within competitor and sentiment bounds
+# ---------------------------
+with step("optimize") as s:
+    optimal = optimize(offer_table(offers), demand, BAND, PREMIUM)
+    s.rows = len(optimal)
+
+# ---------------------------
+# 3. Save Output
+# ---------------------------
+with step("write", rows=len(optimal)):
+    optimal = ids.decode_frame(optimal).sort_values(["product_id", "merchant_id"], ignore_index=True)
+    ids.save()
+    write_table(optimal, "data/processed", "optimal_prices")
+
+optimal.head()
+
+print("mod 6 done")
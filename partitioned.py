@@ -0,0 +1,222 @@
+"""
+Hash-partitioned, multi-process execution for per-merchant / per-product work.
+
+mod 1 splits cleanly by merchant_id and mod 4 by product_id, so instead of one
+process working through everything:
+
+  1. scatter: the input file is cut into one split per worker (CSV byte ranges at
+     line ends, Parquet row groups, Arrow record batches or, for a date-partitioned
+     dataset, groups of its partition files). Each worker parses its
+     split, hashes the key column into N shards and writes one piece per shard as
+     an uncompressed Arrow IPC file under `data/shards/<name>/shard-XXXX/`.
+  2. map: one task per shard memory-maps its pieces (in split order, so rows keep
+     their original relative order), runs the stage function on them and writes
+     the result as another Arrow file.
+  3. the parent reads the per-shard results back and concatenates them.
+
+Data moves between processes only through these files; small side tables (e.g.
+per-product competitor metrics) are written once as Arrow files and memory-mapped
+by every task. Each row carries `_row`, its position in the input (split-major),
+so callers can restore the original row order.
+
+Requires pyarrow. CSV splitting assumes no quoted field spans a line break, which
+holds for the generated raw tables.
+"""
+
+import io
+import os
+import shutil
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from schema import apply_schema, csv_dtypes, table_of
+from storage import change_files, dataset_files, find_table, pa, read_dataset_files
+
+SHARD_DIR = "data/shards"
+ROW_BITS = 40  # `_row` = split << ROW_BITS | row within the split
+
+
+def _require_pyarrow():
+    if pa is None:
+        raise ImportError("Partitioned execution needs pyarrow")
+
+
+def shard_of(keys, n_shards):
+    """Shard number of every key (stable across runs and processes)."""
+    hashes = pd.util.hash_array(np.asarray(keys, dtype=object))
+    return (hashes % np.uint64(n_shards)).astype(np.int64)
+
+
+# ----------------------------------
+# Arrow files
+# ----------------------------------
+
+def write_arrow(df, path):
+    import pyarrow.feather as feather
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    feather.write_feather(pa.Table.from_pandas(df, preserve_index=False), path, compression="uncompressed")
+    return path
+
+
+def read_arrow(paths):
+    """Memory-map one or more Arrow IPC files and return them as one DataFrame."""
+    tables = []
+    for path in [paths] if isinstance(paths, str) else paths:
+        with pa.memory_map(path, "r") as source:
+            tables.append(pa.ipc.open_file(source).read_all())
+    if not tables:
+        return pd.DataFrame()
+    if all(t.schema.equals(tables[0].schema) for t in tables[1:]):
+        return pa.concat_tables(tables).to_pandas()
+    # splits parsed separately can infer different types (e.g. int vs float with NaN)
+    return pd.concat([t.to_pandas() for t in tables], ignore_index=True)
+
+
+# ----------------------------------
+# Scatter
+# ----------------------------------
+
+def splits(path, fmt, n_parts):
+    """Independent pieces of an input file (or dataset directory), one per scatter task."""
+    if fmt == "dataset":
+        files = dataset_files(path)
+        return [[str(f) for f in part] for part in np.array_split(np.asarray(files, dtype=object),
+                                                                  min(n_parts, len(files))) if len(part)] \
+            if files else []
+    if fmt == "csv":
+        size = os.path.getsize(path)
+        with open(path, "rb") as f:
+            header = f.readline()
+            bounds = [f.tell()]
+            for i in range(1, n_parts):
+                f.seek(max(bounds[-1], size * i // n_parts))
+                if f.tell() > bounds[0]:
+                    f.readline()
+                bounds.append(min(f.tell(), size))
+        bounds.append(size)
+        return [(header, start, end) for start, end in zip(bounds[:-1], bounds[1:]) if end > start]
+    if fmt == "parquet":
+        import pyarrow.parquet as pq
+        units = range(pq.ParquetFile(path).num_row_groups)
+    else:
+        with pa.memory_map(path, "r") as source:
+            units = range(pa.ipc.open_file(source).num_record_batches)
+    return [list(part) for part in np.array_split(np.asarray(units), min(n_parts, len(units))) if len(part)] \
+        if len(units) else []
+
+
+def read_split(path, fmt, split, columns=None, table=None):
+    """One split as a DataFrame, with the raw table's compact types (schema.py)."""
+    table = table or table_of(path)
+    if fmt == "dataset":
+        return apply_schema(read_dataset_files(split, columns).to_pandas(), table)
+    if fmt == "csv":
+        header, start, end = split
+        with open(path, "rb") as f:
+            f.seek(start)
+            data = f.read(end - start)
+        return apply_schema(pd.read_csv(io.BytesIO(header + data), usecols=columns,
+                                        dtype=csv_dtypes(table, columns)), table)
+    if fmt == "parquet":
+        import pyarrow.parquet as pq
+        return apply_schema(pq.ParquetFile(path).read_row_groups(split, columns=columns).to_pandas(), table)
+    with pa.memory_map(path, "r") as source:
+        reader = pa.ipc.open_file(source)
+        batches = pa.Table.from_batches([reader.get_batch(i) for i in split])
+    return apply_schema((batches.select(columns) if columns is not None else batches).to_pandas(), table)
+
+
+def scatter_frame(df, key, n_shards, directory, part=0):
+    """Write the rows of `df` into per-shard pieces named `part-<part>`."""
+    df = df.assign(_row=(np.int64(part) << ROW_BITS) + np.arange(len(df), dtype=np.int64))
+    shards = shard_of(df[key], n_shards)
+    order = np.argsort(shards, kind="stable")
+    bounds = np.searchsorted(shards[order], np.arange(n_shards + 1))
+    for shard in range(n_shards):
+        rows = order[bounds[shard]:bounds[shard + 1]]
+        if len(rows):
+            write_arrow(df.iloc[rows], os.path.join(directory, f"shard-{shard:04d}", f"part-{part:04d}.arrow"))
+
+
+def _scatter_split(path, fmt, split, part, key, n_shards, directory, columns, table):
+    scatter_frame(read_split(path, fmt, split, columns, table), key, n_shards, directory, part)
+
+
+def _reset(directory):
+    shutil.rmtree(directory, ignore_errors=True)
+    os.makedirs(directory)
+
+
+def _format(path):
+    return "dataset" if os.path.isdir(path) else "csv" if path.endswith(".csv") \
+        else "parquet" if path.endswith(".parquet") else "arrow"
+
+
+def partition_file(path, key, n_shards, directory, workers=None, columns=None, extra_files=(), table=None):
+    """
+    Hash-partition a table file (or dataset directory) on `key` into `n_shards` shards,
+    scattering in parallel. `extra_files` (e.g. change segments) are scattered after it,
+    one split each.
+    """
+    _require_pyarrow()
+    _reset(directory)
+    table = table or table_of(path)
+    fmt = _format(path)
+    tasks = [(path, fmt, split) for split in splits(path, fmt, workers or os.cpu_count())]
+    for extra in extra_files:
+        tasks += [(extra, _format(extra), split) for split in splits(extra, _format(extra), 1)]
+    paths, fmts, parts = zip(*tasks) if tasks else ((), (), ())
+    n = len(tasks)
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        list(pool.map(_scatter_split, paths, fmts, parts, range(n), [key] * n, [n_shards] * n,
+                      [directory] * n, [columns] * n, [table] * n))
+    return directory
+
+
+def partition_table(directory, name, key, n_shards, workers=None, columns=None):
+    """`partition_file` for a table found through storage.find_table (change segments included)."""
+    path, _ = find_table(directory, name)
+    return partition_file(path, key, n_shards, os.path.join(SHARD_DIR, name), workers, columns,
+                          extra_files=change_files(directory, name), table=name)
+
+
+def partition_frame(df, key, n_shards, directory):
+    """Hash-partition an in-memory frame (written by this process)."""
+    _require_pyarrow()
+    _reset(directory)
+    scatter_frame(df, key, n_shards, directory)
+    return directory
+
+
+# ----------------------------------
+# Map
+# ----------------------------------
+
+def _map_shard(fn, shard_dir, broadcast, kwargs):
+    pieces = sorted(os.path.join(shard_dir, f) for f in os.listdir(shard_dir) if f.startswith("part-"))
+    shared = {name: read_arrow(path) for name, path in broadcast.items()}
+    result = fn(read_arrow(pieces), **shared, **kwargs)
+    if result is None or result.empty:
+        return None
+    return write_arrow(result, os.path.join(shard_dir, "result.arrow"))
+
+
+def map_shards(fn, directory, workers=None, broadcast=None, **kwargs):
+    """
+    Run `fn(shard_frame, **broadcast, **kwargs)` on every shard in `directory` in a
+    process pool and concatenate the returned frames. `broadcast` frames are written
+    once as Arrow files and memory-mapped by each task; `fn` must be importable.
+    """
+    broadcast_paths = {name: write_arrow(frame, os.path.join(directory, "_broadcast", name + ".arrow"))
+                       for name, frame in (broadcast or {}).items()}
+    shard_dirs = sorted(os.path.join(directory, d) for d in os.listdir(directory) if d.startswith("shard-"))
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = [pool.submit(_map_shard, fn, d, broadcast_paths, kwargs) for d in shard_dirs]
+        paths = [f.result() for f in futures]
+    return read_arrow([p for p in paths if p is not None])
+
+
+def cleanup(directory):
+    shutil.rmtree(directory, ignore_errors=True)
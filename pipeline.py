@@ -0,0 +1,398 @@
+"""
+DAG pipeline runner for the mod scripts.
+
+Each stage declares the tables it reads and writes. The runner derives the
+dependency graph from those declarations, runs every stage whose dependencies are
+done concurrently (each stage is its own child process), and skips stages whose
+inputs and code are unchanged since their last successful run (and whose outputs
+still exist).
+
+Change detection uses file size + mtime by default, or content hashes with --hash.
+Per-stage wall time and peak memory (max RSS of the stage process) are printed and
+appended as JSON lines to `data/state/pipeline_runs.jsonl`.
+
+The synthetic data generator (`generate`) overwrites `data/raw`, so it is opt-in:
+it only runs when named or with --with-generate, and otherwise the raw tables are
+treated as given inputs.
+
+Usage:
+    python pipeline.py                    # run everything that is out of date
+    python pipeline.py segmentation       # run one stage (and what it depends on)
+    python pipeline.py --force --jobs 4
+    python pipeline.py --with-generate    # (re)generate synthetic raw data first
+"""
+
+import argparse
+import glob
+import hashlib
+import json
+import os
+import subprocess
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from datetime import datetime
+
+from storage import CHANGES_SUFFIX, EXTENSIONS
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+RAW = "data/raw"
+PROCESSED = "data/processed"
+STATE_DIR = "data/state"
+STATE_PATH = os.path.join(STATE_DIR, "pipeline_state.json")
+RUNS_PATH = os.path.join(STATE_DIR, "pipeline_runs.jsonl")
+
+CUBE_MANIFEST = "data/cube/manifest.json"
+
+# name -> script, code it depends on, input tables, output tables, optional inputs
+# (tables or state files) and outputs that are only read / written when an env var
+# has the given value (None: any non-empty value), env vars that change what the
+# stage computes, env vars naming config files it reads, and env vars holding glob
+# patterns (with their defaults) of extra input files. Table fingerprints cover the
+# change segments CDC ingestion appends (see table_fingerprint), so ingested deltas
+# invalidate every stage reading the table.
+STAGES = {
+    # opt-in: regenerating would overwrite real or CDC-ingested raw data
+    "generate": {
+        "opt_in": True,
+        "script": "market starter.py",
+        "code": ["synthetic.py", "schema.py", "storage.py"],
+        "inputs": [],
+        "outputs": [f"{RAW}/{t}" for t in ["merchants", "products", "transactions", "competitor_prices", "reviews"]],
+        "env": ["TARGET_ROWS", "N_MERCHANTS", "N_PRODUCTS", "N_DAYS", "RAW_LAYOUT"],
+    },
+    "benchmarking": {
+        "script": "mod 1.py",
+        "code": ["benchmarking.py", "async_io.py", "cdc.py", "cube.py", "distinct.py", "id_dictionary.py",
+                 "instrument.py", "join_index.py", "partitioned.py", "price_store.py", "schema.py", "storage.py"],
+        "inputs": [f"{RAW}/transactions", f"{RAW}/competitor_prices", f"{RAW}/merchants"],
+        "outputs": [f"{PROCESSED}/benchmarking_output"],
+        "optional_inputs": {
+            f"{RAW}/products": ("DISTINCT_BACKEND", "bitset"),
+            CUBE_MANIFEST: ("USE_CUBE", "1"),
+        },
+        "env": ["BENCH_STREAMING", "USE_PRICE_STORE", "PRICE_AS_OF", "USE_CUBE", "DISTINCT_BACKEND", "HLL_PRECISION",
+                "PARTITIONS", "CDC"],
+    },
+    "forecasting": {
+        "script": "mod 2.py",
+        "code": ["forecasting.py", "async_io.py", "cube.py", "instrument.py", "schema.py", "storage.py"],
+        "inputs": [f"{RAW}/transactions"],
+        "outputs": [f"{PROCESSED}/forecasting_output", f"{STATE_DIR}/daily_revenue"],
+        "optional_inputs": {
+            f"{STATE_DIR}/daily_revenue": ("FORECAST_MODE", "incremental"),
+            f"{STATE_DIR}/daily_revenue_files": ("FORECAST_MODE", "incremental"),
+            CUBE_MANIFEST: ("USE_CUBE", "1"),
+        },
+        "optional_outputs": {f"{PROCESSED}/forecasting_by_series": ("FORECAST_BY_SERIES", "1")},
+        "input_globs": {"NEW_TRANSACTIONS": "data/incoming/transactions/*.csv"},
+        "env": ["FORECAST_MODE", "NEW_TRANSACTIONS", "FORECAST_BY_SERIES", "USE_CUBE", "FORECAST_START",
+                "FORECAST_END"],
+    },
+    "segmentation": {
+        "script": "mod 3.py",
+        "code": ["segmentation.py", "async_io.py", "instrument.py", "schema.py", "storage.py"],
+        "inputs": [f"{PROCESSED}/benchmarking_output"],
+        "outputs": [f"{PROCESSED}/merchant_clusters"],
+        "optional_inputs": {f"{STATE_DIR}/segmentation_{t}": ("SEGMENT_MODE", "minibatch")
+                            for t in ["scaler", "centroids", "assignments"]},
+        "optional_outputs": {f"{PROCESSED}/segmentation_k_sweep": ("N_CLUSTERS", "auto")},
+        "env": ["SEGMENT_MODE", "N_CLUSTERS"],
+    },
+    "pricing": {
+        "script": "mod 4.py",
+        "code": ["pricing_rules.py", "async_io.py", "cdc.py", "id_dictionary.py", "instrument.py",
+                 "partitioned.py", "price_store.py", "schema.py", "storage.py"],
+        "inputs": [f"{RAW}/competitor_prices"],
+        "outputs": [f"{PROCESSED}/pricing_recommendations"],
+        # rule tables keyed by category / region look the key up in products / merchants
+        "optional_inputs": {
+            f"{RAW}/products": ("PRICING_RULES", None),
+            f"{RAW}/merchants": ("PRICING_RULES", None),
+        },
+        "env": ["USE_PRICE_STORE", "PRICE_AS_OF", "PARTITIONS", "CDC"],
+        "config": ["PRICING_RULES"],
+    },
+    "sentiment": {
+        "script": "mod 5.py",
+        "code": ["sentiment.py", "async_io.py", "cdc.py", "id_dictionary.py", "instrument.py", "join_index.py",
+                 "schema.py", "storage.py"],
+        "inputs": [f"{RAW}/reviews", f"{PROCESSED}/pricing_recommendations"],
+        "outputs": [f"{PROCESSED}/{t}" for t in
+                    ["product_sentiment", "merchant_sentiment", "pricing_recommendations_with_sentiment"]],
+        "env": ["REVIEWS_START", "REVIEWS_END", "CDC"],
+    },
+    "optimization": {
+        "script": "mod 6.py",
+        "code": ["price_optimizer.py", "async_io.py", "id_dictionary.py", "instrument.py", "pricing_rules.py", "schema.py",
+                 "storage.py"],
+        "inputs": [f"{RAW}/transactions", f"{PROCESSED}/pricing_recommendations_with_sentiment"],
+        "outputs": [f"{PROCESSED}/optimal_prices"],
+        "env": ["OPTIMIZER_BAND", "OPTIMIZER_SENTIMENT_PREMIUM", "ELASTICITY_PRIOR", "ELASTICITY_PRIOR_WEIGHT"],
+    },
+    "reporting": {
+        "script": "reporting.py",
+        "code": ["async_io.py", "schema.py", "storage.py"],
+        "inputs": [f"{STATE_DIR}/daily_revenue", f"{RAW}/products"] + [f"{PROCESSED}/{t}" for t in [
+            "forecasting_output", "merchant_clusters", "pricing_recommendations",
+            "product_sentiment", "pricing_recommendations_with_sentiment"]],
+        # PNG figures in data/reports, not tables
+        "outputs": [],
+    },
+}
+
+
+# ----------------------------------
+# Dependency graph
+# ----------------------------------
+
+def dependencies(stages=STAGES):
+    """stage -> set of stages producing one of its inputs."""
+    producer = {out: name for name, stage in stages.items() for out in all_outputs(stage)}
+    return {
+        name: {producer[t] for t in all_inputs(stage) if t in producer and producer[t] != name}
+        for name, stage in stages.items()
+    }
+
+
+def all_inputs(stage):
+    return list(stage["inputs"]) + list(stage.get("optional_inputs", {}))
+
+
+def all_outputs(stage):
+    return list(stage["outputs"]) + list(stage.get("optional_outputs", {}))
+
+
+def _enabled(optional, environ):
+    """Paths of an optional_inputs / optional_outputs mapping enabled in `environ`."""
+    return [path for path, (var, value) in optional.items()
+            if (environ.get(var) if value is None else environ.get(var) == value)]
+
+
+def expected_inputs(stage, environ=None):
+    """Inputs the stage reads under the current environment."""
+    environ = os.environ if environ is None else environ
+    return list(stage["inputs"]) + _enabled(stage.get("optional_inputs", {}), environ)
+
+
+def expected_outputs(stage, environ=None):
+    """Outputs the stage writes under the current environment."""
+    environ = os.environ if environ is None else environ
+    return list(stage["outputs"]) + _enabled(stage.get("optional_outputs", {}), environ)
+
+
+def with_upstream(selected, deps):
+    """The selected stages plus everything they (transitively) depend on."""
+    todo, result = list(selected), set()
+    while todo:
+        name = todo.pop()
+        if name not in result:
+            result.add(name)
+            todo.extend(deps[name])
+    return result
+
+
+def check_acyclic(deps):
+    seen, stack = set(), set()
+
+    def visit(name):
+        if name in stack:
+            raise ValueError(f"Pipeline has a dependency cycle through '{name}'")
+        if name not in seen:
+            stack.add(name)
+            for dep in deps[name]:
+                visit(dep)
+            stack.discard(name)
+            seen.add(name)
+
+    for name in deps:
+        visit(name)
+
+
+# ----------------------------------
+# Change detection
+# ----------------------------------
+
+def table_file(table):
+    """
+    Existing file (or date-partitioned dataset directory) backing a table path like
+    'data/raw/transactions', or None. Plain file paths (state manifests) are their own file.
+    """
+    if os.path.isfile(table) or (os.path.isdir(table) and os.listdir(table)):
+        return table
+    for ext in EXTENSIONS.values():
+        if os.path.exists(table + ext):
+            return table + ext
+    return None
+
+
+def file_fingerprint(path, use_hash=False):
+    if path is None:
+        return None
+    if os.path.isdir(path):
+        # dataset: fingerprint of its files' relative paths and fingerprints
+        digest = hashlib.blake2b(digest_size=16)
+        for root, _, files in sorted(os.walk(path)):
+            for name in sorted(files):
+                full = os.path.join(root, name)
+                digest.update(f"{os.path.relpath(full, path)}={file_fingerprint(full, use_hash)};".encode())
+        return digest.hexdigest()
+    stat = os.stat(path)
+    if not use_hash:
+        return f"{stat.st_size}:{stat.st_mtime_ns}"
+    digest = hashlib.blake2b(digest_size=16)
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def table_fingerprint(table, use_hash=False):
+    """Fingerprint of a table's file plus its change segments (see storage.append_changes)."""
+    fingerprint = file_fingerprint(table_file(table), use_hash)
+    if os.path.isdir(table + CHANGES_SUFFIX):
+        fingerprint = f"{fingerprint}+{file_fingerprint(table + CHANGES_SUFFIX, use_hash)}"
+    return fingerprint
+
+
+def stage_fingerprint(stage, use_hash=False, environ=None):
+    """Fingerprints of everything that should trigger a re-run when it changes."""
+    environ = os.environ if environ is None else environ
+    code = [stage["script"]] + stage["code"]
+    return {
+        "code": {c: file_fingerprint(os.path.join(HERE, c), use_hash=True) for c in code},
+        "inputs": {t: table_fingerprint(t, use_hash) for t in expected_inputs(stage, environ)},
+        "input_files": {var: {os.path.abspath(p): file_fingerprint(p, use_hash)
+                              for p in sorted(glob.glob(environ.get(var, default)))}
+                        for var, default in stage.get("input_globs", {}).items()},
+        "outputs": expected_outputs(stage, environ),
+        "env": {var: environ.get(var) for var in stage.get("env", [])},
+        "config": {var: file_fingerprint(environ[var], use_hash=True)
+                   if environ.get(var) and os.path.exists(environ[var]) else environ.get(var)
+                   for var in stage.get("config", [])},
+    }
+
+
+def load_state():
+    if not os.path.exists(STATE_PATH):
+        return {}
+    with open(STATE_PATH) as f:
+        return json.load(f)
+
+
+def save_state(state):
+    os.makedirs(STATE_DIR, exist_ok=True)
+    with open(STATE_PATH, "w") as f:
+        json.dump(state, f, indent=2, sort_keys=True)
+
+
+def is_up_to_date(name, stage, state, use_hash=False):
+    """Outputs exist and code and inputs match the last successful run."""
+    if any(table_file(t) is None for t in expected_outputs(stage)):
+        return False
+    return state.get(name) == stage_fingerprint(stage, use_hash)
+
+
+# ----------------------------------
+# Execution
+# ----------------------------------
+
+def run_stage(name, stage, cwd=None, env=None, stdout=None):
+    """Run one stage script in its own process; returns wall time, peak RSS and exit code."""
+    env = dict(os.environ if env is None else env, MPLBACKEND="Agg")
+    started = datetime.utcnow().isoformat(timespec="seconds")
+    start = time.perf_counter()
+    proc = subprocess.Popen([sys.executable, os.path.join(HERE, stage["script"])], env=env, cwd=cwd,
+                            stdout=stdout)
+    _, status, usage = os.wait4(proc.pid, 0)
+    proc.returncode = os.waitstatus_to_exitcode(status)
+    return {
+        "stage": name,
+        "started": started,
+        "returncode": proc.returncode,
+        "wall_s": round(time.perf_counter() - start, 3),
+        # ru_maxrss is in kilobytes on Linux
+        "peak_rss_mb": round(usage.ru_maxrss / 1024, 1),
+    }
+
+
+def active_stages(selected=None, with_generate=False):
+    """STAGES without the opt-in stages that were neither named nor enabled."""
+    return {name: stage for name, stage in STAGES.items()
+            if not stage.get("opt_in") or with_generate or name in (selected or ())}
+
+
+def run_pipeline(selected=None, force=False, jobs=None, use_hash=False, with_generate=False):
+    stages = active_stages(selected, with_generate)
+    deps = dependencies(stages)
+    check_acyclic(deps)
+    names = with_upstream(selected, deps) if selected else set(stages)
+    state = load_state()
+
+    pending = set(names)
+    done, failed, results = set(), set(), []
+    running = {}
+    rerun = set()   # stages that actually ran; their dependents must run too
+
+    with ThreadPoolExecutor(max_workers=jobs or os.cpu_count()) as pool:
+        while pending or running:
+            for name in sorted(pending):
+                if not (deps[name] & names) <= done:
+                    if deps[name] & failed:
+                        pending.discard(name)
+                        failed.add(name)
+                        print(f"[pipeline] {name}: skipped (upstream failed)")
+                    continue
+                pending.discard(name)
+                stage = STAGES[name]
+                if not force and not (deps[name] & rerun) and is_up_to_date(name, stage, state, use_hash):
+                    done.add(name)
+                    print(f"[pipeline] {name}: up to date")
+                    continue
+                print(f"[pipeline] {name}: running {stage['script']}")
+                running[pool.submit(run_stage, name, stage)] = name
+
+            if not running:
+                continue
+            finished, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in finished:
+                name = running.pop(future)
+                result = future.result()
+                results.append(result)
+                if result["returncode"] == 0:
+                    done.add(name)
+                    rerun.add(name)
+                    state[name] = stage_fingerprint(STAGES[name], use_hash)
+                    save_state(state)
+                else:
+                    failed.add(name)
+                print(f"[pipeline] {name}: exit {result['returncode']} in {result['wall_s']}s, "
+                      f"peak RSS {result['peak_rss_mb']} MB")
+
+    if results:
+        os.makedirs(STATE_DIR, exist_ok=True)
+        with open(RUNS_PATH, "a") as f:
+            for result in results:
+                f.write(json.dumps(result) + "\n")
+    return results, failed
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run the market intelligence pipeline")
+    parser.add_argument("stages", nargs="*", help=f"stages to run (default: all): {', '.join(STAGES)}")
+    parser.add_argument("--force", action="store_true", help="re-run stages even if up to date")
+    parser.add_argument("--jobs", type=int, default=None, help="max stages running at once")
+    parser.add_argument("--hash", action="store_true", help="detect changes by content hash instead of mtime")
+    parser.add_argument("--with-generate", action="store_true",
+                        help="include the synthetic data generator (overwrites data/raw)")
+    args = parser.parse_args(argv)
+    unknown = set(args.stages) - set(STAGES)
+    if unknown:
+        parser.error(f"unknown stage(s): {', '.join(sorted(unknown))}")
+
+    _, failed = run_pipeline(args.stages or None, args.force, args.jobs, args.hash, args.with_generate)
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
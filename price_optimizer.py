@@ -0,0 +1,160 @@
+"""
+Sentiment-aware price optimizer for mod 6.
+
+mod 4 prices from the competitor gap alone and mod 5 only attaches sentiment to
+that output. Here the price/quantity history in the transactions is used as well:
+
+  1. demand: every product gets a linear demand curve `quantity = a + b * price`,
+     fitted by least squares for all products at once from per-product sums
+     (`np.bincount` over integer product codes, no per-product loop). The slope is
+     shrunk towards a prior elasticity, so products with few sales or no price
+     variation fall back to a sensible curve instead of a noisy or flat one, and it
+     is capped so demand always falls with price.
+  2. bounds: each (product, merchant) offer may move within PRICE_BAND around its
+     average competitor price, shifted up for well-reviewed products and down for
+     poorly reviewed ones (SENTIMENT_PREMIUM per unit of VADER compound sentiment).
+  3. price: revenue `p * (a + b * p)` is concave for b < 0, so the optimum is the
+     closed-form `-a / (2b)` clipped to the bounds.
+
+Offers of products without any sales keep their current price (clipped to the
+bounds). Expected revenue under the current, rule-based (mod 4 `suggested_price`)
+and optimal prices is reported alongside, from the same demand curves.
+"""
+
+import numpy as np
+import pandas as pd
+
+from pricing_rules import round_like_python
+from schema import cents
+
+PRIOR_ELASTICITY = -1.5     # elasticity at the mean price the slope is shrunk towards
+PRIOR_WEIGHT = 5.0          # strength of that prior, in observations
+MAX_ELASTICITY = -0.1       # demand must fall at least this fast at the mean price
+PRICE_BAND = 0.15           # +/-15% around the (sentiment-adjusted) competitor price
+SENTIMENT_PREMIUM = 0.10    # +10% for compound sentiment 1.0, -10% for -1.0
+
+STAT_COLUMNS = ["n", "sx", "sy", "sxx", "sxy"]
+
+
+# ----------------------------------
+# Demand
+# ----------------------------------
+
+def demand_stats(codes, price, quantity, n_groups=None):
+    """
+    Per-group sums for the least-squares fit of quantity on price. Sums are
+    additive, so stats of several chunks can simply be added up.
+    """
+    codes = np.asarray(codes, dtype=np.int64)
+    # float32 prices (schema.py) are widened back to exact cents
+    x = cents(price) if np.asarray(price).dtype == np.float32 else np.asarray(price, dtype=np.float64)
+    y = np.asarray(quantity, dtype=np.float64)
+    n_groups = int(codes.max()) + 1 if n_groups is None and len(codes) else n_groups or 0
+    return pd.DataFrame({
+        "n": np.bincount(codes, minlength=n_groups).astype(np.float64),
+        "sx": np.bincount(codes, weights=x, minlength=n_groups),
+        "sy": np.bincount(codes, weights=y, minlength=n_groups),
+        "sxx": np.bincount(codes, weights=x * x, minlength=n_groups),
+        "sxy": np.bincount(codes, weights=x * y, minlength=n_groups),
+    })
+
+
+def fit_demand(stats, prior_elasticity=PRIOR_ELASTICITY, prior_weight=PRIOR_WEIGHT,
+               max_elasticity=MAX_ELASTICITY):
+    """
+    Intercept, slope and elasticity at the mean price of every group's demand curve
+    (NaN for groups without observations), indexed like `stats`.
+    """
+    n = stats["n"].to_numpy()
+    has_data = n > 0
+    with np.errstate(invalid="ignore", divide="ignore"):
+        x_mean = stats["sx"].to_numpy() / n
+        y_mean = stats["sy"].to_numpy() / n
+        sxx = np.maximum(stats["sxx"].to_numpy() - n * x_mean ** 2, 0.0)
+        sxy = stats["sxy"].to_numpy() - n * x_mean * y_mean
+
+        # ridge towards the prior slope, weighted like `prior_weight` observations
+        # with the pooled within-group price variance
+        pooled = sxx[has_data].sum() / n[has_data].sum() if has_data.any() else 0.0
+        scale = np.where(pooled > 0, pooled, (0.1 * x_mean) ** 2)
+        prior_slope = prior_elasticity * y_mean / x_mean
+        slope = (sxy + prior_weight * scale * prior_slope) / (sxx + prior_weight * scale)
+        slope = np.minimum(slope, max_elasticity * y_mean / x_mean)
+        intercept = y_mean - slope * x_mean
+        elasticity = slope * x_mean / y_mean
+    return pd.DataFrame({
+        "n_obs": n.astype(np.int64),
+        "intercept": np.where(has_data, intercept, np.nan),
+        "slope": np.where(has_data, slope, np.nan),
+        "elasticity": np.where(has_data, elasticity, np.nan),
+    }, index=stats.index)
+
+
+def expected_revenue(price, intercept, slope):
+    """Revenue `p * max(a + b * p, 0)` under the fitted demand curves."""
+    price = np.asarray(price, dtype=np.float64)
+    return price * np.maximum(intercept + slope * price, 0.0)
+
+
+# ----------------------------------
+# Prices
+# ----------------------------------
+
+def price_bounds(competitor_price, sentiment, band=PRICE_BAND, premium=SENTIMENT_PREMIUM):
+    """(lower, upper) arrays: the competitor price shifted by sentiment, +/- band."""
+    sentiment = np.nan_to_num(np.asarray(sentiment, dtype=np.float64))
+    centre = np.asarray(competitor_price, dtype=np.float64) * (1 + premium * np.clip(sentiment, -1, 1))
+    return centre * (1 - band), centre * (1 + band)
+
+
+def optimal_prices(intercept, slope, lower, upper, fallback):
+    """Revenue-maximizing prices within [lower, upper]; `fallback` where there is no curve."""
+    with np.errstate(invalid="ignore", divide="ignore"):
+        peak = -intercept / (2 * slope)
+    price = np.where(np.isfinite(peak), peak, fallback)
+    return round_like_python(np.clip(price, lower, upper))
+
+
+def offer_table(offers):
+    """
+    One row per (product_id, merchant_id) from competitor-level rows (mod 5's
+    pricing_recommendations_with_sentiment): merchant price, average competitor
+    price, mean rule-based suggested price and product sentiment.
+    """
+    columns = {
+        "merchant_price": ("merchant_price", "first"),
+        "avg_competitor_price": ("competitor_price", "mean"),
+    }
+    if "suggested_price" in offers.columns:
+        columns["rule_price"] = ("suggested_price", "mean")
+    if "avg_product_sentiment" in offers.columns:
+        columns["avg_product_sentiment"] = ("avg_product_sentiment", "first")
+    return offers.groupby(["product_id", "merchant_id"], sort=True).agg(**columns).reset_index()
+
+
+def optimize(offers, demand, band=PRICE_BAND, premium=SENTIMENT_PREMIUM):
+    """
+    Optimal price per offer (see `offer_table`) given `demand` (from `fit_demand`,
+    indexed by integer product code) plus expected revenue at the current, rule
+    and optimal prices.
+    """
+    out = offers.copy()
+    codes = out["product_id"].to_numpy()
+    known = codes < len(demand)
+    for col in ["n_obs", "intercept", "slope", "elasticity"]:
+        values = np.full(len(out), 0 if col == "n_obs" else np.nan)
+        values[known] = demand[col].to_numpy()[codes[known]]
+        out[col] = values.astype(np.int64) if col == "n_obs" else values
+
+    sentiment = out["avg_product_sentiment"] if "avg_product_sentiment" in out.columns else np.zeros(len(out))
+    out["lower_bound"], out["upper_bound"] = price_bounds(out["avg_competitor_price"], sentiment, band, premium)
+    out["optimal_price"] = optimal_prices(out["intercept"].to_numpy(), out["slope"].to_numpy(),
+                                          out["lower_bound"].to_numpy(), out["upper_bound"].to_numpy(),
+                                          out["merchant_price"].to_numpy())
+
+    a, b = out["intercept"].to_numpy(), out["slope"].to_numpy()
+    out["revenue_current"] = expected_revenue(out["merchant_price"], a, b)
+    if "rule_price" in out.columns:
+        out["revenue_rule"] = expected_revenue(out["rule_price"], a, b)
+    out["revenue_optimal"] = expected_revenue(out["optimal_price"], a, b)
+    return out
@@ -0,0 +1,233 @@
+"""
+Indexed competitor-price store.
+
+Competitor price observations are kept in an append-only columnar log under
+`data/store/competitor_prices/`:
+
+  - every append writes a new Parquet segment to `log/`,
+  - compaction merges the base file and all log segments into one `base.parquet`
+    sorted by (product_id, merchant_id, competitor, date), dropping exact repeats
+    of the same key and date (the most recently appended observation wins),
+  - `manifest.json` lists the live files and the source files already ingested.
+
+Every row carries its ingest sequence number (`_seq`), so `latest()` can return
+rows in the order they were ingested rather than in index order.
+
+On load the rows are sorted by an integer composite key plus date, so point
+lookups ("latest price for (product, merchant, competitor) as of D") and range
+scans (all rows of one product) are binary searches instead of table scans.
+"""
+
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+from schema import apply_schema, read_csv
+
+STORE_DIR = "data/store/competitor_prices"
+KEY = ["product_id", "merchant_id", "competitor"]
+COLUMNS = KEY + ["date", "competitor_price", "merchant_price"]
+SEQ = "_seq"
+# compact automatically once this many log segments have piled up
+COMPACT_AFTER = 16
+
+
+class PriceStore:
+    def __init__(self, directory=STORE_DIR, compact_after=COMPACT_AFTER):
+        self.directory = directory
+        self.compact_after = compact_after
+        self._index = None
+        os.makedirs(os.path.join(directory, "log"), exist_ok=True)
+        self.manifest = self._read_manifest()
+
+    # ----------------------------------
+    # Log + manifest
+    # ----------------------------------
+
+    def _manifest_path(self):
+        return os.path.join(self.directory, "manifest.json")
+
+    def _read_manifest(self):
+        if not os.path.exists(self._manifest_path()):
+            return {"base": None, "segments": [], "next_segment": 0, "next_row": 0, "sources": {}}
+        with open(self._manifest_path()) as f:
+            return json.load(f)
+
+    def _write_manifest(self):
+        tmp = self._manifest_path() + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump(self.manifest, f, indent=2)
+        os.replace(tmp, self._manifest_path())
+
+    def append(self, observations):
+        """Append a frame of observations as a new log segment."""
+        frame = observations[COLUMNS].copy()
+        frame["date"] = pd.to_datetime(frame["date"])
+        for col in KEY:
+            frame[col] = frame[col].astype(str)
+        first = self.manifest.get("next_row", 0)
+        frame[SEQ] = np.arange(first, first + len(frame), dtype=np.int64)
+        self.manifest["next_row"] = first + len(frame)
+        name = f"log/segment-{self.manifest['next_segment']:06d}.parquet"
+        frame.to_parquet(os.path.join(self.directory, name), index=False)
+        self.manifest["segments"].append(name)
+        self.manifest["next_segment"] += 1
+        self._write_manifest()
+        self._index = None
+        if len(self.manifest["segments"]) >= self.compact_after:
+            self.compact()
+        return len(frame)
+
+    def sync_file(self, path):
+        """Append a CSV/columnar file of observations once (keyed by size + mtime)."""
+        stat = os.stat(path)
+        signature = f"{stat.st_size}:{stat.st_mtime_ns}"
+        source = os.path.abspath(path)
+        if self.manifest["sources"].get(source) == signature:
+            return 0
+        if path.endswith(".csv"):
+            frame = read_csv(path, "competitor_prices", usecols=COLUMNS)
+        else:
+            frame = apply_schema(pd.read_parquet(path, columns=COLUMNS), "competitor_prices")
+        n = self.append(frame)
+        self.manifest["sources"][source] = signature
+        self._write_manifest()
+        return n
+
+    def _read_all(self):
+        files = ([self.manifest["base"]] if self.manifest["base"] else []) + self.manifest["segments"]
+        if not files:
+            return pd.DataFrame({c: pd.Series(dtype="datetime64[ns]" if c == "date" else
+                                              ("float64" if c.endswith("price") else
+                                               ("int64" if c == SEQ else object)))
+                                 for c in COLUMNS + [SEQ]})
+        frames = [pd.read_parquet(os.path.join(self.directory, f)) for f in files]
+        for frame in frames:
+            if SEQ not in frame.columns:
+                # written before rows were numbered: order them ahead of numbered rows
+                frame[SEQ] = np.arange(-len(frame), 0, dtype=np.int64)
+        return pd.concat(frames, ignore_index=True)
+
+    def _sorted(self, frame):
+        # stable sort keeps append order among equal (key, date) rows
+        frame = frame.sort_values(KEY + ["date"], kind="stable")
+        return frame.drop_duplicates(KEY + ["date"], keep="last").reset_index(drop=True)
+
+    def compact(self):
+        """Merge base + log segments into a single sorted, deduplicated base file."""
+        merged = self._sorted(self._read_all())
+        name = f"base-{self.manifest['next_segment']:06d}.parquet"
+        self.manifest["next_segment"] += 1
+        merged.to_parquet(os.path.join(self.directory, name), index=False)
+        old = ([self.manifest["base"]] if self.manifest["base"] else []) + self.manifest["segments"]
+        self.manifest["base"], self.manifest["segments"] = name, []
+        self._write_manifest()
+        for f in old:
+            os.remove(os.path.join(self.directory, f))
+        self._index = None
+
+    # ----------------------------------
+    # Index
+    # ----------------------------------
+
+    def _load(self):
+        """Sorted rows plus integer codes for binary search (built once per change)."""
+        if self._index is None:
+            rows = self._sorted(self._read_all())
+            seq = rows.pop(SEQ).to_numpy()
+            codes, uniques = [], []
+            for col in KEY:
+                c, u = pd.factorize(rows[col], sort=True)
+                codes.append(c.astype(np.int64))
+                uniques.append(pd.Index(u))
+            n_merchant, n_comp = len(uniques[1]), len(uniques[2])
+            combo = (codes[0] * n_merchant + codes[1]) * n_comp + codes[2]
+            self._index = {
+                "rows": rows,
+                "seq": seq,
+                "uniques": uniques,
+                "combo": combo,
+                "product_code": codes[0],
+                "date": rows["date"].to_numpy(dtype="datetime64[ns]"),
+            }
+        return self._index
+
+    def _code(self, level, value):
+        index = self._load()["uniques"][level]
+        pos = index.get_indexer([value])[0]
+        return None if pos < 0 else pos
+
+    @staticmethod
+    def _as_of(as_of):
+        return np.datetime64(pd.Timestamp(as_of).to_datetime64()) if as_of is not None else None
+
+    # ----------------------------------
+    # Queries
+    # ----------------------------------
+
+    def latest_price(self, product_id, merchant_id, competitor, as_of=None):
+        """Latest observation row (a Series) for one key as of `as_of`, or None."""
+        index = self._load()
+        codes = [self._code(i, v) for i, v in enumerate((product_id, merchant_id, competitor))]
+        if None in codes:
+            return None
+        n_merchant, n_comp = len(index["uniques"][1]), len(index["uniques"][2])
+        combo = (codes[0] * n_merchant + codes[1]) * n_comp + codes[2]
+        lo = np.searchsorted(index["combo"], combo, side="left")
+        hi = np.searchsorted(index["combo"], combo, side="right")
+        if as_of is not None:
+            hi = lo + np.searchsorted(index["date"][lo:hi], self._as_of(as_of), side="right")
+        if hi == lo:
+            return None
+        return index["rows"].iloc[hi - 1]
+
+    def scan(self, product_id, start=None, end=None):
+        """All observations of one product, optionally limited to [start, end]."""
+        index = self._load()
+        code = self._code(0, product_id)
+        if code is None:
+            return index["rows"].iloc[0:0]
+        lo = np.searchsorted(index["product_code"], code, side="left")
+        hi = np.searchsorted(index["product_code"], code, side="right")
+        rows = index["rows"].iloc[lo:hi]
+        if start is not None:
+            rows = rows[rows["date"] >= pd.Timestamp(start)]
+        if end is not None:
+            rows = rows[rows["date"] <= pd.Timestamp(end)]
+        return rows
+
+    def latest(self, as_of=None):
+        """
+        Latest observation per (product, merchant, competitor) as of `as_of`, in the
+        order the observations were ingested.
+        """
+        index = self._load()
+        rows, combo, seq = index["rows"], index["combo"], index["seq"]
+        if as_of is not None:
+            keep = index["date"] <= self._as_of(as_of)
+            rows, combo, seq = rows[keep], combo[keep], seq[keep]
+        # rows are sorted by (key, date): the last row of each key run is the latest
+        last = np.ones(len(combo), dtype=bool)
+        last[:-1] = combo[1:] != combo[:-1]
+        return rows[last].iloc[np.argsort(seq[last], kind="stable")].reset_index(drop=True)
+
+    def avg_competitor_price(self, product_id=None, as_of=None):
+        """
+        Average of the latest competitor prices per product as of `as_of`; a float
+        for one product, or a frame for all products.
+        """
+        if product_id is not None:
+            rows = self.scan(product_id, end=as_of)
+            if rows.empty:
+                return float("nan")
+            latest = rows.drop_duplicates(KEY, keep="last")
+            return float(latest["competitor_price"].mean())
+        latest = self.latest(as_of)
+        return (
+            latest.groupby("product_id")
+                  .agg(avg_competitor_price=("competitor_price", "mean"),
+                       merchant_price=("merchant_price", "mean"))
+                  .reset_index()
+        )
@@ -0,0 +1,238 @@
+"""
+Online price recommendation service built on the mod 4 rules.
+
+`PricingService` keeps competitor prices in memory with running per (product,
+merchant) and per-product sums, so a competitor price update is O(1). A suggestion
+compares the average competitor price for the (product, merchant) pair (or the
+product-wide average if that merchant has no competitor prices) with the
+merchant's price and applies `pricing_rules.recommend`, the same rule logic as the
+batch job.
+
+`BatchingRecommender` lets many concurrent asyncio callers share one vectorized
+rule evaluation, and `serve` exposes both over a small local HTTP/1.1 front end:
+
+    GET  /suggest?product_id=P0001&merchant_id=M001
+    POST /update   {"product_id": ..., "merchant_id": ..., "competitor": ...,
+                    "competitor_price": ..., "merchant_price": ...}
+
+Run locally with `python pricing_service.py --port 8080`.
+"""
+
+import argparse
+import asyncio
+import json
+import math
+import os
+from urllib.parse import parse_qs, urlsplit
+
+import numpy as np
+
+from pricing_rules import load_rules, recommend
+
+
+class PricingService:
+    def __init__(self, rules=None, rule_keys=None):
+        """`rule_keys` maps product_id (category rules) or merchant_id (region rules) to a rule key."""
+        self.rules = rules
+        self.rule_keys = rule_keys or {}
+        self._by_rules_on_merchant = rules is not None and rules.index.name == "region"
+        self._prices = {}           # (product, merchant) -> {competitor: price}
+        self._pair_sum = {}         # (product, merchant) -> [sum, count]
+        self._product_sum = {}      # product -> [sum, count]
+        self._merchant_price = {}   # (product, merchant) -> merchant price
+
+    @classmethod
+    def from_frame(cls, comp, rules=None, rule_keys=None):
+        """Build the in-memory state from a competitor price frame (as in mod 4)."""
+        service = cls(rules, rule_keys)
+        for row in comp[["product_id", "merchant_id", "competitor", "competitor_price", "merchant_price"]] \
+                .itertuples(index=False):
+            service.update(*row)
+        return service
+
+    def update(self, product_id, merchant_id, competitor, competitor_price, merchant_price=None):
+        """Record a competitor price observation (and optionally a new merchant price)."""
+        pair = (product_id, merchant_id)
+        if merchant_price is not None:
+            self._merchant_price[pair] = float(merchant_price)
+        prices = self._prices.setdefault(pair, {})
+        old = prices.get(competitor)
+        prices[competitor] = float(competitor_price)
+        delta, added = float(competitor_price) - (old or 0.0), old is None
+        for sums, key in ((self._pair_sum, pair), (self._product_sum, product_id)):
+            entry = sums.setdefault(key, [0.0, 0])
+            entry[0] += delta
+            entry[1] += added
+
+    def _inputs(self, product_id, merchant_id):
+        pair = (product_id, merchant_id)
+        merchant_price = self._merchant_price.get(pair, math.nan)
+        total, count = self._pair_sum.get(pair) or self._product_sum.get(product_id) or (0.0, 0)
+        comp_price = total / count if count else math.nan
+        rule_key = self.rule_keys.get(merchant_id if self._by_rules_on_merchant else product_id)
+        return comp_price, merchant_price, rule_key
+
+    def suggest_many(self, keys):
+        """Vectorized suggestions for a list of (product_id, merchant_id) pairs."""
+        comp_price, merchant_price, rule_keys = (np.array(col) for col in zip(*(self._inputs(*k) for k in keys)))
+        pct_diff = (comp_price - merchant_price) / merchant_price * 100
+        reco, price = recommend(pct_diff, merchant_price, self.rules,
+                                rule_keys if self.rules is not None else None)
+        return [
+            {"product_id": p, "merchant_id": m, "avg_competitor_price": c, "merchant_price": mp,
+             "pct_diff": d, "recommendation": r, "suggested_price": s}
+            for (p, m), c, mp, d, r, s in zip(keys, comp_price.tolist(), merchant_price.tolist(),
+                                              pct_diff.tolist(), reco, price.tolist())
+        ]
+
+    def suggest(self, product_id, merchant_id):
+        return self.suggest_many([(product_id, merchant_id)])[0]
+
+
+class BatchingRecommender:
+    """Coalesces concurrent `suggest` calls into one vectorized evaluation."""
+
+    def __init__(self, service, max_batch=1024, max_delay=0.0):
+        self.service = service
+        self.max_batch = max_batch
+        self.max_delay = max_delay
+        self._queue = None
+        self._worker = None
+
+    async def suggest(self, product_id, merchant_id):
+        if self._worker is None:
+            self._queue = asyncio.Queue()
+            self._worker = asyncio.get_running_loop().create_task(self._run())
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put(((product_id, merchant_id), future))
+        return await future
+
+    async def _run(self):
+        while True:
+            batch = [await self._queue.get()]
+            # give callers that are already runnable a chance to enqueue too
+            await asyncio.sleep(self.max_delay)
+            while len(batch) < self.max_batch and not self._queue.empty():
+                batch.append(self._queue.get_nowait())
+            try:
+                results = self.service.suggest_many([key for key, _ in batch])
+                for (_, future), result in zip(batch, results):
+                    if not future.done():
+                        future.set_result(result)
+            except Exception as err:  # hand the failure to every waiting caller
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(err)
+
+    def close(self):
+        if self._worker is not None:
+            self._worker.cancel()
+            self._worker = None
+
+
+# ----------------------------------
+# Minimal HTTP/1.1 front end (keep-alive, JSON responses)
+# ----------------------------------
+
+def _response(status, payload):
+    body = json.dumps(payload, allow_nan=False, default=str).encode() if payload is not None else b""
+    reason = {200: "OK", 400: "Bad Request", 404: "Not Found"}[status]
+    return (f"HTTP/1.1 {status} {reason}\r\nContent-Type: application/json\r\n"
+            f"Content-Length: {len(body)}\r\n\r\n").encode() + body
+
+
+def _clean(result):
+    return {k: (None if isinstance(v, float) and math.isnan(v) else v) for k, v in result.items()}
+
+
+async def _handle(recommender, reader, writer):
+    try:
+        while True:
+            request_line = await reader.readline()
+            if not request_line:
+                break
+            method, target, _ = request_line.decode().split(" ", 2)
+            headers = {}
+            while True:
+                line = await reader.readline()
+                if line in (b"\r\n", b"\n", b""):
+                    break
+                name, _, value = line.decode().partition(":")
+                headers[name.strip().lower()] = value.strip()
+            body = await reader.readexactly(int(headers.get("content-length", 0)))
+
+            url = urlsplit(target)
+            if method == "GET" and url.path == "/suggest":
+                query = {k: v[0] for k, v in parse_qs(url.query).items()}
+                if "product_id" not in query or "merchant_id" not in query:
+                    out = _response(400, {"error": "product_id and merchant_id are required"})
+                else:
+                    result = await recommender.suggest(query["product_id"], query["merchant_id"])
+                    out = _response(200, _clean(result))
+            elif method == "POST" and url.path == "/update":
+                try:
+                    update = json.loads(body)
+                    recommender.service.update(
+                        update["product_id"], update["merchant_id"], update["competitor"],
+                        update["competitor_price"], update.get("merchant_price"))
+                    result = await recommender.suggest(update["product_id"], update["merchant_id"])
+                    out = _response(200, _clean(result))
+                except (ValueError, KeyError) as err:
+                    out = _response(400, {"error": f"bad update: {err}"})
+            else:
+                out = _response(404, {"error": "not found"})
+            writer.write(out)
+            await writer.drain()
+            if headers.get("connection", "").lower() == "close":
+                break
+    except (ConnectionError, asyncio.IncompleteReadError, ValueError):
+        pass
+    finally:
+        writer.close()
+
+
+async def serve(service, host="127.0.0.1", port=8080):
+    """Start the HTTP front end; returns the asyncio server."""
+    recommender = BatchingRecommender(service)
+    return await asyncio.start_server(lambda r, w: _handle(recommender, r, w), host, port)
+
+
+def main(argv=None):
+    from schema import cents
+    from storage import read_table
+
+    parser = argparse.ArgumentParser(description="Serve online price recommendations")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--rules", default=os.environ.get("PRICING_RULES"), help="rule table CSV")
+    args = parser.parse_args(argv)
+
+    comp = read_table("data/raw", "competitor_prices")
+    rules, rule_keys = None, None
+    if args.rules:
+        rules = load_rules(args.rules)
+        if rules.index.name == "region":
+            merchants = read_table("data/raw", "merchants", columns=["merchant_id", "region"])
+            rule_keys = dict(zip(merchants["merchant_id"], merchants["region"]))
+        else:
+            products = read_table("data/raw", "products", columns=["product_id", "category"])
+            rule_keys = dict(zip(products["product_id"], products["category"]))
+    comp = comp.astype({"product_id": str, "merchant_id": str, "competitor": str}) \
+               .assign(competitor_price=lambda d: cents(d["competitor_price"]),
+                       merchant_price=lambda d: cents(d["merchant_price"]))
+    service = PricingService.from_frame(comp, rules, rule_keys)
+
+    async def run():
+        server = await serve(service, args.host, args.port)
+        print(f"Serving price recommendations on http://{args.host}:{args.port}")
+        async with server:
+            await server.serve_forever()
+
+    try:
+        asyncio.run(run())
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
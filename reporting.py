@@ -0,0 +1,200 @@
+"""
+Reporting stage: renders the pipeline figures to PNG files.
+
+Plotting used to live inline in the compute modules, which then had to import
+matplotlib (and a GUI backend) and block on `plt.show()`. The compute modules now
+only write tables; this module reads them back and renders each figure to
+`data/reports/<name>.png` with the non-interactive Agg backend. matplotlib is only
+imported when a figure is actually rendered. Figures built from several tables read
+them concurrently (async_io.prefetch).
+
+Usage:
+    python reporting.py                   # render every figure (in parallel)
+    python reporting.py forecast clusters --serial
+"""
+
+import argparse
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+
+import pandas as pd
+
+from async_io import prefetch
+from storage import read_table
+
+PROCESSED = "data/processed"
+RAW = "data/raw"
+STATE_DIR = "data/state"
+REPORT_DIR = "data/reports"
+
+
+def _pyplot():
+    import matplotlib
+    matplotlib.use("Agg")
+    import matplotlib.pyplot as plt
+    return plt
+
+
+def _save(plt, out_dir, name):
+    os.makedirs(out_dir, exist_ok=True)
+    path = os.path.join(out_dir, name + ".png")
+    plt.savefig(path, bbox_inches="tight")
+    plt.close("all")
+    return path
+
+
+# ----------------------------------
+# Figures (one function per output file)
+# ----------------------------------
+
+def forecast(out_dir=REPORT_DIR):
+    inputs = prefetch({"daily_sales": (STATE_DIR, "daily_revenue"), "forecast": (PROCESSED, "forecasting_output")})
+    daily_sales = inputs["daily_sales"].result()
+    daily_sales["moving_avg"] = daily_sales["total_revenue"].rolling(window=7).mean()
+    forecast_df = inputs["forecast"].result()
+
+    plt = _pyplot()
+    plt.figure(figsize=(10,5))
+    plt.plot(daily_sales['date'], daily_sales['total_revenue'], label="Actual Revenue")
+    plt.plot(daily_sales['date'], daily_sales['moving_avg'], label="7-Day MA")
+    plt.plot(forecast_df['date'], forecast_df['forecast_revenue'], linestyle='--', label="Forecast")
+    plt.legend()
+    plt.xlabel("Date")
+    plt.ylabel("Revenue")
+    plt.title("Sales Forecast")
+    return _save(plt, out_dir, "forecast")
+
+
+def clusters(out_dir=REPORT_DIR):
+    benchmark = read_table(PROCESSED, "merchant_clusters", columns=["total_revenue", "price_gap_avg", "cluster"])
+
+    plt = _pyplot()
+    plt.figure(figsize=(8,5))
+    plt.scatter(
+        benchmark["total_revenue"],
+        benchmark["price_gap_avg"],
+        c=benchmark["cluster"]
+    )
+    plt.xlabel("Total Revenue")
+    plt.ylabel("Price Gap Avg")
+    plt.title("Merchant Segmentation Clusters")
+    return _save(plt, out_dir, "clusters")
+
+
+def price_comparison(out_dir=REPORT_DIR):
+    comp = read_table(PROCESSED, "pricing_recommendations",
+                      columns=["merchant_price", "competitor_price", "pct_diff"])
+
+    plt = _pyplot()
+    plt.figure(figsize=(8,5))
+    plt.scatter(comp["merchant_price"], comp["competitor_price"], c=comp["pct_diff"])
+    plt.xlabel("Merchant Price")
+    plt.ylabel("Competitor Price")
+    plt.title("Price Comparison Scatter Plot")
+    plt.colorbar(label="Percentage Difference")
+    return _save(plt, out_dir, "price_comparison")
+
+
+def sentiment_histogram(out_dir=REPORT_DIR):
+    product_sentiment = read_table(PROCESSED, "product_sentiment", columns=["avg_product_sentiment"])
+
+    plt = _pyplot()
+    plt.hist(product_sentiment['avg_product_sentiment'], bins=20, color='skyblue')
+    plt.xlabel("Average Product Sentiment")
+    plt.ylabel("Number of Products")
+    plt.title("Distribution of Product Sentiment Scores")
+    return _save(plt, out_dir, "sentiment_histogram")
+
+
+def _pricing_with_sentiment():
+    return read_table(PROCESSED, "pricing_recommendations_with_sentiment",
+                      columns=["product_id", "avg_product_sentiment", "suggested_price"])
+
+
+def sentiment_vs_price(out_dir=REPORT_DIR):
+    pricing_with_sentiment = _pricing_with_sentiment()
+
+    plt = _pyplot()
+    plt.scatter(pricing_with_sentiment['avg_product_sentiment'],
+                pricing_with_sentiment['suggested_price'],
+                alpha=0.7)
+    plt.xlabel("Average Product Sentiment")
+    plt.ylabel("Recommended Price")
+    plt.title("Sentiment vs. Recommended Price")
+    return _save(plt, out_dir, "sentiment_vs_price")
+
+
+def price_by_sentiment_quartile(out_dir=REPORT_DIR):
+    pricing_with_sentiment = _pricing_with_sentiment()
+    pricing_with_sentiment['sentiment_quartile'] = pd.qcut(
+        pricing_with_sentiment['avg_product_sentiment'], 4, labels=["Q1", "Q2", "Q3", "Q4"]
+    )
+
+    plt = _pyplot()
+    pricing_with_sentiment.boxplot(column='suggested_price', by='sentiment_quartile')
+    plt.xlabel("Sentiment Quartile")
+    plt.ylabel("Recommended Price")
+    plt.title("Recommended Price by Sentiment Quartile")
+    plt.suptitle("")  # Remove default title
+    return _save(plt, out_dir, "price_by_sentiment_quartile")
+
+
+def sentiment_by_category(out_dir=REPORT_DIR):
+    inputs = prefetch({"pricing": _pricing_with_sentiment,
+                       "products": (RAW, "products", {"columns": ["product_id", "category"]})})
+    pricing_with_sentiment = inputs["pricing"].result().merge(inputs["products"].result(), on='product_id', how='left')
+
+    plt = _pyplot()
+    pricing_with_sentiment.boxplot(column='avg_product_sentiment', by='category')
+    plt.xlabel("Category")
+    plt.ylabel("Average Product Sentiment")
+    plt.title("Product Sentiment by Category")
+    plt.suptitle("")
+    return _save(plt, out_dir, "sentiment_by_category")
+
+
+FIGURES = {
+    "forecast": forecast,
+    "clusters": clusters,
+    "price_comparison": price_comparison,
+    "sentiment_histogram": sentiment_histogram,
+    "sentiment_vs_price": sentiment_vs_price,
+    "price_by_sentiment_quartile": price_by_sentiment_quartile,
+    "sentiment_by_category": sentiment_by_category,
+}
+SENTIMENT_FIGURES = ["sentiment_histogram", "sentiment_vs_price", "price_by_sentiment_quartile",
+                     "sentiment_by_category"]
+
+
+def _render_one(args):
+    name, out_dir = args
+    return FIGURES[name](out_dir)
+
+
+def render(names=None, out_dir=REPORT_DIR, parallel=True):
+    """Render the named figures (default: all); returns the written file paths."""
+    jobs = [(name, out_dir) for name in (names or FIGURES)]
+    if not parallel or len(jobs) == 1:
+        return [_render_one(job) for job in jobs]
+    with ProcessPoolExecutor(max_workers=min(len(jobs), os.cpu_count() or 1)) as pool:
+        return list(pool.map(_render_one, jobs))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Render pipeline figures to PNG files")
+    parser.add_argument("figures", nargs="*", help=f"figures to render (default: all): {', '.join(FIGURES)}")
+    parser.add_argument("--out-dir", default=REPORT_DIR)
+    parser.add_argument("--serial", action="store_true", help="render in this process only")
+    args = parser.parse_args(argv)
+    unknown = set(args.figures) - set(FIGURES)
+    if unknown:
+        parser.error(f"unknown figure(s): {', '.join(sorted(unknown))}")
+
+    for path in render(args.figures or None, args.out_dir, parallel=not args.serial):
+        print(" -", path)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
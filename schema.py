@@ -0,0 +1,194 @@
+"""
+Compact column types for the raw tables.
+
+`pd.read_csv` infers float64/int64 for every number and strings for IDs, dates
+and labels, although quantities fit in a byte, ratings run from 1 to 5 and prices
+have two decimals. SCHEMAS declares a compact type for each column of the raw
+tables; `storage.read_table` and the chunked readers (`read_csv` below) apply it as
+soon as a table is loaded:
+
+  - "category": IDs and low-cardinality labels (small integer codes plus one copy
+    of each distinct value); CSV columns are parsed straight into categoricals
+  - "date":     datetime64, parsed once per distinct value
+  - "price":    float32 for values with two decimals (widen with `cents`)
+  - "float64":  values that are summed or written back out (revenue, sales)
+  - any other name is a numpy dtype, e.g. "int8" / "int16" for small counts
+
+Every downcast is validated: integers must be whole and in range, prices must
+round-trip to the cent and categoricals must actually repeat values. A column that
+fails keeps the type it was loaded with (with a warning), so unexpected data costs
+memory, never correctness. Undeclared columns are left as they are.
+
+float32 is a storage type only: aggregations and output writers `widen` frames
+back to float64 first, so means and written tables carry full precision whatever
+path computed them.
+"""
+
+import os
+import warnings
+
+import numpy as np
+import pandas as pd
+
+SCHEMAS = {
+    "transactions": {
+        "date": "date",
+        "merchant_id": "category",
+        "product_id": "category",
+        "price": "price",
+        "quantity": "int8",
+        # summed into revenue totals, so it keeps full precision
+        "revenue": "float64",
+    },
+    "competitor_prices": {
+        "product_id": "category",
+        "merchant_id": "category",
+        "competitor": "category",
+        "competitor_price": "price",
+        "merchant_price": "price",
+        "date": "date",
+    },
+    "merchants": {
+        "merchant_id": "category",
+        "category": "category",
+        "region": "category",
+        # copied into benchmarking_output as is
+        "avg_monthly_sales": "float64",
+        "num_orders_month": "int16",
+    },
+    "products": {
+        "product_id": "category",
+        "category": "category",
+    },
+    "reviews": {
+        "product_id": "category",
+        "review": "category",
+        "rating": "int8",
+        "date": "date",
+    },
+}
+PRICE_DECIMALS = 2
+MAX_CATEGORY_RATIO = 0.5    # distinct values / rows above which strings stay strings
+PRICE_COLUMNS = {col for schema in SCHEMAS.values() for col, kind in schema.items() if kind == "price"}
+
+
+def table_of(path):
+    """Table name of a raw file or dataset path, e.g. 'data/raw/transactions.csv' -> 'transactions'."""
+    return os.path.splitext(os.path.basename(os.path.normpath(path)))[0]
+
+
+def csv_dtypes(table, columns=None):
+    """`dtype=` for pd.read_csv: categorical and date columns are parsed as categoricals."""
+    return {col: "category" for col, kind in SCHEMAS.get(table, {}).items()
+            if kind in ("category", "date") and (columns is None or col in columns)}
+
+
+def cents(values):
+    """float64 copy of (float32) prices, rounded back to whole cents."""
+    return np.round(np.asarray(values, dtype=np.float64), PRICE_DECIMALS)
+
+
+def widen(df):
+    """
+    `df` with its float32 columns back in float64; price columns are rounded to
+    whole cents, so they equal the values originally loaded.
+    """
+    narrow = [col for col in df.columns if df[col].dtype == np.float32]
+    if not narrow:
+        return df
+    return df.assign(**{col: cents(df[col]) if col in PRICE_COLUMNS else df[col].astype(np.float64)
+                        for col in narrow})
+
+
+# ----------------------------------
+# Casts
+# ----------------------------------
+
+def _to_date(values):
+    if pd.api.types.is_datetime64_any_dtype(values):
+        return values
+    values = values if isinstance(values.dtype, pd.CategoricalDtype) else values.astype("category")
+    days = pd.to_datetime(values.cat.categories.astype(str)).to_numpy()
+    codes = values.cat.codes.to_numpy()
+    out = days[np.maximum(codes, 0)]
+    out[codes < 0] = np.datetime64("NaT")
+    return pd.Series(out, index=values.index, name=values.name)
+
+
+def _to_category(values):
+    categorical = isinstance(values.dtype, pd.CategoricalDtype)
+    if not categorical and pd.api.types.is_numeric_dtype(values):
+        return None
+    distinct = len(values.cat.categories) if categorical else values.nunique()
+    if distinct > MAX_CATEGORY_RATIO * len(values):
+        # mostly unique (e.g. dimension-table IDs): codes would only add memory
+        return None
+    return values if categorical else values.astype("category")
+
+
+def _to_price(values):
+    if values.dtype == np.float32:
+        return values
+    if not pd.api.types.is_numeric_dtype(values):
+        return None
+    compact = values.astype(np.float32)
+    original = values.to_numpy(dtype=np.float64)
+    restored = cents(compact)
+    ok = (restored == original) | (np.isnan(original) & np.isnan(restored))
+    return compact if ok.all() else None
+
+
+def _to_int(values, dtype):
+    if values.dtype == dtype:
+        return values
+    if not pd.api.types.is_numeric_dtype(values) or values.isna().any():
+        return None
+    info = np.iinfo(dtype)
+    array = values.to_numpy()
+    if len(array) and (array.min() < info.min or array.max() > info.max or (array != np.round(array)).any()):
+        return None
+    return values.astype(dtype)
+
+
+def _cast(values, kind):
+    if kind == "date":
+        return _to_date(values)
+    if kind == "category":
+        return _to_category(values)
+    if kind == "price":
+        return _to_price(values)
+    if np.issubdtype(np.dtype(kind), np.integer):
+        return _to_int(values, np.dtype(kind))
+    return values.astype(kind)
+
+
+def apply_schema(df, table):
+    """Copy of `df` with the declared compact types of `table` applied to its columns."""
+    schema = SCHEMAS.get(table)
+    if not schema:
+        return df
+    df = df.copy(deep=False)
+    for col, kind in schema.items():
+        if col not in df.columns or len(df) == 0:
+            continue
+        compact = _cast(df[col], kind)
+        if compact is None:
+            if kind != "category":
+                warnings.warn(f"{table}.{col} does not fit {kind}; keeping {df[col].dtype}", stacklevel=2)
+            if isinstance(df[col].dtype, pd.CategoricalDtype):
+                df[col] = df[col].astype(df[col].cat.categories.dtype)
+        else:
+            df[col] = compact
+    return df
+
+
+def read_csv(path, table=None, usecols=None, chunksize=None, **kwargs):
+    """
+    `pd.read_csv` with the schema of `table` (default: from the file name) applied;
+    with `chunksize` an iterator of typed chunks.
+    """
+    table = table or table_of(path)
+    reader = pd.read_csv(path, usecols=usecols, dtype=csv_dtypes(table, usecols), chunksize=chunksize, **kwargs)
+    if chunksize is None:
+        return apply_schema(reader, table)
+    return (apply_schema(chunk, table) for chunk in reader)
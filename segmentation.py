@@ -0,0 +1,175 @@
+"""
+Incremental merchant segmentation for mod 3.
+
+The batch path in `mod 3.py` refits a StandardScaler and a full KMeans on every
+merchant each run. The mini-batch path here:
+
+  - keeps a running mean/variance scaler (StandardScaler.partial_fit),
+  - fits MiniBatchKMeans over chunks, warm-started from the previous run's centroids,
+  - persists scaler, centroids and per-merchant assignments in `data/state`,
+  - re-assigns only merchants whose feature rows are new or changed.
+
+`k_sweep` fits candidate k values in parallel and reports inertia and silhouette,
+so k can be picked automatically instead of being a hard-coded constant.
+"""
+
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+from sklearn.cluster import KMeans, MiniBatchKMeans
+from sklearn.metrics import silhouette_score
+from sklearn.preprocessing import StandardScaler
+
+from storage import find_table, read_table, write_table
+
+STATE_DIR = "data/state"
+CHUNK_SIZE = 10_000
+# silhouette is O(n^2); score a sample for large inputs
+SILHOUETTE_SAMPLE = 10_000
+
+
+def row_hashes(df):
+    """One hash per row; used to detect new or changed merchants between runs."""
+    return pd.util.hash_pandas_object(df, index=False).to_numpy(dtype=np.uint64).view(np.int64)
+
+
+def nearest_centroid(X, centroids):
+    """Index of the closest centroid for every row of X."""
+    dist = (X ** 2).sum(axis=1)[:, None] - 2 * X @ centroids.T + (centroids ** 2).sum(axis=1)[None, :]
+    return dist.argmin(axis=1)
+
+
+def iter_chunks(X, chunk_size=CHUNK_SIZE):
+    for start in range(0, len(X), chunk_size):
+        yield X[start:start + chunk_size]
+
+
+# ----------------------------------
+# Persisted state
+# ----------------------------------
+
+def save_state(scaler, centroids, assignments, features, state_dir=STATE_DIR):
+    write_table(pd.DataFrame({
+        "feature": features, "mean": scaler.mean_, "var": scaler.var_,
+        "n_samples_seen": np.full(len(features), int(scaler.n_samples_seen_)),
+    }), state_dir, "segmentation_scaler", export_csv=False)
+    write_table(pd.DataFrame(centroids, columns=features), state_dir, "segmentation_centroids", export_csv=False)
+    write_table(assignments, state_dir, "segmentation_assignments", export_csv=False)
+
+
+def load_state(features, state_dir=STATE_DIR):
+    """(scaler, centroids, assignments) from the last run, or None."""
+    try:
+        find_table(state_dir, "segmentation_centroids")
+    except FileNotFoundError:
+        return None
+    stats = read_table(state_dir, "segmentation_scaler")
+    if list(stats["feature"]) != list(features):
+        return None
+    scaler = StandardScaler()
+    scaler.mean_ = stats["mean"].to_numpy()
+    scaler.var_ = stats["var"].to_numpy()
+    scaler.scale_ = np.where(scaler.var_ > 0, np.sqrt(scaler.var_), 1.0)
+    scaler.n_samples_seen_ = np.int64(stats["n_samples_seen"].iloc[0])
+    scaler.n_features_in_ = len(features)
+    centroids = read_table(state_dir, "segmentation_centroids")[list(features)].to_numpy()
+    assignments = read_table(state_dir, "segmentation_assignments")
+    return scaler, centroids, assignments
+
+
+# ----------------------------------
+# Fitting
+# ----------------------------------
+
+def fit_minibatch(X, k, init_centroids=None, chunk_size=CHUNK_SIZE, n_epochs=3, random_state=42):
+    """Mini-batch KMeans over chunks of (already scaled) X; returns the centroids."""
+    if init_centroids is not None and len(init_centroids) == k:
+        model = MiniBatchKMeans(n_clusters=k, init=init_centroids, n_init=1, random_state=random_state)
+    else:
+        model = MiniBatchKMeans(n_clusters=k, random_state=random_state, n_init=3)
+    if len(X) < k:
+        if init_centroids is None:
+            raise ValueError(f"Need at least {k} rows to fit {k} clusters, got {len(X)}")
+        return init_centroids
+    for _ in range(n_epochs):
+        for chunk in iter_chunks(X, max(chunk_size, k)):
+            if len(chunk) >= k:
+                model.partial_fit(chunk)
+    return model.cluster_centers_
+
+
+def segment(df, ids, features, k, state_dir=STATE_DIR, chunk_size=CHUNK_SIZE):
+    """
+    Cluster labels for every row of `df[features]`, fitting incrementally against the
+    persisted state. Returns (labels, number of rows (re)assigned).
+    """
+    X_all = df[features].to_numpy(dtype=np.float64)
+    hashes = row_hashes(df[features])
+    state = load_state(features, state_dir)
+
+    if state is None:
+        scaler, centroids = StandardScaler(), None
+        prev = pd.DataFrame({"merchant_id": pd.Series(dtype=object), "row_hash": pd.Series(dtype="int64"),
+                             "cluster": pd.Series(dtype="int64")})
+    else:
+        scaler, centroids, prev = state
+        if len(centroids) != k:
+            # different k: start over rather than mixing two fits
+            scaler, centroids = StandardScaler(), None
+
+    # rows whose merchant is new or whose features changed since the last run
+    pos = pd.Index(prev["merchant_id"].astype(str)).get_indexer(ids.astype(str))
+    prev_hash = prev["row_hash"].to_numpy(dtype=np.int64)
+    prev_label = prev["cluster"].to_numpy(dtype=np.int64)
+    if centroids is None or len(prev) == 0:
+        changed = np.ones(len(df), dtype=bool)
+    else:
+        changed = (pos < 0) | (prev_hash[pos] != hashes)
+
+    X_new = X_all[changed]
+    for chunk in iter_chunks(X_new, chunk_size):
+        scaler.partial_fit(chunk)
+    if len(X_new):
+        centroids = fit_minibatch(scaler.transform(X_new), k, centroids, chunk_size)
+
+    labels = np.where(pos >= 0, prev_label[pos], -1) if len(prev) else np.full(len(df), -1, dtype=np.int64)
+    if len(X_new):
+        labels[changed] = nearest_centroid(scaler.transform(X_new), centroids)
+
+    save_state(scaler, centroids, pd.DataFrame({
+        "merchant_id": ids.to_numpy(), "row_hash": hashes, "cluster": labels,
+    }), features, state_dir)
+    return labels, int(changed.sum())
+
+
+# ----------------------------------
+# Automatic k selection
+# ----------------------------------
+
+def _evaluate_k(args):
+    X, k, random_state = args
+    model = KMeans(n_clusters=k, random_state=random_state, n_init=3)
+    labels = model.fit_predict(X)
+    sample = min(len(X), SILHOUETTE_SAMPLE)
+    score = silhouette_score(X, labels, sample_size=sample, random_state=random_state)
+    return {"k": k, "inertia": model.inertia_, "silhouette": score}
+
+
+def k_sweep(X, candidates=range(2, 9), n_jobs=None, random_state=42):
+    """Fit every candidate k in parallel; returns a frame of k, inertia, silhouette."""
+    candidates = [k for k in candidates if 1 < k < len(X)]
+    n_jobs = n_jobs or min(len(candidates), os.cpu_count() or 1)
+    jobs = [(X, k, random_state) for k in candidates]
+    if n_jobs == 1:
+        results = [_evaluate_k(job) for job in jobs]
+    else:
+        with ProcessPoolExecutor(max_workers=n_jobs) as pool:
+            results = list(pool.map(_evaluate_k, jobs))
+    return pd.DataFrame(results)
+
+
+def best_k(sweep):
+    """k with the highest silhouette score."""
+    return int(sweep.loc[sweep["silhouette"].idxmax(), "k"])
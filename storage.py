@@ -0,0 +1,387 @@
+"""
+Shared table storage used by all the pipeline scripts.
+
+Stages hand tables to each other through typed, compressed columnar files instead of
+CSV, which avoids re-parsing and re-formatting floats at every step:
+
+  - "parquet": zstd-compressed Parquet (default)
+  - "arrow":   Arrow IPC / Feather, uncompressed so it can be memory-mapped zero-copy
+  - "csv":     plain CSV, kept as an opt-in export for the Tableau step
+
+ID columns (merchant_id, product_id, competitor) are stored as categoricals.
+Readers look for `<name>.arrow`, `<name>.parquet` and then `<name>.csv`, so raw CSV
+inputs and older CSV outputs can be read through the same call.
+
+Large dated tables (raw transactions and reviews) can instead be a date-partitioned
+dataset: a `<name>/` directory with one `date=YYYY-MM-DD/` subdirectory of Parquet
+files per day and the date column stored typed. `read_table(..., start=, end=)`
+then opens only the days in range (flat tables are filtered row-wise instead), and
+`append_partitioned` adds new data by writing new files, never rewriting old ones.
+
+Flat tables can also grow without being rewritten: `append_changes` /
+`upsert_table` add a Parquet segment under `<name>.changes/`, and readers return the
+table with its segments applied (appended rows, or with a key, the latest row per
+key). After COMPACT_CHANGES_AFTER segments the table is rewritten with them folded in.
+
+Set STORAGE_FORMAT to pick the format and EXPORT_CSV=1 to also write a CSV copy.
+Ingest CSV files into a dataset with `python storage.py ingest <name> <file.csv>...`.
+"""
+
+import argparse
+import fcntl
+import glob
+import json
+import os
+import shutil
+from contextlib import contextmanager
+
+import pandas as pd
+
+from schema import apply_schema, read_csv, widen
+
+try:
+    import pyarrow as pa
+    import pyarrow.feather as feather
+    import pyarrow.parquet as pq
+except ImportError:  # pyarrow is optional; fall back to CSV everywhere
+    pa = None
+
+CATEGORICAL_COLUMNS = ["merchant_id", "product_id", "competitor"]
+EXTENSIONS = {"arrow": ".arrow", "parquet": ".parquet", "csv": ".csv"}
+PARTITION_COLUMN = "date"
+CHANGES_SUFFIX = ".changes"
+COMPACT_CHANGES_AFTER = 16
+
+DEFAULT_FORMAT = os.environ.get("STORAGE_FORMAT", "parquet" if pa is not None else "csv")
+EXPORT_CSV = os.environ.get("EXPORT_CSV", "0") == "1"
+
+
+def table_path(directory, name, fmt=None):
+    return os.path.join(directory, name + EXTENSIONS[fmt or DEFAULT_FORMAT])
+
+
+def find_table(directory, name):
+    """
+    Path of the date-partitioned dataset `<name>/` or else of the first existing
+    `<name>.*` file in arrow, parquet, csv order; returns (path, fmt).
+    """
+    path = os.path.join(directory, name)
+    if os.path.isdir(path) and pa is not None:
+        return path, "dataset"
+    for fmt, ext in EXTENSIONS.items():
+        path = os.path.join(directory, name + ext)
+        if os.path.exists(path) and (fmt == "csv" or pa is not None):
+            return path, fmt
+    raise FileNotFoundError(f"No table named '{name}' in {directory}")
+
+
+def categorize(df):
+    df = df.copy()
+    for col in CATEGORICAL_COLUMNS:
+        if col in df.columns and not isinstance(df[col].dtype, pd.CategoricalDtype):
+            df[col] = df[col].astype("category")
+    return df
+
+
+def write_table(df, directory, name, fmt=None, export_csv=None):
+    """Write `df` as `<directory>/<name>.<ext>`; returns the path written."""
+    df = widen(df)
+    fmt = fmt or DEFAULT_FORMAT
+    os.makedirs(directory, exist_ok=True)
+    path = table_path(directory, name, fmt)
+    if fmt == "csv":
+        df.to_csv(path, index=False)
+    else:
+        table = pa.Table.from_pandas(categorize(df), preserve_index=False)
+        if fmt == "parquet":
+            pq.write_table(table, path, compression="zstd")
+        else:
+            feather.write_feather(table, path, compression="uncompressed")
+    remove_stale(directory, name, fmt)
+    if (EXPORT_CSV if export_csv is None else export_csv) and fmt != "csv":
+        df.to_csv(table_path(directory, name, "csv"), index=False)
+    return path
+
+
+def remove_stale(directory, name, fmt):
+    """Delete what a freshly written `<name>.<fmt>` supersedes: other columnar copies, datasets, segments."""
+    # don't leave a stale columnar copy that would shadow the new file on read
+    for other, ext in EXTENSIONS.items():
+        stale = os.path.join(directory, name + ext)
+        if other not in (fmt, "csv") and os.path.exists(stale):
+            os.remove(stale)
+    dataset = os.path.join(directory, name)
+    if os.path.isdir(dataset) and partitions(dataset):
+        shutil.rmtree(dataset)
+    # a full rewrite supersedes any change segments
+    shutil.rmtree(changes_dir(directory, name), ignore_errors=True)
+
+
+def read_arrow(directory, name, columns=None, start=None, end=None):
+    """
+    Read a table as a pyarrow Table; Arrow IPC files are memory-mapped (zero-copy).
+    `start`/`end` prune the partitions of a date-partitioned dataset.
+    """
+    path, fmt = find_table(directory, name)
+    if fmt == "dataset":
+        return _read_dataset(path, columns, start, end)
+    if fmt == "arrow":
+        with pa.memory_map(path, "r") as source:
+            table = pa.ipc.open_file(source).read_all()
+        return table.select(columns) if columns is not None else table
+    if fmt == "parquet":
+        return pq.read_table(path, columns=columns, memory_map=True)
+    return pa.Table.from_pandas(read_csv(path, name, usecols=columns), preserve_index=False)
+
+
+def read_table(directory, name, columns=None, start=None, end=None):
+    """
+    Read a table as a DataFrame, loading only `columns` if given. With `start` and/or
+    `end` (inclusive dates) only rows dated in that range are returned; datasets only
+    open the partitions in range. Raw tables come back with their compact types
+    from schema.py, and with any change segments applied.
+    """
+    path, fmt = find_table(directory, name)
+    if fmt == "dataset":
+        return apply_schema(_read_dataset(path, columns, start, end).to_pandas(), name)
+    spec = _change_spec(directory, name)
+    if spec is not None and columns is not None:
+        # key columns are needed to apply upserts
+        columns, wanted = list(dict.fromkeys([*columns, *spec["key"]])), columns
+    if fmt == "csv":
+        df = read_csv(path, name, usecols=columns)
+    else:
+        df = apply_schema(read_arrow(directory, name, columns).to_pandas(), name)
+    df = filter_dates(df, start, end)
+    if spec is not None:
+        df = _apply_changes(df, directory, name, spec, columns, start, end)
+        if columns is not None:
+            df = df[wanted]
+    return df
+
+
+# ----------------------------------
+# Date-partitioned datasets
+# ----------------------------------
+
+def _day(value):
+    return pd.Timestamp(value).strftime("%Y-%m-%d")
+
+
+def filter_dates(df, start, end, column=PARTITION_COLUMN):
+    """Rows of `df` dated within [start, end] (either bound optional)."""
+    if start is None and end is None:
+        return df
+    dates = df[column]
+    if pd.api.types.is_datetime64_any_dtype(dates):
+        bounds = [pd.Timestamp(b) if b is not None else None for b in (start, end)]
+    else:
+        # ISO date strings compare in date order without parsing every row
+        dates = dates.astype(str).str.slice(0, 10)
+        bounds = [_day(b) if b is not None else None for b in (start, end)]
+    keep = pd.Series(True, index=df.index)
+    if bounds[0] is not None:
+        keep &= dates >= bounds[0]
+    if bounds[1] is not None:
+        keep &= dates <= bounds[1]
+    return df[keep.to_numpy()].reset_index(drop=True)
+
+
+def partitions(path, start=None, end=None):
+    """Sorted `date=YYYY-MM-DD` partition directories of a dataset within [start, end]."""
+    prefix = PARTITION_COLUMN + "="
+    days = sorted(d[len(prefix):] for d in os.listdir(path) if d.startswith(prefix))
+    if start is not None:
+        days = [d for d in days if d >= _day(start)]
+    if end is not None:
+        days = [d for d in days if d <= _day(end)]
+    return [os.path.join(path, prefix + d) for d in days]
+
+
+def dataset_files(path, start=None, end=None):
+    """Parquet files of a dataset (partitions in date order, files in write order)."""
+    return [f for part in partitions(path, start, end) for f in sorted(glob.glob(os.path.join(part, "*.parquet")))]
+
+
+def table_files(directory, name, start=None, end=None):
+    """Files backing a table: the dataset's partition files, or the flat file plus its change segments."""
+    path, fmt = find_table(directory, name)
+    return dataset_files(path, start, end) if fmt == "dataset" else [path] + change_files(directory, name)
+
+
+def _read_dataset(path, columns=None, start=None, end=None):
+    return read_dataset_files(dataset_files(path, start, end), columns)
+
+
+def read_dataset_files(files, columns=None):
+    """Arrow table of the given dataset partition files (schemas unified)."""
+    if not files:
+        return pa.table({c: pa.array([], type=pa.string()) for c in columns or [PARTITION_COLUMN]})
+    tables = [pq.read_table(f, columns=columns, memory_map=True) for f in files]
+    return pa.concat_tables(tables, promote_options="permissive")
+
+
+def append_partitioned(df, directory, name, column=PARTITION_COLUMN):
+    """
+    Append rows to the dataset `<directory>/<name>/`, one new Parquet file per day
+    present in `df`; the date column is stored typed. Returns the files written.
+    """
+    dates = df[column]
+    if not pd.api.types.is_datetime64_any_dtype(dates):
+        # parse each distinct date once instead of every row
+        codes, uniques = pd.factorize(dates.astype(str))
+        dates = pd.Series(pd.to_datetime(uniques).to_numpy()[codes], index=df.index)
+    df = widen(df).assign(**{column: dates.dt.normalize()})
+    written = []
+    for day, rows in df.groupby(column, sort=True):
+        part = os.path.join(directory, name, f"{column}={_day(day)}")
+        os.makedirs(part, exist_ok=True)
+        path = os.path.join(part, f"part-{len(glob.glob(os.path.join(part, '*.parquet'))):05d}.parquet")
+        pq.write_table(pa.Table.from_pandas(categorize(rows), preserve_index=False), path, compression="zstd")
+        written.append(path)
+    return written
+
+
+def write_partitioned(df, directory, name, column=PARTITION_COLUMN):
+    """Replace the dataset `<directory>/<name>/` (and any flat `<name>.*` table) with `df`."""
+    remove_table(directory, name)
+    return append_partitioned(df, directory, name, column)
+
+
+def remove_table(directory, name):
+    """Delete a table in any layout, so a new one doesn't sit next to a stale copy."""
+    shutil.rmtree(os.path.join(directory, name), ignore_errors=True)
+    shutil.rmtree(changes_dir(directory, name), ignore_errors=True)
+    for ext in EXTENSIONS.values():
+        if os.path.exists(os.path.join(directory, name + ext)):
+            os.remove(os.path.join(directory, name + ext))
+
+
+@contextmanager
+def file_lock(path, shared=False):
+    """
+    Hold an advisory lock on `path` (created if missing) for the `with` block, so
+    stages running in parallel don't interleave read-modify-write updates of shared
+    state. Readers take it shared, writers exclusive. Not re-entrant.
+    """
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(path, "a") as f:
+        fcntl.flock(f, fcntl.LOCK_SH if shared else fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+
+# ----------------------------------
+# Change segments
+# ----------------------------------
+
+def changes_dir(directory, name):
+    return os.path.join(directory, name + CHANGES_SUFFIX)
+
+
+def change_files(directory, name):
+    """Change segments of a flat table, in write order."""
+    return sorted(glob.glob(os.path.join(changes_dir(directory, name), "part-*.parquet")))
+
+
+def _change_spec(directory, name):
+    """{"key": [...], "sort": bool} of a table with change segments, else None."""
+    if not change_files(directory, name):
+        return None
+    path = os.path.join(changes_dir(directory, name), "_key.json")
+    if not os.path.exists(path):
+        return {"key": [], "sort": False}
+    with open(path) as f:
+        return json.load(f)
+
+
+def _concat_typed(frames):
+    """Concatenate frames, keeping categorical columns categorical (union of categories)."""
+    frames = [f for f in frames if len(f)] or frames[:1]
+    if len(frames) == 1:
+        return frames[0].reset_index(drop=True)
+    for col in frames[0].columns:
+        if isinstance(frames[0][col].dtype, pd.CategoricalDtype):
+            values = pd.Index(frames[0][col].cat.categories)
+            for f in frames[1:]:
+                values = values.union(pd.Index(f[col].dropna().unique()))
+            dtype = pd.CategoricalDtype(values)
+            frames = [f.assign(**{col: f[col].astype(dtype)}) for f in frames]
+    return pd.concat(frames, ignore_index=True)
+
+
+def _apply_changes(df, directory, name, spec, columns=None, start=None, end=None):
+    segments = [filter_dates(apply_schema(pq.read_table(f, columns=columns).to_pandas(), name), start, end)
+                for f in change_files(directory, name)]
+    df = _concat_typed([df, *segments])
+    key = spec["key"]
+    if key:
+        # latest version of each key, at the position where the key first appeared
+        first = df.groupby(key, sort=False, observed=True, dropna=False).ngroup().to_numpy()
+        latest = ~df.duplicated(key, keep="last").to_numpy()
+        df = df[latest].iloc[first[latest].argsort(kind="stable")]
+        if spec["sort"]:
+            df = df.sort_values(key, kind="stable")
+        df = df.reset_index(drop=True)
+    return df
+
+
+def append_changes(df, directory, name, key=None, sort=False, compact=True):
+    """
+    Add rows to a flat table without rewriting it: they are written as a new segment
+    under `<name>.changes/`. With `key`, readers let segment rows replace earlier rows
+    with the same key (upsert), optionally returning the table sorted by key. With
+    `compact`, the table is rewritten once it has COMPACT_CHANGES_AFTER segments.
+    Returns the segment path.
+    """
+    folder = changes_dir(directory, name)
+    os.makedirs(folder, exist_ok=True)
+    if key is not None:
+        with open(os.path.join(folder, "_key.json"), "w") as f:
+            json.dump({"key": list(key), "sort": sort}, f)
+    path = os.path.join(folder, f"part-{len(change_files(directory, name)):06d}.parquet")
+    pq.write_table(pa.Table.from_pandas(categorize(widen(df)), preserve_index=False), path, compression="zstd")
+    if compact and len(change_files(directory, name)) >= COMPACT_CHANGES_AFTER:
+        compact_table(directory, name)
+    return path
+
+
+def upsert_table(df, directory, name, key, sort=False):
+    """Insert or replace the rows of `df` (by `key`) in a flat table; see `append_changes`."""
+    return append_changes(df, directory, name, key=key, sort=sort)
+
+
+def compact_table(directory, name):
+    """Rewrite a flat table with its change segments folded in."""
+    path, fmt = find_table(directory, name)
+    return write_table(read_table(directory, name), directory, name, fmt=fmt, export_csv=False)
+
+
+def ingest(paths, directory, name, chunksize=1_000_000):
+    """Append CSV files (read in chunks) to a date-partitioned dataset; returns rows added."""
+    total = 0
+    for path in paths:
+        for chunk in read_csv(path, name, chunksize=chunksize):
+            append_partitioned(chunk, directory, name)
+            total += len(chunk)
+    return total
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Table storage utilities")
+    sub = parser.add_subparsers(dest="command", required=True)
+    cmd = sub.add_parser("ingest", help="append CSV files to a date-partitioned dataset")
+    cmd.add_argument("name", help="dataset name, e.g. transactions")
+    cmd.add_argument("files", nargs="+")
+    cmd.add_argument("--directory", default="data/raw")
+    args = parser.parse_args(argv)
+    if pa is None:
+        parser.error("date-partitioned datasets need pyarrow")
+    n = ingest(args.files, args.directory, args.name)
+    print(f"Appended {n} rows to {os.path.join(args.directory, args.name)}/")
+
+
+if __name__ == "__main__":
+    main()
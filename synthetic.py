@@ -0,0 +1,203 @@
+"""
+Vectorized synthetic data generation for large benchmark fixtures.
+
+`market starter.py` builds its small learning datasets one row at a time with the
+`random` module. That is fine for a few thousand rows but far too slow (and too
+memory hungry) for load-test datasets of 10M-100M transactions. The functions here
+draw whole days at once with a NumPy `Generator` and yield bounded-size chunks that
+are written out one after another.
+
+Reproducibility: every day gets its own generator seeded from (seed, day index), so
+a given SEED always produces the same rows no matter what chunk size is used.
+"""
+
+import os
+from datetime import datetime, timedelta
+
+import numpy as np
+import pandas as pd
+
+# Same quantity distribution as `random.choices([1,1,1,2,3], weights=[60,60,60,20,5])`
+QUANTITY_VALUES = np.array([1, 2, 3], dtype=np.int64)
+QUANTITY_PROBS = np.array([180, 20, 5], dtype=np.float64) / 205.0
+
+DEFAULT_CHUNK_ROWS = 1_000_000
+
+
+def daily_counts(n_days, avg_tx_per_day, seed, target_rows=None):
+    """Poisson transaction counts per day (at least 1), optionally trimmed to target_rows."""
+    rng = np.random.default_rng(seed)
+    counts = np.maximum(1, rng.poisson(avg_tx_per_day, size=n_days)).astype(np.int64)
+    if target_rows is not None:
+        cum = np.cumsum(counts)
+        if cum[-1] < target_rows:
+            # top up the last day so we always hit the requested size exactly
+            counts[-1] += target_rows - cum[-1]
+        else:
+            last = int(np.searchsorted(cum, target_rows))
+            counts = counts[:last + 1]
+            counts[-1] -= cum[last] - target_rows
+    return counts
+
+
+def _day_rows(day_idx, n, n_merchants, n_products, seed):
+    rng = np.random.default_rng([seed, day_idx])
+    merchant_idx = rng.integers(0, n_merchants, size=n, dtype=np.int32)
+    product_idx = rng.integers(0, n_products, size=n, dtype=np.int32)
+    price = np.round(rng.uniform(5, 500, size=n), 2)
+    qty = rng.choice(QUANTITY_VALUES, size=n, p=QUANTITY_PROBS)
+    return merchant_idx, product_idx, price, qty
+
+
+def iter_transaction_chunks(merchant_ids, product_ids, n_days=180, avg_tx_per_day=6,
+                            target_rows=None, chunk_rows=DEFAULT_CHUNK_ROWS,
+                            seed=42, start_date=None):
+    """
+    Yield transaction DataFrames of roughly `chunk_rows` rows each.
+
+    If `target_rows` is given, `avg_tx_per_day` is derived from it so the output has
+    exactly that many rows spread over `n_days`. Chunks always contain whole days.
+    """
+    if target_rows is not None:
+        avg_tx_per_day = target_rows / n_days
+    if start_date is None:
+        start_date = datetime.utcnow().date() - timedelta(days=n_days)
+
+    counts = daily_counts(n_days, avg_tx_per_day, seed, target_rows)
+    day_labels = pd.date_range(start_date, periods=len(counts), freq="D").strftime("%Y-%m-%d")
+    merchant_cats = pd.Index(merchant_ids)
+    product_cats = pd.Index(product_ids)
+
+    day = 0
+    while day < len(counts):
+        # gather whole days until the chunk is full
+        end = day
+        size = 0
+        while end < len(counts) and (size == 0 or size + counts[end] <= chunk_rows):
+            size += int(counts[end])
+            end += 1
+
+        parts = [_day_rows(d, int(counts[d]), len(merchant_cats), len(product_cats), seed)
+                 for d in range(day, end)]
+        merchant_idx, product_idx, price, qty = (np.concatenate(cols) for cols in zip(*parts))
+        day_idx = np.repeat(np.arange(day, end, dtype=np.int32), counts[day:end])
+
+        yield pd.DataFrame({
+            "date": pd.Categorical.from_codes(day_idx, categories=day_labels),
+            "merchant_id": pd.Categorical.from_codes(merchant_idx, categories=merchant_cats),
+            "product_id": pd.Categorical.from_codes(product_idx, categories=product_cats),
+            "price": price,
+            "quantity": qty,
+            "revenue": np.round(price * qty, 2),
+        })
+        day = end
+
+
+def write_transactions(path, chunks):
+    """Append chunks to a CSV file one at a time; returns the number of rows written."""
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    total = 0
+    for i, chunk in enumerate(chunks):
+        chunk.to_csv(path, mode="w" if i == 0 else "a", header=(i == 0), index=False)
+        total += len(chunk)
+    return total
+
+
+# ----------------------------------
+# Dimension tables, competitor prices and reviews (same schemas as market starter.py)
+# ----------------------------------
+
+CATEGORIES = ["Electronics", "Home", "Fashion", "Beauty", "Grocery"]
+REGIONS = ["US", "AU"]
+COMPETITORS = ["CompA", "CompB", "CompC"]
+REVIEW_TEXTS = [
+    "Great product, fast delivery.",
+    "Good value for money.",
+    "Product quality was below expectation.",
+    "Exceeded expectations, highly recommend!",
+    "Packaging was damaged, but product is fine.",
+    "Customer service did not respond.",
+    "Five stars, will buy again.",
+    "Size/color not as described.",
+    "Amazing build quality and easy to use.",
+    "Mediocre experience overall.",
+]
+
+
+def make_merchants(n_merchants, seed=42):
+    rng = np.random.default_rng([seed, 1])
+    ids = np.arange(1, n_merchants + 1)
+    return pd.DataFrame({
+        "merchant_id": [f"M{i:03d}" for i in ids],
+        "merchant_name": [f"Merchant_{i}" for i in ids],
+        "category": rng.choice(CATEGORIES, n_merchants),
+        "region": rng.choice(REGIONS, n_merchants),
+        "avg_monthly_sales": np.round(rng.uniform(5000, 50000, n_merchants), 2),
+        "num_orders_month": rng.integers(50, 2001, n_merchants),
+    })
+
+
+def make_products(n_products, seed=42):
+    rng = np.random.default_rng([seed, 2])
+    ids = np.arange(1, n_products + 1)
+    return pd.DataFrame({
+        "product_id": [f"P{i:04d}" for i in ids],
+        "product_name": [f"Product_{i}" for i in ids],
+        "category": rng.choice(CATEGORIES, n_products),
+    })
+
+
+def make_competitor_prices(product_ids, merchant_ids, merchants_per_product=None, seed=42, date=None):
+    """One row per (product, sampled merchant, competitor), as in market starter.py."""
+    rng = np.random.default_rng([seed, 3])
+    product_ids, merchant_ids = np.asarray(product_ids), np.asarray(merchant_ids)
+    per_product = merchants_per_product or max(3, len(merchant_ids) // 2)
+    per_product = min(per_product, len(merchant_ids))
+    sampled = np.concatenate([rng.choice(len(merchant_ids), per_product, replace=False)
+                              for _ in range(len(product_ids))]) if len(product_ids) else np.zeros(0, dtype=int)
+    base = np.round(rng.uniform(10, 400, len(product_ids)), 2)
+    pair_base = np.repeat(base, per_product)
+    merchant_price = np.round(pair_base * rng.uniform(0.8, 1.2, len(pair_base)), 2)
+    n_comp = len(COMPETITORS)
+    return pd.DataFrame({
+        "product_id": np.repeat(product_ids, per_product * n_comp),
+        "merchant_id": np.repeat(merchant_ids[sampled], n_comp),
+        "competitor": np.tile(COMPETITORS, len(pair_base)),
+        "competitor_price": np.round(np.repeat(pair_base, n_comp) * rng.uniform(0.85, 1.25, len(pair_base) * n_comp), 2),
+        "merchant_price": np.repeat(merchant_price, n_comp),
+        "date": (date or datetime.utcnow().date()).isoformat(),
+    })
+
+
+def make_reviews(product_ids, n_reviews, seed=42, end_date=None):
+    rng = np.random.default_rng([seed, 4])
+    end_date = np.datetime64(end_date or datetime.utcnow().date(), "D")
+    return pd.DataFrame({
+        "review_id": [f"R{i:05d}" for i in range(n_reviews)],
+        "product_id": rng.choice(np.asarray(product_ids), n_reviews),
+        "review": rng.choice(REVIEW_TEXTS, n_reviews),
+        "rating": rng.integers(1, 6, n_reviews),
+        "date": (end_date - rng.integers(0, 366, n_reviews).astype("timedelta64[D]")).astype(str),
+    })
+
+
+def write_dataset(out_dir, n_transactions, n_merchants, n_products, n_days, n_reviews,
+                  merchants_per_product=None, seed=42, start_date=None, chunk_rows=DEFAULT_CHUNK_ROWS):
+    """Write a complete raw dataset (all five CSVs) to `out_dir`; deterministic for fixed dates."""
+    if start_date is None:
+        start_date = datetime.utcnow().date() - timedelta(days=n_days)
+    end_date = start_date + timedelta(days=n_days)
+    os.makedirs(out_dir, exist_ok=True)
+    merchants = make_merchants(n_merchants, seed)
+    products = make_products(n_products, seed)
+    merchants.to_csv(os.path.join(out_dir, "merchants.csv"), index=False)
+    products.to_csv(os.path.join(out_dir, "products.csv"), index=False)
+    chunks = iter_transaction_chunks(merchants["merchant_id"], products["product_id"], n_days=n_days,
+                                     target_rows=n_transactions, chunk_rows=chunk_rows, seed=seed,
+                                     start_date=start_date)
+    write_transactions(os.path.join(out_dir, "transactions.csv"), chunks)
+    make_competitor_prices(products["product_id"], merchants["merchant_id"], merchants_per_product,
+                           seed=seed, date=end_date) \
+        .to_csv(os.path.join(out_dir, "competitor_prices.csv"), index=False)
+    make_reviews(products["product_id"], n_reviews, seed=seed, end_date=end_date) \
+        .to_csv(os.path.join(out_dir, "reviews.csv"), index=False)